@@ -0,0 +1,180 @@
+"""
+FOB Test Analysis Dashboard - Headless batch reports
+
+Builds the PowerPoint deck and the Excel workbook of every project in one or
+more project archives (the ZIP files written by "Export Project Data"), without
+the Streamlit UI. Archives are processed in parallel across a process pool.
+
+    python batch_report.py exports/*.zip -o reports/ -j 4
+    python batch_report.py exports/ -o reports/ --narrative stub
+"""
+
+import argparse
+import copy
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Set in each worker process by load_dashboard
+dashboard = None
+baseline_state = None
+
+
+# Function to load the dashboard module in a worker process
+def load_dashboard(narrative):
+    """Import main1 headless with autosave off and keep a copy of its initial session state"""
+    global dashboard, baseline_state
+    # Batch runs must never write to the user's local project store
+    os.environ["FOB_STORE_PATH"] = ""
+    logging.disable(logging.WARNING)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import streamlit as st
+    import main1
+    dashboard = main1
+    if narrative == "stub":
+        dashboard.make_deepseek_api_call = stub_narrative_call
+        dashboard.deepseek_client = "stub"
+    baseline_state = {key: copy.deepcopy(st.session_state[key]) for key in st.session_state}
+
+
+# Helper function to start each archive from the dashboard's initial session state
+def reset_session_state():
+    """Drop everything a previous archive left in session state"""
+    import streamlit as st
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    for key, value in baseline_state.items():
+        st.session_state[key] = copy.deepcopy(value)
+
+
+# Helper function standing in for the LLM in offline runs
+def stub_narrative_call(prompt):
+    """Return a deck narrative JSON built only from the prompt's statistics table"""
+    mode = re.search(r"^Test mode: (.+)$", prompt, re.MULTILINE)
+    mode = mode.group(1) if mode else "this mode"
+    table = prompt.split("Summary statistics per group:", 1)[-1].split("\n\n", 1)[0].strip()
+    return json.dumps({
+        "results": f"Summary statistics for {mode} (offline run, no AI interpretation):\n{table}"
+    })
+
+
+# Helper function to make a project name safe for a file name
+def safe_file_name(name):
+    """Replace characters that are not allowed in file names"""
+    return re.sub(r'[^\w\-. ]+', '_', str(name)).strip() or "project"
+
+
+# Function to build the reports of every project in one archive
+def build_archive_reports(archive_path, output_dir, narrative, native_charts):
+    """Write a .pptx and an .xlsx per project; returns {'archive', 'outputs', 'errors', 'seconds'}"""
+    import streamlit as st
+    started = time.time()
+    result = {"archive": archive_path, "outputs": [], "errors": [], "seconds": 0.0}
+    reset_session_state()
+
+    with open(archive_path, "rb") as archive_file:
+        success, info = dashboard.import_project_data_from_zip(archive_file)
+    if not success:
+        result["errors"].append(str(info))
+        result["seconds"] = time.time() - started
+        return result
+
+    archive_stem = os.path.splitext(os.path.basename(archive_path))[0]
+    language = st.session_state.get("language", "en")
+    for project_id, project in list(st.session_state.projects.items()):
+        st.session_state.active_project = project_id
+        dashboard.load_project_worksheets(project_id)
+        stem = os.path.join(output_dir, f"{archive_stem}_{safe_file_name(project.get('name', project_id))}")
+
+        try:
+            sections = {}
+            if dashboard.get_project_groups(project_id):
+                for mode in dashboard.ALL_MODES:
+                    sections[mode] = dashboard.get_deck_section(project_id, project, mode, language, native_charts)
+                if narrative != "off":
+                    dashboard.fill_deck_narratives(project_id, project, sections, language)
+            charts = [chart for section in sections.values() for chart in section["charts"]]
+            pptx_data = dashboard.create_powerpoint_presentation(
+                project, st.session_state.mode, language, None, charts, native_charts, sections)
+            if isinstance(pptx_data, bytes):
+                with open(f"{stem}.pptx", "wb") as output:
+                    output.write(pptx_data)
+                result["outputs"].append(f"{stem}.pptx")
+            else:
+                result["errors"].append(f"{project.get('name', project_id)}: {pptx_data}")
+        except Exception as e:
+            result["errors"].append(f"{project.get('name', project_id)}: deck failed: {e}")
+
+        workbook_data, message = dashboard.export_project_workbook(project_id)
+        if workbook_data is not None:
+            with open(f"{stem}.xlsx", "wb") as output:
+                output.write(workbook_data)
+            result["outputs"].append(f"{stem}.xlsx")
+        else:
+            result["errors"].append(f"{project.get('name', project_id)}: {message}")
+
+    result["seconds"] = time.time() - started
+    return result
+
+
+# Helper function to expand the archive arguments
+def collect_archives(paths):
+    """Return the ZIP files named directly, matched by a glob or found in a directory"""
+    archives = []
+    for path in paths:
+        if os.path.isdir(path):
+            archives.extend(sorted(glob.glob(os.path.join(path, "*.zip"))))
+        elif glob.has_magic(path):
+            archives.extend(sorted(glob.glob(path)))
+        else:
+            archives.append(path)
+    return list(dict.fromkeys(archives))
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Build PowerPoint and Excel reports from FOB project archives")
+    parser.add_argument("archives", nargs="+", help="Project archive ZIP files, globs or directories")
+    parser.add_argument("-o", "--output-dir", default="reports", help="Directory for the reports (default: reports)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--narrative", choices=["off", "stub", "ai"], default="off",
+                        help="Per-mode slide text: built-in text (off), offline statistics stub, or the AI model "
+                             "(ai, through the FOB_LLM_BACKEND backend)")
+    parser.add_argument("--image-charts", action="store_true",
+                        help="Insert charts as images instead of editable PowerPoint charts")
+    args = parser.parse_args(argv)
+
+    archives = collect_archives(args.archives)
+    if not archives:
+        parser.error("no project archives found")
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failed = 0
+    workers = max(1, min(args.jobs, len(archives)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_dashboard, initargs=(args.narrative,)) as pool:
+        futures = {pool.submit(build_archive_reports, archive, args.output_dir, args.narrative,
+                               not args.image_charts): archive for archive in archives}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"archive": futures[future], "outputs": [], "errors": [str(e)], "seconds": 0.0}
+            failed += bool(result["errors"])
+            status = "FAILED" if result["errors"] else "ok"
+            print(f"[{status}] {result['archive']}: {len(result['outputs'])} file(s) in {result['seconds']:.1f}s")
+            for error in result["errors"]:
+                print(f"    {error}")
+
+    print(f"{len(archives) - failed} of {len(archives)} archive(s) processed, reports in {args.output_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+FOB Test Analysis Dashboard - Local LLM stub server
+
+An offline stand-in for the DeepSeek chat completions API, for testing and
+load-testing the AI features without network access. It answers
+POST /chat/completions (also under /v1/) in the OpenAI/DeepSeek format, with
+or without streaming, after a configurable delay.
+
+    python llm_stub_server.py --port 8765 --latency 1.5 --chunk-delay 0.02
+    FOB_LLM_BACKEND=stub streamlit run main1.py
+
+Point the DeepSeek client itself at the stub with DEEPSEEK_BASE_URL=http://127.0.0.1:8765.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Helper function to write a deterministic reply for a prompt
+def stub_reply(prompt):
+    """Return a JSON narrative for deck narrative prompts, otherwise a short markdown answer"""
+    if "Reply with a JSON object" in prompt:
+        mode = re.search(r"^Test mode: (.+)$", prompt, re.MULTILINE)
+        mode = mode.group(1) if mode else "this mode"
+        return json.dumps({
+            "intro": f"Stub introduction for {mode}.",
+            "results": f"Stub interpretation of the {mode} statistics.",
+            "conclusion": f"Stub conclusion for {mode}."
+        })
+    first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), "")
+    return (f"**Stub response** ({len(prompt)} prompt characters)\n\n"
+            f"1. The prompt starts with: {first_line[:120]}\n"
+            f"2. This text comes from llm_stub_server.py, not from a language model.")
+
+
+# Helper function to split a reply into streaming chunks
+def reply_chunks(text, size):
+    """Yield the reply in pieces of about size characters"""
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Handle chat completion requests with the server's latency settings"""
+
+    server_version = "FOBStubLLM/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.options.quiet:
+            super().log_message(format, *args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/health", "/v1/health"):
+            self.send_json(200, {"status": "ok", "requests": self.server.request_count})
+        else:
+            self.send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/chat/completions", "/v1/chat/completions"):
+            self.send_json(404, {"error": {"message": "not found"}})
+            return
+        options = self.server.options
+        with self.server.lock:
+            self.server.request_count += 1
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "\n".join(str(message.get("content", "")) for message in request.get("messages", []))
+        model = request.get("model", "deepseek-chat")
+
+        # Time to first byte
+        time.sleep(max(0.0, options.latency + random.uniform(-options.jitter, options.jitter)))
+        if random.random() < options.error_rate:
+            self.send_json(500, {"error": {"message": "stub server injected error"}})
+            return
+
+        reply = stub_reply(prompt)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if not request.get("stream"):
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(reply.split()),
+                          "total_tokens": len(prompt.split()) + len(reply.split())}
+            })
+            return
+
+        # Server-sent events, one content delta per chunk
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        for chunk in reply_chunks(reply, options.chunk_size):
+            event = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(options.chunk_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Local stub of the DeepSeek chat completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds before the first byte (default 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds added to the latency")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streamed chunk (default 16)")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Seconds between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
+    args = parser.parse_args(argv)
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    server.options = args
+    server.request_count = 0
+    server.lock = threading.Lock()
+    print(f"LLM stub server on http://{args.host}:{args.port} (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
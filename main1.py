@@ -12,10 +12,24 @@ import random
 import datetime
 import matplotlib as mpl
 from matplotlib import font_manager
+from matplotlib.figure import Figure
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
 import platform
 import zipfile
 import json
 import pickle
+import functools
+import contextlib
+import hashlib
+import logging
+import sqlite3
+import threading
+import asyncio
+import time
+import httpx
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure matplotlib for Chinese font support
 plt.rcParams['font.sans-serif'] = ['SimHei', 'DejaVu Sans', 'Arial Unicode MS', 'Microsoft YaHei', 'WenQuanYi Micro Hei']
@@ -56,6 +70,11 @@ from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import qn, nsdecls
+from lxml import etree
 
 # Configure Chinese fonts
 def configure_chinese_fonts():
@@ -94,8 +113,10 @@ if 'projects' not in st.session_state:
     st.session_state.projects = {}
 if 'active_project' not in st.session_state:
     st.session_state.active_project = None
-if 'experiments' not in st.session_state:
-    st.session_state.experiments = {}
+if 'group_index' not in st.session_state:
+    st.session_state.group_index = {}  # Maps project IDs to their ordered group names
+if 'worksheet_index' not in st.session_state:
+    st.session_state.worksheet_index = {}  # Maps project ID -> group -> mode to a worksheet key
 if 'mode' not in st.session_state:
     st.session_state.mode = "General Behavior"
 if 'worksheet_data' not in st.session_state:
@@ -106,10 +127,16 @@ if 'show_project_creation' not in st.session_state:
     st.session_state.show_project_creation = False
 if 'show_import_dialog' not in st.session_state:
     st.session_state.show_import_dialog = False
+if 'show_bulk_import_dialog' not in st.session_state:
+    st.session_state.show_bulk_import_dialog = False
+if 'show_workbook_export' not in st.session_state:
+    st.session_state.show_workbook_export = False
+if 'lazy_worksheets' not in st.session_state:
+    st.session_state.lazy_worksheets = {}  # Maps (kind, key) to archive members not yet decoded
+if 'lazy_archives' not in st.session_state:
+    st.session_state.lazy_archives = {}
 if 'comparison_groups' not in st.session_state:
     st.session_state.comparison_groups = {}
-if 'group_projects' not in st.session_state:
-    st.session_state.group_projects = {}  # Maps group names to project IDs
 if 'all_experiment_charts' not in st.session_state:
     st.session_state.all_experiment_charts = []  # Store all charts from experiments
 if 'show_scoring_help' not in st.session_state:
@@ -117,10 +144,432 @@ if 'show_scoring_help' not in st.session_state:
 
 # Helper function to get groups for a project
 def get_project_groups(project_id):
-    """Get all groups belonging to a specific project"""
-    return [group for group, pid in st.session_state.group_projects.items() if pid == project_id]
+    """Get all groups belonging to a specific project, in creation order"""
+    return st.session_state.group_index.get(project_id, [])
+
+# Helper function to get the session key of a group's worksheet
+def get_worksheet_key(project_id, group, mode):
+    """Return the worksheet key for (project, group, mode), or None if it has no worksheet"""
+    return st.session_state.worksheet_index.get(project_id, {}).get(group, {}).get(mode)
+
+# Helper function to assign the worksheet key where a worksheet is initialised
+def create_worksheet_key(project_id, group, mode):
+    """Return the worksheet key for (project, group, mode), assigning a new one on first use"""
+    modes = st.session_state.worksheet_index.setdefault(project_id, {}).setdefault(group, {})
+    if mode not in modes:
+        modes[mode] = f"worksheet_{uuid.uuid4().hex}"
+    return modes[mode]
+
+# Helper function to get the worksheet_data key that mirrors a worksheet key
+def worksheet_data_key(worksheet_key):
+    """Strip the 'worksheet_' prefix"""
+    return worksheet_key[len('worksheet_'):]
+
+# Helper function to store a worksheet under both of its session keys
+def store_worksheet(worksheet_key, df, journal=True):
+    """Save a worksheet DataFrame to session state and worksheet_data, recording the edit in the journal"""
+    previous = st.session_state.get(worksheet_key)
+    st.session_state[worksheet_key] = df
+    st.session_state.worksheet_data[worksheet_data_key(worksheet_key)] = df
+    if journal:
+        transaction = record_worksheet_edit(worksheet_key, previous, df)
+        update_worksheet_aggregates(worksheet_key, previous, df, transaction)
+
+# Edit journal: one transaction per saved worksheet change, holding only the changed cells;
+# the transactions of one user action share an action id and are undone together.
+# Nothing is ever removed: undo and redo append compensating transactions, so the journal is the audit trail.
+JOURNAL_ROW_KEYS = ['time', 'observation']
+JOURNAL_SNAPSHOT_INTERVAL = 50  # transactions on a worksheet between frame snapshots
+
+# Helper function to build an edit journal around a list of transactions
+def new_edit_journal(transactions=(), undo_stack=(), redo_stack=(), next_action=0):
+    """Return a journal dict with its per-worksheet and per-action indexes rebuilt from the transactions"""
+    journal = {
+        'transactions': list(transactions),  # append-only
+        'by_worksheet': {},  # worksheet key -> transaction ids
+        'by_action': {},  # action id -> transaction ids
+        'snapshots': {},  # worksheet key -> [(transaction count, DataFrame)] while the worksheet is in memory
+        'undo_stack': list(undo_stack),  # actions that can be undone, most recent last
+        'redo_stack': list(redo_stack),  # undone actions that can be redone, most recent last
+        'next_action': next_action,  # id given to the next user action
+        'open_action': None  # action id while a journal_action block is running
+    }
+    for transaction in journal['transactions']:
+        journal['by_worksheet'].setdefault(transaction['worksheet'], []).append(transaction['id'])
+        journal['by_action'].setdefault(transaction['action'], []).append(transaction['id'])
+    return journal
+
+# Helper function to get the session edit journal
+def get_edit_journal():
+    """Return the journal: transactions, undo/redo stacks, indexes and snapshots"""
+    if 'edit_journal' not in st.session_state:
+        st.session_state.edit_journal = new_edit_journal()
+    return st.session_state.edit_journal
+
+# Helper function to group the worksheet edits of one user action
+@contextlib.contextmanager
+def journal_action():
+    """Record every worksheet saved inside the block as a single undo step; nested blocks join the outer one"""
+    journal = get_edit_journal()
+    if journal['open_action'] is not None:
+        yield
+        return
+    journal['open_action'] = journal['next_action']
+    journal['next_action'] += 1
+    try:
+        yield
+    finally:
+        journal['open_action'] = None
+
+# Helper function to convert a cell to a compact journal value
+def journal_value(value):
+    """Store missing values as None and numpy scalars as Python values"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# Helper function to key worksheet rows for the journal
+def journal_row_keys(old_df, new_df):
+    """Return row keys for both frames: (time, observation) when unique in both, else row positions"""
+    keys = []
+    for df in (old_df, new_df):
+        if not all(col in df.columns for col in JOURNAL_ROW_KEYS):
+            return list(range(len(old_df))), list(range(len(new_df)))
+        keys.append(list(zip(*(df[col].map(journal_value) for col in JOURNAL_ROW_KEYS))))
+    if any(len(set(row_keys)) != len(row_keys) for row_keys in keys):
+        return list(range(len(old_df))), list(range(len(new_df)))
+    return keys[0], keys[1]
+
+# Helper function to align a worksheet on row keys and columns as an object array
+def journal_grid(df, row_keys, rows, columns):
+    """Return df's values laid out on the given rows and columns (None where absent)"""
+    grid = np.full((len(rows), len(columns)), None, dtype=object)
+    row_positions = {row: i for i, row in enumerate(rows)}
+    column_positions = {col: j for j, col in enumerate(columns)}
+    source_rows = [row_positions[row] for row in row_keys]
+    for col in df.columns:
+        grid[source_rows, column_positions[col]] = df[col].to_numpy(dtype=object)
+    return grid
+
+# Function to diff two versions of a worksheet into a journal transaction
+def diff_worksheet_frames(old_df, new_df):
+    """Return the cell-level changes between two frames, or None if they hold the same data"""
+    old_rows, new_rows = journal_row_keys(old_df, new_df)
+    rows = list(dict.fromkeys(old_rows + new_rows))
+    columns = list(dict.fromkeys(list(old_df.columns) + list(new_df.columns)))
+    old_grid = journal_grid(old_df, old_rows, rows, columns)
+    new_grid = journal_grid(new_df, new_rows, rows, columns)
+    old_missing = pd.isna(old_grid)
+    new_missing = pd.isna(new_grid)
+    changed = ~((old_grid == new_grid) | (old_missing & new_missing))
+    
+    cells = [(rows[i], columns[j], journal_value(old_grid[i, j]), journal_value(new_grid[i, j]))
+             for i, j in zip(*np.nonzero(changed))]
+    rows_changed = old_rows != new_rows
+    columns_changed = list(old_df.columns) != list(new_df.columns)
+    if not cells and not rows_changed and not columns_changed:
+        return None
+    return {
+        'cells': cells,
+        # Row and column layouts are only kept when they change (added/removed/reordered)
+        'rows_before': old_rows if rows_changed else None,
+        'rows_after': new_rows if rows_changed else None,
+        'columns_before': list(old_df.columns) if columns_changed else None,
+        'columns_after': list(new_df.columns) if columns_changed else None
+    }
+
+# Function to apply a journal transaction forwards or backwards
+def apply_journal_transaction(df, transaction, undo=False):
+    """Return df with the transaction's cells set to their new (or, when undoing, old) values"""
+    side = 'before' if undo else 'after'
+    current_rows, _ = journal_row_keys(df, df)
+    rows = transaction[f'rows_{side}'] if transaction[f'rows_{side}'] is not None else current_rows
+    columns = transaction[f'columns_{side}'] if transaction[f'columns_{side}'] is not None else list(df.columns)
+    
+    # Rows and columns that no longer exist are dropped by laying the frame onto the target layout
+    all_rows = list(dict.fromkeys(current_rows + list(rows)))
+    all_columns = list(dict.fromkeys(list(df.columns) + list(columns)))
+    grid = journal_grid(df, current_rows, all_rows, all_columns)
+    row_positions = {row: i for i, row in enumerate(all_rows)}
+    column_positions = {col: j for j, col in enumerate(all_columns)}
+    for row, column, old, new in transaction['cells']:
+        grid[row_positions[row], column_positions[column]] = old if undo else new
+    
+    grid = grid[[row_positions[row] for row in rows]][:, [column_positions[col] for col in columns]]
+    return pd.DataFrame(grid, columns=columns).infer_objects()
+
+# Helper function to append a transaction to the journal
+def append_journal_transaction(worksheet_key, change, new_df, kind='edit', target=None):
+    """Number the change, give it the open (or a new) action id and index it; returns the transaction"""
+    journal = get_edit_journal()
+    transaction_id = len(journal['transactions'])
+    action = journal['open_action']
+    if action is None:
+        action = journal['next_action']
+        journal['next_action'] += 1
+    change.update({
+        'id': transaction_id,
+        'action': action,
+        'kind': kind,  # 'edit', or 'undo'/'redo' of the target action
+        'target': target,
+        'worksheet': worksheet_key,
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds')
+    })
+    journal['transactions'].append(change)
+    journal['by_action'].setdefault(action, []).append(transaction_id)
+    ids = journal['by_worksheet'].setdefault(worksheet_key, [])
+    ids.append(transaction_id)
+    if worksheet_key in journal['snapshots'] and len(ids) % JOURNAL_SNAPSHOT_INTERVAL == 0:
+        journal['snapshots'][worksheet_key].append((transaction_id + 1, new_df))
+    return change
+
+# Function to record a saved worksheet change in the journal
+def record_worksheet_edit(worksheet_key, previous_df, new_df):
+    """Append the cell changes between previous_df and new_df as one transaction; returns it (None if unchanged)"""
+    journal = get_edit_journal()
+    
+    # The first version of a worksheet seen by the journal is its base snapshot
+    if worksheet_key not in journal['snapshots'] and worksheet_key not in journal['by_worksheet']:
+        journal['snapshots'][worksheet_key] = [(len(journal['transactions']),
+                                                new_df if previous_df is None else previous_df)]
+    if previous_df is None or previous_df is new_df:
+        return None
+    
+    change = diff_worksheet_frames(previous_df, new_df)
+    if change is None:
+        return None
+    
+    transaction = append_journal_transaction(worksheet_key, change, new_df)
+    
+    # A new edit can be undone; whatever was undone before it can no longer be redone
+    if not journal['undo_stack'] or journal['undo_stack'][-1] != transaction['action']:
+        journal['undo_stack'].append(transaction['action'])
+    journal['redo_stack'].clear()
+    return transaction
+
+# Helper function to drop editor widget state so a restored worksheet is shown as stored
+def reset_worksheet_editors(worksheet_key):
+    """Forget pending data_editor edits for a worksheet"""
+    for key in (f"editor_{worksheet_key}_form", f"editor_{worksheet_key}_auto", f"temp_{worksheet_key}"):
+        st.session_state.pop(key, None)
+
+# Helper function to make sure the worksheets an undo or redo touches are in memory
+def load_journal_worksheets(worksheet_keys):
+    """Load paged-out or not yet decoded worksheets; returns False if any of them no longer exists"""
+    owners = get_worksheet_owners()
+    for worksheet_key in worksheet_keys:
+        if worksheet_key not in st.session_state and worksheet_key in owners:
+            load_project_worksheets(owners[worksheet_key])
+    return all(isinstance(st.session_state.get(worksheet_key), pd.DataFrame) for worksheet_key in worksheet_keys)
+
+# Helper function to replay an action's transactions as new compensating transactions
+def replay_journal_action(action, undo):
+    """Append and apply the inverse (undo) or a copy (redo) of every transaction of an action"""
+    journal = get_edit_journal()
+    transactions = [journal['transactions'][transaction_id] for transaction_id in journal['by_action'][action]]
+    if undo:
+        transactions = transactions[::-1]
+    with journal_action():
+        for transaction in transactions:
+            worksheet_key = transaction['worksheet']
+            change = {
+                'cells': [(row, column, new, old) if undo else (row, column, old, new)
+                          for row, column, old, new in transaction['cells']],
+                'rows_before': transaction['rows_after' if undo else 'rows_before'],
+                'rows_after': transaction['rows_before' if undo else 'rows_after'],
+                'columns_before': transaction['columns_after' if undo else 'columns_before'],
+                'columns_after': transaction['columns_before' if undo else 'columns_after']
+            }
+            current = st.session_state[worksheet_key]
+            restored = apply_journal_transaction(current, change)
+            store_worksheet(worksheet_key, restored, journal=False)
+            change = append_journal_transaction(worksheet_key, change, restored, 'undo' if undo else 'redo', action)
+            update_worksheet_aggregates(worksheet_key, current, restored, change)
+            reset_worksheet_editors(worksheet_key)
+    return list(dict.fromkeys(transaction['worksheet'] for transaction in transactions))
+
+# Function to undo the most recent user action
+def undo_last_edit():
+    """Revert the last undoable action with compensating transactions; returns (worksheet keys, message)"""
+    journal = get_edit_journal()
+    if not journal['undo_stack']:
+        return None, t('nothing_to_undo')
+    action = journal['undo_stack'][-1]
+    worksheet_keys = {journal['transactions'][transaction_id]['worksheet']
+                      for transaction_id in journal['by_action'][action]}
+    # The journal only moves when every worksheet could be updated
+    if not load_journal_worksheets(worksheet_keys):
+        return None, t('undo_unavailable')
+    touched = replay_journal_action(action, undo=True)
+    journal['redo_stack'].append(journal['undo_stack'].pop())
+    return touched, "Success"
+
+# Function to redo the most recently undone user action
+def redo_last_edit():
+    """Re-apply the last undone action with compensating transactions; returns (worksheet keys, message)"""
+    journal = get_edit_journal()
+    if not journal['redo_stack']:
+        return None, t('nothing_to_redo')
+    action = journal['redo_stack'][-1]
+    worksheet_keys = {journal['transactions'][transaction_id]['worksheet']
+                      for transaction_id in journal['by_action'][action]}
+    if not load_journal_worksheets(worksheet_keys):
+        return None, t('undo_unavailable')
+    touched = replay_journal_action(action, undo=False)
+    journal['undo_stack'].append(journal['redo_stack'].pop())
+    return touched, "Success"
+
+# Function to rebuild a worksheet as it was after a given number of transactions
+def reconstruct_worksheet(worksheet_key, transaction_count):
+    """Replay journal transactions from the nearest snapshot; returns None if the worksheet did not exist yet"""
+    journal = get_edit_journal()
+    ids = journal['by_worksheet'].get(worksheet_key, [])
+    snapshots = journal['snapshots'].get(worksheet_key)
+    if snapshots:
+        snapshots = [snapshot for snapshot in snapshots if snapshot[0] <= transaction_count]
+        if not snapshots:
+            return None
+        start, df = snapshots[-1]
+        for transaction_id in ids:
+            if start <= transaction_id < transaction_count:
+                df = apply_journal_transaction(df, journal['transactions'][transaction_id])
+        return df
+    
+    # Without snapshots (paged out or restored journal), walk back from the current worksheet
+    df = st.session_state.get(worksheet_key)
+    if df is None:
+        return None
+    for transaction_id in reversed(ids):
+        if transaction_id >= transaction_count:
+            df = apply_journal_transaction(df, journal['transactions'][transaction_id], undo=True)
+    return df
+
+# Function to list journal cell changes as an audit trail table
+def build_audit_trail(worksheet_key=None):
+    """Return one row per changed cell (optionally for a single worksheet), including undo and redo entries"""
+    journal = get_edit_journal()
+    if worksheet_key is None:
+        transaction_ids = range(len(journal['transactions']))
+    else:
+        transaction_ids = journal['by_worksheet'].get(worksheet_key, [])
+    records = []
+    for transaction_id in transaction_ids:
+        transaction = journal['transactions'][transaction_id]
+        kind = transaction.get('kind', 'edit')
+        status = t('edited') if kind == 'edit' else t(f'{kind}_of').format(action=transaction['target'] + 1)
+        for row, column, old, new in transaction['cells']:
+            time, observation = row if isinstance(row, tuple) else (row, None)
+            records.append({
+                'transaction': transaction_id + 1,
+                'action': transaction['action'] + 1,
+                'timestamp': transaction['timestamp'],
+                'worksheet': transaction['worksheet'],
+                'time': time,
+                'observation': observation,
+                'column': column,
+                'old': old,
+                'new': new,
+                'status': status
+            })
+    return pd.DataFrame(records, columns=['transaction', 'action', 'timestamp', 'worksheet', 'time', 'observation',
+                                          'column', 'old', 'new', 'status'])
+
+# Helper function to serialize a journal transaction
+def journal_transaction_to_json(transaction):
+    """Return the transaction as compact JSON (row keys become lists)"""
+    return json.dumps(transaction, separators=(',', ':'), default=str)
+
+# Helper function to read back a serialized journal transaction
+def journal_transaction_from_json(text):
+    """Parse a transaction written by journal_transaction_to_json, turning row keys back into tuples"""
+    transaction = json.loads(text)
+    as_key = lambda row: tuple(row) if isinstance(row, list) else row
+    transaction['cells'] = [(as_key(row), column, old, new) for row, column, old, new in transaction['cells']]
+    for side in ('rows_before', 'rows_after'):
+        if transaction[side] is not None:
+            transaction[side] = [as_key(row) for row in transaction[side]]
+    return transaction
+
+# Helper function to get the journal state saved next to the transactions
+def journal_state(journal):
+    """Return the undo/redo stacks and next action id as a dict"""
+    return {'undo_stack': journal['undo_stack'], 'redo_stack': journal['redo_stack'],
+            'next_action': journal['next_action']}
+
+# Helper function to add a group to a project
+def add_project_group(project_id, group):
+    """Append a group to the project's index; returns False if the project already has it"""
+    groups = st.session_state.group_index.setdefault(project_id, [])
+    if group in groups:
+        return False
+    groups.append(group)
+    st.session_state.worksheet_index.setdefault(project_id, {}).setdefault(group, {})
+    return True
+
+# Helper function to rename a group within a project
+def rename_project_group(project_id, old_group, new_group):
+    """Rename a group in place; worksheet keys are unchanged. Returns False on a name clash"""
+    groups = st.session_state.group_index.get(project_id, [])
+    if old_group not in groups or new_group in groups:
+        return False
+    groups[groups.index(old_group)] = new_group
+    worksheets = st.session_state.worksheet_index.setdefault(project_id, {})
+    worksheets[new_group] = worksheets.pop(old_group, {})
+    comparison_groups = st.session_state.comparison_groups.get(project_id, [])
+    if old_group in comparison_groups:
+        comparison_groups[comparison_groups.index(old_group)] = new_group
+    return True
+
+# Helper function to remove a group and its worksheets from a project
+def remove_project_group(project_id, group):
+    """Delete a group, its worksheets and any pending lazy copies of them"""
+    groups = st.session_state.group_index.get(project_id, [])
+    if group in groups:
+        groups.remove(group)
+    for worksheet_key in st.session_state.worksheet_index.get(project_id, {}).pop(group, {}).values():
+        st.session_state.pop(worksheet_key, None)
+        st.session_state.worksheet_data.pop(worksheet_data_key(worksheet_key), None)
+        st.session_state.lazy_worksheets.pop(('session', worksheet_key), None)
+        st.session_state.lazy_worksheets.pop(('worksheet_data', worksheet_data_key(worksheet_key)), None)
+    comparison_groups = st.session_state.comparison_groups.get(project_id, [])
+    if group in comparison_groups:
+        comparison_groups.remove(group)
+
+# Helper function to map every worksheet key to its project
+def get_worksheet_owners():
+    """Return {worksheet key or worksheet_data key: project_id} from the worksheet index"""
+    owners = {}
+    for project_id, groups in st.session_state.worksheet_index.items():
+        for modes in groups.values():
+            for worksheet_key in modes.values():
+                owners[worksheet_key] = project_id
+                owners[worksheet_data_key(worksheet_key)] = project_id
+    return owners
+
+# Helper function to build the index from the older global group mapping
+def build_legacy_group_index(group_projects):
+    """Index groups from a {group: project_id} mapping, keeping their 'worksheet_{group}_{mode}' keys"""
+    group_index = {}
+    worksheet_index = {}
+    for group, project_id in group_projects.items():
+        group_index.setdefault(project_id, []).append(group)
+        worksheet_index.setdefault(project_id, {})[group] = {mode: f"worksheet_{group}_{mode}" for mode in ALL_MODES}
+    return group_index, worksheet_index
+
+# Helper function to restore the group index from saved project data
+def restore_group_index(projects_data):
+    """Set group_index/worksheet_index from exported or stored project data (any format version)"""
+    if 'group_index' in projects_data:
+        st.session_state.group_index = projects_data['group_index']
+        st.session_state.worksheet_index = projects_data.get('worksheet_index', {})
+    else:
+        st.session_state.group_index, st.session_state.worksheet_index = \
+            build_legacy_group_index(projects_data.get('group_projects', {}))
 
 # Helper function to synchronize time points across all worksheets
+@journal_action()
 def synchronize_time_points_across_worksheets(project_id, new_times, mode=None):
     """Synchronize time points across all worksheets for a project"""
     project_groups = get_project_groups(project_id)
@@ -139,7 +588,7 @@ def synchronize_time_points_across_worksheets(project_id, new_times, mode=None):
     
     for group in project_groups:
         for mode_item in modes:
-            worksheet_key = f"worksheet_{group}_{mode_item}"
+            worksheet_key = create_worksheet_key(project_id, group, mode_item)
             
             # Get observations for this mode
             if mode_item == "Autonomic and Sensorimotor Functions":
@@ -204,18 +653,43 @@ def synchronize_time_points_across_worksheets(project_id, new_times, mode=None):
             if new_data:
                 new_df = pd.DataFrame(new_data)
                 new_df = new_df.sort_values(['time', 'observation']).reset_index(drop=True)
-                st.session_state[worksheet_key] = new_df
-                st.session_state.worksheet_data[f"{group}_{mode_item}"] = new_df
+                store_worksheet(worksheet_key, new_df)
+
+# Render profiles: each output path picks how a figure is rasterized
+# preview - on-screen display; slide - resolution for the chart picture box on PowerPoint slides;
+# print - full-resolution downloads, also as vector SVG/PDF
+SLIDE_CHART_SIZE = (7, 4)  # inches
+RENDER_PROFILES = {
+    'preview': {'dpi': 100, 'fit': None, 'bbox_inches': 'tight', 'formats': ('png',)},
+    'slide': {'dpi': 150, 'fit': SLIDE_CHART_SIZE, 'bbox_inches': None, 'formats': ('png',)},
+    'print': {'dpi': 300, 'fit': None, 'bbox_inches': 'tight', 'formats': ('png', 'svg', 'pdf')}
+}
+IMAGE_MIME_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+
+# Function to render a figure with a named profile
+def render_figure(fig, profile='print', file_format=None):
+    """Render a matplotlib figure to bytes using a render profile (default format: the profile's first)"""
+    settings = RENDER_PROFILES[profile]
+    file_format = file_format or settings['formats'][0]
+    if file_format not in settings['formats']:
+        raise ValueError(f"The {profile} profile does not support {file_format}")
+    
+    # A fitted profile keeps the figure's layout and picks the DPI that fills the target box
+    dpi = settings['dpi']
+    if settings['fit'] is not None:
+        width, height = fig.get_size_inches()
+        dpi = dpi * min(settings['fit'][0] / width, settings['fit'][1] / height)
+    
+    buffer = BytesIO()
+    fig.savefig(buffer, format=file_format, dpi=dpi, bbox_inches=settings['bbox_inches'])
+    return buffer.getvalue()
 
 # Helper function to capture charts for PowerPoint
-def capture_chart_for_powerpoint(fig, title, mode, chart_type="Plot", description="", add_to_session=True):
-    """Capture a matplotlib figure for inclusion in PowerPoint presentations"""
+def capture_chart_for_powerpoint(fig, title, mode, chart_type="Plot", description="", add_to_session=True, native=None):
+    """Capture a matplotlib figure (and/or native chart data) for inclusion in PowerPoint presentations"""
     try:
-        # Save figure as bytes
-        img_buffer = BytesIO()
-        fig.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-        img_buffer.seek(0)
-        chart_data = img_buffer.getvalue()
+        # Save figure as bytes sized for the slide's chart box; native-only charts have no image
+        chart_data = render_figure(fig, 'slide') if fig is not None else None
         
         # Store chart information
         chart_info = {
@@ -223,12 +697,19 @@ def capture_chart_for_powerpoint(fig, title, mode, chart_type="Plot", descriptio
             'mode': mode,
             'chart_type': chart_type,
             'data': chart_data,
+            'native': native,
             'description': description,
             'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         }
         
+        # Identify the chart by its content so a repeated capture is kept once
+        digest = hashlib.sha1(chart_data or b'')
+        digest.update(json.dumps([title, mode, native], default=str).encode('utf-8'))
+        chart_info['digest'] = digest.hexdigest()
+        
         # Add to session state only if requested (not for PowerPoint generation)
-        if add_to_session:
+        if add_to_session and not any(chart.get('digest') == chart_info['digest']
+                                      for chart in st.session_state.all_experiment_charts):
             st.session_state.all_experiment_charts.append(chart_info)
         
         return chart_info
@@ -248,72 +729,170 @@ def clear_project_charts(project_id):
     except Exception as e:
         st.error(f"Error clearing charts: {str(e)}")
 
+# Current project archive format: manifest.json plus one Parquet member per DataFrame
+ARCHIVE_SCHEMA_VERSION = 2
+ARCHIVE_JOURNAL_MEMBER = 'journal.json'
+
+# Helper function to fingerprint DataFrame contents
+def frame_digest(df):
+    """Return a content hash of a DataFrame's columns, dtypes and values"""
+    digest = hashlib.sha1()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode('utf-8'))
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+# Helper function to serialize a DataFrame to Parquet bytes
+def frame_to_parquet_bytes(df):
+    """Return (parquet bytes, columns stored as JSON text because they mixed value types)"""
+    import pyarrow as pa
+    frame = df.reset_index(drop=True)
+    stringified = []
+    for col in frame.columns:
+        if frame[col].dtype == object:
+            try:
+                pa.array(frame[col], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # JSON keeps 0 and '0' apart, so the column decodes to the same values
+                frame[col] = frame[col].map(lambda value: json.dumps(journal_value(value), default=str),
+                                            na_action='ignore')
+                stringified.append(col)
+    buffer = BytesIO()
+    frame.to_parquet(buffer, index=False, engine='pyarrow')
+    return buffer.getvalue(), stringified
+
+# Helper function to decode one cell of a stringified column
+def decode_stringified_cell(value):
+    """JSON-decode a cell written by frame_to_parquet_bytes; plain text is kept as is"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+# Helper function to read a DataFrame back from Parquet bytes
+def parquet_bytes_to_frame(data, stringified=()):
+    """Decode Parquet bytes and restore the original values of stringified columns"""
+    frame = pd.read_parquet(BytesIO(data), engine='pyarrow')
+    for col in stringified:
+        if col in frame.columns:
+            frame[col] = frame[col].astype(object).map(decode_stringified_cell, na_action='ignore')
+    return frame
+
+# Helper function to list every DataFrame that belongs in a project archive
+def collect_archive_frames():
+    """Return [(kind, key, DataFrame or lazy entry)] for worksheet_data and session DataFrames"""
+    frames = [('worksheet_data', key, value) for key, value in st.session_state.worksheet_data.items()
+              if isinstance(value, pd.DataFrame)]
+    frames += [('session', key, value) for key, value in st.session_state.items()
+               if isinstance(value, pd.DataFrame)]
+    # Worksheets not yet loaded from an imported archive are exported without decoding them
+    for (kind, key), entry in st.session_state.get('lazy_worksheets', {}).items():
+        if kind == 'worksheet_data' and key not in st.session_state.worksheet_data:
+            frames.append((kind, key, entry))
+        elif kind == 'session' and key not in st.session_state:
+            frames.append((kind, key, entry))
+    return frames
+
+# Helper function to get a DataFrame digest without rehashing unchanged frames
+def get_frame_digest(df):
+    """Return frame_digest(df), reusing the last digest while the same object is stored"""
+    if 'frame_digests' not in st.session_state:
+        st.session_state.frame_digests = {}
+    cached = st.session_state.frame_digests.get(id(df))
+    if cached is not None and cached[0] is df:
+        return cached[1]
+    digest = frame_digest(df)
+    st.session_state.frame_digests[id(df)] = (df, digest)
+    return digest
+
 # Function to export all project data as ZIP
-def export_project_data_as_zip():
-    """Export all current project data as a ZIP file"""
+def export_project_data_as_zip(delta=False):
+    """Export all current project data as a ZIP file (schema version 2).
+
+    With delta=True and a previous export in this session, only worksheets whose
+    content changed since that export are written, and the manifest points at it.
+    """
     try:
         if st.session_state.active_project is None:
             return None, "No active project to export"
         
+        last_export = st.session_state.get('last_export')
+        base_export_id = last_export['export_id'] if delta and last_export else None
+        base_members = last_export['members'] if base_export_id else {}
+        
         # Create ZIP buffer
         zip_buffer = BytesIO()
         
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Export projects data
-            projects_data = {
-                'projects': st.session_state.projects,
-                'active_project': st.session_state.active_project,
-                'experiments': st.session_state.experiments,
-                'group_projects': st.session_state.group_projects,
-                'comparison_groups': st.session_state.comparison_groups,
-                'language': st.session_state.language,
-                'export_timestamp': datetime.datetime.now().isoformat()
-            }
-            
-            # Add projects data as JSON
-            zip_file.writestr('projects_data.json', json.dumps(projects_data, indent=2, default=str))
-            
-            # Export all worksheet data
-            worksheet_data = {}
-            for key, value in st.session_state.worksheet_data.items():
-                if isinstance(value, pd.DataFrame):
-                    # Convert DataFrame to CSV
-                    csv_buffer = BytesIO()
-                    value.to_csv(csv_buffer, index=False)
-                    csv_buffer.seek(0)
-                    worksheet_data[key] = csv_buffer.getvalue().decode('utf-8')
-            
-            # Add worksheet data as JSON
-            zip_file.writestr('worksheet_data.json', json.dumps(worksheet_data, indent=2))
-            
-            # Export session state data that contains DataFrames
-            session_data = {}
-            for key, value in st.session_state.items():
-                if isinstance(value, pd.DataFrame):
-                    # Convert DataFrame to CSV
-                    csv_buffer = BytesIO()
-                    value.to_csv(csv_buffer, index=False)
-                    csv_buffer.seek(0)
-                    session_data[key] = csv_buffer.getvalue().decode('utf-8')
-                elif key.startswith('worksheet_') and isinstance(value, pd.DataFrame):
-                    # Handle worksheet session state
-                    csv_buffer = BytesIO()
-                    value.to_csv(csv_buffer, index=False)
-                    csv_buffer.seek(0)
-                    session_data[key] = csv_buffer.getvalue().decode('utf-8')
-            
-            # Add session data as JSON
-            if session_data:
-                zip_file.writestr('session_data.json', json.dumps(session_data, indent=2))
+            # Each distinct DataFrame is written once; worksheet_data usually shares
+            # its frames with the worksheet_* session keys
+            members = []
+            current_members = {}
+            written = {}
+            owners = get_worksheet_owners()
+            for kind, key, value in collect_archive_frames():
+                digest = get_frame_digest(value) if isinstance(value, pd.DataFrame) else value['digest']
+                current_members[(kind, key)] = digest
+                if base_members.get((kind, key)) == digest:
+                    continue
+                if digest not in written:
+                    if isinstance(value, pd.DataFrame):
+                        data, stringified = frame_to_parquet_bytes(value)
+                    else:
+                        data = read_lazy_member_bytes(value)
+                        stringified = value.get('stringified', [])
+                    written[digest] = stringified
+                    # Parquet is already compressed, so store it as-is
+                    zip_file.writestr(f"frames/{digest}.parquet", data, compress_type=zipfile.ZIP_STORED)
+                members.append({
+                    'kind': kind,
+                    'key': key,
+                    'member': f"frames/{digest}.parquet",
+                    'digest': digest,
+                    'project': owners.get(key),
+                    'stringified': written[digest]
+                })
             
-            # Add export info
-            export_info = {
-                'export_date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'version': '1.0',
-                'description': 'FOB Test Analysis Dashboard Project Export',
-                'project_name': st.session_state.projects[st.session_state.active_project]['name'] if st.session_state.active_project else 'Unknown'
+            export_id = uuid.uuid4().hex
+            manifest = {
+                'schema_version': ARCHIVE_SCHEMA_VERSION,
+                'export_id': export_id,
+                'base_export_id': base_export_id,
+                'export_info': {
+                    'export_date': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'version': f'{ARCHIVE_SCHEMA_VERSION}.0',
+                    'description': 'FOB Test Analysis Dashboard Project Export',
+                    'project_name': st.session_state.projects[st.session_state.active_project]['name'],
+                    'delta': base_export_id is not None
+                },
+                'projects_data': {
+                    'projects': st.session_state.projects,
+                    'active_project': st.session_state.active_project,
+                    'group_index': st.session_state.group_index,
+                    'worksheet_index': st.session_state.worksheet_index,
+                    'comparison_groups': st.session_state.comparison_groups,
+                    'language': st.session_state.language,
+                    'export_timestamp': datetime.datetime.now().isoformat()
+                },
+                'members': members,
+                'removed': [list(member_key) for member_key in base_members if member_key not in current_members]
             }
-            zip_file.writestr('export_info.json', json.dumps(export_info, indent=2))
+            # The whole edit journal travels with every export so the audit trail survives a round trip
+            journal = get_edit_journal()
+            manifest['journal'] = ARCHIVE_JOURNAL_MEMBER
+            zip_file.writestr(ARCHIVE_JOURNAL_MEMBER, json.dumps({
+                'state': journal_state(journal),
+                'transactions': [journal_transaction_to_json(transaction) for transaction in journal['transactions']]
+            }, separators=(',', ':')))
+            zip_file.writestr('manifest.json', json.dumps(manifest, separators=(',', ':'), default=str))
+        
+        # The next delta export is taken against this one once the user has downloaded it
+        st.session_state.pending_export = {'export_id': export_id, 'members': current_members}
+        
+        # Forget digests of frames that are no longer stored so they can be freed
+        live_ids = {id(value) for _, _, value in collect_archive_frames()}
+        st.session_state.frame_digests = {frame_id: cached for frame_id, cached in st.session_state.frame_digests.items()
+                                          if frame_id in live_ids}
         
         zip_buffer.seek(0)
         return zip_buffer.getvalue(), "Export successful"
@@ -321,14 +900,43 @@ def export_project_data_as_zip():
     except Exception as e:
         return None, f"Export failed: {str(e)}"
 
+# Helper function to make a downloaded export the base of the next delta
+def confirm_export_download(export_id):
+    """Download button callback: the export the user received becomes last_export"""
+    pending = st.session_state.get('pending_export')
+    if pending is not None and pending['export_id'] == export_id:
+        st.session_state.last_export = pending
+        st.session_state.pending_export = None
+
 # Function to import project data from ZIP
-def import_project_data_from_zip(uploaded_file):
-    """Import project data from uploaded ZIP file"""
+def import_project_data_from_zip(uploaded_files):
+    """Import project data from an uploaded ZIP file, or a full export plus its delta exports"""
+    if not isinstance(uploaded_files, list):
+        uploaded_files = [uploaded_files]
     try:
-        # Read ZIP file
-        zip_buffer = BytesIO(uploaded_file.read())
+        # Read ZIP files
+        archives = []
+        for uploaded_file in uploaded_files:
+            archive_bytes = uploaded_file.read()
+            with zipfile.ZipFile(BytesIO(archive_bytes), 'r') as zip_file:
+                if 'manifest.json' in zip_file.namelist():
+                    archives.append((archive_bytes, json.loads(zip_file.read('manifest.json').decode('utf-8'))))
+                else:
+                    archives.append((archive_bytes, None))
+        
+        if len(archives) > 1 or archives[0][1] is not None:
+            if any(manifest is None for _, manifest in archives):
+                return False, "Version 1 archives cannot be combined with other files"
+            return import_project_archives(archives)
+        
+        zip_buffer = BytesIO(archives[0][0])
         
         with zipfile.ZipFile(zip_buffer, 'r') as zip_file:
+            # Version 1 archive: CSV text wrapped in JSON
+            st.session_state.lazy_worksheets = {}
+            st.session_state.lazy_archives = {}
+            st.session_state.pop('edit_journal', None)
+            
             # Check if required files exist
             required_files = ['projects_data.json', 'worksheet_data.json']
             if not all(file in zip_file.namelist() for file in required_files):
@@ -340,8 +948,7 @@ def import_project_data_from_zip(uploaded_file):
             # Clear current session state (ask for confirmation in UI)
             st.session_state.projects = projects_data['projects']
             st.session_state.active_project = projects_data['active_project']
-            st.session_state.experiments = projects_data['experiments']
-            st.session_state.group_projects = projects_data.get('group_projects', {})
+            restore_group_index(projects_data)
             st.session_state.comparison_groups = projects_data.get('comparison_groups', {})
             
             # Set language if available
@@ -377,6 +984,440 @@ def import_project_data_from_zip(uploaded_file):
     except Exception as e:
         return False, f"Import failed: {str(e)}"
 
+# Helper function to get the Parquet bytes behind a lazy worksheet entry
+def read_lazy_member_bytes(entry):
+    """Return the Parquet bytes of a pending member, from an imported archive or the local store"""
+    if entry.get('archive') is not None:
+        with zipfile.ZipFile(BytesIO(st.session_state.lazy_archives[entry['archive']]), 'r') as zip_file:
+            return zip_file.read(entry['member'])
+    return read_store_frame_bytes(entry['kind'], entry['key'])
+
+# Helper function to order a full export and its deltas into a replay chain
+def order_archive_chain(archives):
+    """Return archives ordered base first, following base_export_id pointers; raises ValueError if broken"""
+    by_base = {}
+    for archive in archives:
+        by_base.setdefault(archive[1].get('base_export_id'), []).append(archive)
+    if len(by_base.get(None, [])) != 1:
+        raise ValueError("Select exactly one full export as the base of the chain")
+    
+    chain = by_base[None]
+    while len(chain) < len(archives):
+        following = by_base.get(chain[-1][1].get('export_id'), [])
+        if len(following) != 1:
+            raise ValueError("Delta exports do not form a single chain from the full export")
+        chain.append(following[0])
+    return chain
+
+# Function to import version 2 archives (a full export optionally followed by deltas)
+def import_project_archives(archives):
+    """Replay [(archive bytes, manifest)] and restore project state; worksheets are decoded lazily"""
+    for _, manifest in archives:
+        if manifest.get('schema_version', 0) > ARCHIVE_SCHEMA_VERSION:
+            return False, f"Archive schema version {manifest.get('schema_version')} is newer than this dashboard supports"
+    try:
+        chain = order_archive_chain(archives)
+    except ValueError as e:
+        return False, str(e)
+    
+    # Later archives override earlier members and may remove them
+    resolved = {}
+    lazy_archives = {}
+    for archive_bytes, manifest in chain:
+        archive_id = hashlib.sha1(archive_bytes).hexdigest()
+        lazy_archives[archive_id] = archive_bytes
+        for member in manifest['members']:
+            resolved[(member['kind'], member['key'])] = {
+                'kind': member['kind'],
+                'key': member['key'],
+                'archive': archive_id,
+                'member': member['member'],
+                'digest': member['digest'],
+                'project': member.get('project'),
+                'stringified': member.get('stringified', [])
+            }
+        for kind, key in manifest.get('removed', []):
+            resolved.pop((kind, key), None)
+    
+    manifest = chain[-1][1]
+    projects_data = manifest['projects_data']
+    st.session_state.projects = projects_data['projects']
+    st.session_state.active_project = projects_data['active_project']
+    restore_group_index(projects_data)
+    st.session_state.comparison_groups = projects_data.get('comparison_groups', {})
+    if 'language' in projects_data:
+        st.session_state.language = projects_data['language']
+    
+    # Register every member lazily; the archive copy replaces whatever is loaded under the same key
+    for kind, key in resolved:
+        if kind == 'worksheet_data':
+            st.session_state.worksheet_data.pop(key, None)
+        elif key in st.session_state:
+            del st.session_state[key]
+    st.session_state.lazy_archives = lazy_archives
+    st.session_state.lazy_worksheets = resolved
+    
+    # The newest archive carrying a journal holds the full history
+    st.session_state.pop('edit_journal', None)
+    for archive_bytes, archive_manifest in reversed(chain):
+        if archive_manifest.get('journal'):
+            with zipfile.ZipFile(BytesIO(archive_bytes), 'r') as zip_file:
+                saved_journal = json.loads(zip_file.read(archive_manifest['journal']).decode('utf-8'))
+            st.session_state.edit_journal = new_edit_journal(
+                [journal_transaction_from_json(text) for text in saved_journal['transactions']],
+                **saved_journal['state'])
+            break
+    st.session_state.store_journal_count = None
+    
+    # Further delta exports continue the imported chain
+    if manifest.get('export_id'):
+        st.session_state.last_export = {
+            'export_id': manifest['export_id'],
+            'members': {member_key: entry['digest'] for member_key, entry in resolved.items()}
+        }
+    
+    # Frames outside any project and the active project's worksheets are needed right away
+    load_project_worksheets(None)
+    load_project_worksheets(st.session_state.active_project)
+    
+    export_info = dict(manifest.get('export_info', {}))
+    export_info['archives'] = len(chain)
+    return True, export_info
+
+# Function to materialize lazily imported worksheets for one project
+def load_project_worksheets(project_id):
+    """Decode the pending archive members that belong to a project"""
+    lazy_worksheets = st.session_state.get('lazy_worksheets')
+    if not lazy_worksheets:
+        return
+    
+    decoded = {}
+    for (kind, key), entry in list(lazy_worksheets.items()):
+        if entry['project'] != project_id:
+            continue
+        target = st.session_state.worksheet_data if kind == 'worksheet_data' else st.session_state
+        # Anything written since the import is newer than the archive copy
+        if key not in target:
+            # Autosave and delta export hash the decoded frame, so a lossy decode shows up as a change
+            if entry['digest'] not in decoded:
+                decoded[entry['digest']] = parquet_bytes_to_frame(read_lazy_member_bytes(entry),
+                                                                  entry.get('stringified', []))
+            target[key] = decoded[entry['digest']]
+        del lazy_worksheets[(kind, key)]
+    
+    # Drop archive bytes once nothing references them
+    referenced = {entry.get('archive') for entry in lazy_worksheets.values()}
+    for archive_id in list(st.session_state.lazy_archives):
+        if archive_id not in referenced:
+            del st.session_state.lazy_archives[archive_id]
+
+# Local project store: SQLite database in write-ahead-log mode
+# Set FOB_STORE_PATH to move it, or to an empty string to turn autosave off
+PROJECT_STORE_PATH = os.getenv("FOB_STORE_PATH", os.path.join(os.path.expanduser("~"), ".fob_dashboard", "projects.db"))
+
+# Session keys saved as project metadata
+PROJECT_STORE_META_KEYS = ['projects', 'active_project', 'group_index', 'worksheet_index', 'comparison_groups', 'language']
+
+logger = logging.getLogger(__name__)
+
+# Helper function to get the id this session saves its projects under
+def get_store_id():
+    """Return the session's store id; it is kept in the URL so reopening the same link restores the same projects"""
+    if 'store_id' not in st.session_state:
+        store_id = st.query_params.get('store')
+        if not store_id:
+            store_id = uuid.uuid4().hex
+            st.query_params['store'] = store_id
+        st.session_state.store_id = store_id
+    return st.session_state.store_id
+
+# Helper function to open the shared project store
+@st.cache_resource
+def get_project_store():
+    """Open (and create if needed) the SQLite project store; returns (connection, lock) or None"""
+    if not PROJECT_STORE_PATH:
+        return None
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(PROJECT_STORE_PATH)), exist_ok=True)
+        connection = sqlite3.connect(PROJECT_STORE_PATH, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        # Metadata rows are keyed 'projects_data:<store id>'
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(worksheets)")]
+        if columns and 'store' not in columns:
+            # Stores written before store ids existed move to the 'default' store
+            connection.execute("ALTER TABLE worksheets RENAME TO worksheets_unscoped")
+        # Worksheets point at content-addressed frames, so shared DataFrames are stored once
+        connection.execute("""CREATE TABLE IF NOT EXISTS frames (
+            digest TEXT PRIMARY KEY,
+            stringified TEXT NOT NULL,
+            data BLOB NOT NULL)""")
+        # Each session's worksheets live under its own store id
+        connection.execute("""CREATE TABLE IF NOT EXISTS worksheets (
+            store TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            project TEXT,
+            digest TEXT NOT NULL REFERENCES frames (digest),
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (store, kind, key))""")
+        # Edit journal transactions, append-only per store; the stacks are the meta row 'journal:<store id>'
+        connection.execute("""CREATE TABLE IF NOT EXISTS journal (
+            store TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (store, id))""")
+        if columns and 'store' not in columns:
+            connection.execute("INSERT INTO worksheets SELECT 'default', kind, key, project, digest, updated_at "
+                               "FROM worksheets_unscoped")
+            connection.execute("DROP TABLE worksheets_unscoped")
+            connection.execute("UPDATE meta SET key = 'projects_data:default' WHERE key = 'projects_data'")
+        connection.commit()
+        return connection, threading.Lock()
+    except Exception as e:
+        logger.warning("Project store unavailable: %s", e)
+        return None
+
+# Helper function to read one stored worksheet
+def read_store_frame_bytes(kind, key):
+    """Return the Parquet bytes saved for a worksheet in the local store"""
+    connection, lock = get_project_store()
+    with lock:
+        row = connection.execute("SELECT frames.data FROM worksheets JOIN frames USING (digest) "
+                                 "WHERE store = ? AND kind = ? AND key = ?", (get_store_id(), kind, key)).fetchone()
+    if row is None:
+        raise KeyError(f"{key} is not in the project store")
+    return row[0]
+
+# Function to restore projects from the local store when a session starts
+def restore_project_store():
+    """Load project metadata and register stored worksheets lazily; returns True if anything was restored"""
+    store = get_project_store()
+    if store is None:
+        return False
+    connection, lock = store
+    store_id = get_store_id()
+    with lock:
+        meta_row = connection.execute("SELECT value FROM meta WHERE key = ?", (f"projects_data:{store_id}",)).fetchone()
+        rows = connection.execute("SELECT kind, key, project, digest, stringified "
+                                  "FROM worksheets JOIN frames USING (digest) WHERE store = ?", (store_id,)).fetchall()
+        journal_row = connection.execute("SELECT value FROM meta WHERE key = ?", (f"journal:{store_id}",)).fetchone()
+        journal_rows = connection.execute("SELECT data FROM journal WHERE store = ? ORDER BY id",
+                                          (store_id,)).fetchall()
+
+    st.session_state.store_digests = {(kind, key): digest for kind, key, _, digest, _ in rows}
+    if meta_row is None:
+        return False
+
+    projects_data = json.loads(meta_row[0])
+    st.session_state.store_meta = meta_row[0]
+    for key in PROJECT_STORE_META_KEYS:
+        if key in projects_data:
+            st.session_state[key] = projects_data[key]
+    restore_group_index(projects_data)
+    
+    # The journal comes back without snapshots; history is reconstructed from the current worksheets
+    journal_state_saved = json.loads(journal_row[0]) if journal_row else {}
+    st.session_state.edit_journal = new_edit_journal([journal_transaction_from_json(data) for data, in journal_rows],
+                                                     **journal_state_saved)
+    st.session_state.store_journal_count = len(journal_rows)
+    st.session_state.store_journal_state = journal_row[0] if journal_row else None
+
+    # Worksheets are decoded when their project is opened
+    for kind, key, project, digest, stringified in rows:
+        st.session_state.lazy_worksheets[(kind, key)] = {
+            'kind': kind,
+            'key': key,
+            'archive': None,
+            'digest': digest,
+            'project': project,
+            'stringified': json.loads(stringified)
+        }
+    return True
+
+# Function to list the stores saved by earlier sessions
+def list_project_stores():
+    """Return [(store id, project names, last saved)] for stores holding projects, most recent first"""
+    store = get_project_store()
+    if store is None:
+        return []
+    connection, lock = store
+    with lock:
+        meta_rows = connection.execute("SELECT key, value FROM meta WHERE key LIKE 'projects_data:%'").fetchall()
+        saved_at = dict(connection.execute("SELECT store, MAX(updated_at) FROM worksheets GROUP BY store").fetchall())
+    stores = []
+    for key, value in meta_rows:
+        store_id = key[len('projects_data:'):]
+        projects = json.loads(value).get('projects') or {}
+        if projects:
+            stores.append((store_id, [project['name'] for project in projects.values()], saved_at.get(store_id, '')))
+    return sorted(stores, key=lambda item: item[2], reverse=True)
+
+# Function to switch the session to another saved store
+def open_project_store(store_id):
+    """Point the URL at a saved store and start the session over so it is restored from there"""
+    st.query_params['store'] = store_id
+    st.session_state.clear()
+
+# Function to autosave changed worksheets to the local store
+def autosave_project_store():
+    """Write changed worksheets and metadata to the store in one atomic transaction"""
+    store = get_project_store()
+    if store is None:
+        return
+    connection, lock = store
+    if 'store_digests' not in st.session_state:
+        st.session_state.store_digests = {}
+
+    store_id = get_store_id()
+    saved = st.session_state.store_digests
+    meta = json.dumps({key: st.session_state.get(key) for key in PROJECT_STORE_META_KEYS},
+                      separators=(',', ':'), default=str)
+
+    # Only frames whose object changed since the last run are hashed again
+    upserts = []
+    frames = {}
+    current = {}
+    saved_digests = set(saved.values())
+    owners = get_worksheet_owners()
+    for kind, key, value in collect_archive_frames():
+        digest = get_frame_digest(value) if isinstance(value, pd.DataFrame) else value['digest']
+        current[(kind, key)] = digest
+        if saved.get((kind, key)) == digest:
+            continue
+        if digest not in saved_digests and digest not in frames:
+            if isinstance(value, pd.DataFrame):
+                data, stringified = frame_to_parquet_bytes(value)
+            else:
+                data, stringified = read_lazy_member_bytes(value), value.get('stringified', [])
+            frames[digest] = (digest, json.dumps(stringified), data)
+        upserts.append((store_id, kind, key, owners.get(key), digest, datetime.datetime.now().isoformat()))
+    removed = [(store_id,) + member_key for member_key in saved if member_key not in current]
+    
+    # Journal transactions are only ever appended; an imported journal replaces the stored one
+    journal = get_edit_journal()
+    journal_count = st.session_state.get('store_journal_count')
+    rewrite_journal = journal_count is None or journal_count > len(journal['transactions'])
+    new_transactions = journal['transactions'] if rewrite_journal else journal['transactions'][journal_count:]
+    journal_rows = [(store_id, transaction['id'], journal_transaction_to_json(transaction))
+                    for transaction in new_transactions]
+    journal_meta = json.dumps(journal_state(journal), separators=(',', ':'))
+
+    if (not upserts and not removed and meta == st.session_state.get('store_meta') and not journal_rows
+            and not rewrite_journal and journal_meta == st.session_state.get('store_journal_state')):
+        return
+
+    try:
+        with lock, connection:
+            connection.executemany("INSERT OR IGNORE INTO frames (digest, stringified, data) VALUES (?, ?, ?)",
+                                   frames.values())
+            connection.executemany(
+                "INSERT OR REPLACE INTO worksheets (store, kind, key, project, digest, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)", upserts)
+            connection.executemany("DELETE FROM worksheets WHERE store = ? AND kind = ? AND key = ?", removed)
+            connection.execute("DELETE FROM frames WHERE digest NOT IN (SELECT digest FROM worksheets)")
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               (f"projects_data:{store_id}", meta))
+            if rewrite_journal:
+                connection.execute("DELETE FROM journal WHERE store = ?", (store_id,))
+            connection.executemany("INSERT INTO journal (store, id, data) VALUES (?, ?, ?)", journal_rows)
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                               (f"journal:{store_id}", journal_meta))
+    except sqlite3.Error as e:
+        logger.warning("Autosave failed: %s", e)
+        st.toast(t('autosave_failed').format(error=e), icon="⚠️")
+        return
+
+    st.session_state.store_digests = current
+    st.session_state.store_meta = meta
+    st.session_state.store_journal_count = len(journal['transactions'])
+    st.session_state.store_journal_state = journal_meta
+
+# Projects kept decoded in memory; older ones are paged out to the local store
+RESIDENT_PROJECTS = int(os.getenv("FOB_RESIDENT_PROJECTS", "3"))
+RESIDENT_MEMORY_MB = float(os.getenv("FOB_RESIDENT_MEMORY_MB", "512"))
+
+# Helper function to measure a DataFrame once per object
+def get_frame_memory(df):
+    """Return deep memory usage in bytes, cached while the same object is stored"""
+    if 'frame_memory' not in st.session_state:
+        st.session_state.frame_memory = {}
+    cached = st.session_state.frame_memory.get(id(df))
+    if cached is not None and cached[0] is df:
+        return cached[1]
+    size = int(df.memory_usage(deep=True).sum())
+    st.session_state.frame_memory[id(df)] = (df, size)
+    return size
+
+# Function to page inactive projects out of session memory
+def spill_inactive_projects():
+    """Keep the active project and the most recently used ones resident within the count and memory caps"""
+    if get_project_store() is None or not st.session_state.get('store_digests'):
+        return
+    
+    # Most recently used project last
+    resident = [pid for pid in st.session_state.get('resident_projects', []) if pid in st.session_state.projects]
+    if st.session_state.active_project in resident:
+        resident.remove(st.session_state.active_project)
+    if st.session_state.active_project is not None:
+        resident.append(st.session_state.active_project)
+    
+    frames_by_project = {}
+    owners = get_worksheet_owners()
+    for kind, key, value in collect_archive_frames():
+        if isinstance(value, pd.DataFrame):
+            project_id = owners.get(key)
+            if project_id is not None:
+                frames_by_project.setdefault(project_id, []).append((kind, key, value))
+    for project_id in frames_by_project:
+        if project_id not in resident:
+            resident.insert(0, project_id)
+    
+    memory = {pid: sum(get_frame_memory(value) for _, _, value in frames_by_project.get(pid, []))
+              for pid in resident}
+    memory_cap = RESIDENT_MEMORY_MB * 1024 * 1024
+    
+    while len(resident) > 1 and (len(resident) > RESIDENT_PROJECTS or sum(memory.values()) > memory_cap):
+        project_id = resident.pop(0)
+        del memory[project_id]
+        # Only frames already saved in their current state can be dropped
+        spillable = [(kind, key, value, get_frame_digest(value)) for kind, key, value in frames_by_project.get(project_id, [])]
+        spillable = [item for item in spillable if st.session_state.store_digests.get((item[0], item[1])) == item[3]]
+        if not spillable:
+            continue
+        connection, lock = get_project_store()
+        digests = sorted({digest for _, _, _, digest in spillable})
+        with lock:
+            stringified = dict(connection.execute(
+                f"SELECT digest, stringified FROM frames WHERE digest IN ({','.join('?' * len(digests))})",
+                digests).fetchall())
+        for kind, key, value, digest in spillable:
+            if kind == 'worksheet_data':
+                del st.session_state.worksheet_data[key]
+            else:
+                del st.session_state[key]
+                st.session_state.get('typed_worksheets', {}).pop(key, None)
+                st.session_state.get('worksheet_aggregates', {}).pop(key, None)
+                # Snapshots would keep the paged-out frames alive; history is rebuilt from the stored frame instead
+                get_edit_journal()['snapshots'].pop(key, None)
+            st.session_state.lazy_worksheets[(kind, key)] = {
+                'kind': kind,
+                'key': key,
+                'archive': None,
+                'digest': digest,
+                'project': project_id,
+                'stringified': json.loads(stringified.get(digest, '[]'))
+            }
+    
+    st.session_state.resident_projects = resident
+    
+    # Release cached sizes and digests of frames that are no longer resident
+    live_ids = {id(value) for _, _, value in collect_archive_frames() if isinstance(value, pd.DataFrame)}
+    for cache_name in ('frame_memory', 'frame_digests'):
+        cache = st.session_state.get(cache_name, {})
+        st.session_state[cache_name] = {frame_id: cached for frame_id, cached in cache.items() if frame_id in live_ids}
+
 # DeepSeek AI Configuration
 # Get your API key from: https://platform.deepseek.com/
 # Replace the placeholder with your actual API key
@@ -386,33 +1427,172 @@ DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY", "sk-16231cff5f244f0a898972cd1e4
 # Initialize global deepseek_client
 deepseek_client = None
 
-# Helper function for DeepSeek API calls
-def make_deepseek_api_call(prompt):
-    """Make DeepSeek API call"""
+# LLM backend used by every AI feature:
+#   deepseek - the DeepSeek API (default)
+#   stub     - a local server such as llm_stub_server.py, streamed
+#   record   - FOB_LLM_RECORD_BACKEND (deepseek or stub), saving each reply to the cassette
+#   replay   - replies from the cassette only, no network
+LLM_BACKEND = os.getenv("FOB_LLM_BACKEND", "deepseek").lower()
+LLM_RECORD_BACKEND = os.getenv("FOB_LLM_RECORD_BACKEND", "deepseek").lower()
+LLM_STUB_URL = os.getenv("FOB_LLM_STUB_URL", "http://127.0.0.1:8765")
+LLM_CASSETTE_PATH = os.getenv("FOB_LLM_CASSETTE", "llm_cassette.jsonl")
+LLM_REPLAY_LATENCY = os.getenv("FOB_LLM_REPLAY_LATENCY", "") == "1"  # sleep for the recorded duration
+LLM_LATENCY_LOG = os.getenv("FOB_LLM_LATENCY_LOG", "")  # JSONL file receiving one line per call
+LLM_TIMEOUT_S = float(os.getenv("FOB_LLM_TIMEOUT_S", "60"))
+LLM_REQUEST = {"model": "deepseek-chat", "temperature": 0.7, "max_tokens": 2000}
+
+# Cassette replies by prompt key, loaded on first replay
+llm_cassette = None
+llm_cassette_lock = threading.Lock()
+
+# Helper function to get the backend that actually answers prompts
+def llm_source_backend():
+    """Return 'deepseek' or 'stub' for live backends, 'replay' for cassette playback"""
+    return LLM_RECORD_BACKEND if LLM_BACKEND == 'record' else LLM_BACKEND
+
+# Helper function to check that the LLM backend can take calls
+def llm_ready():
+    """Return True when the selected backend is usable, configuring DeepSeek if it is the source"""
+    if llm_source_backend() == 'deepseek':
+        return deepseek_client is not None or configure_deepseek()
+    return True
+
+# Helper function to turn a prompt into chat messages
+def llm_messages(prompt):
+    """Return the messages list for a prompt string or an already assembled messages list"""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return list(prompt)
+
+# Helper function to get the full text of a prompt
+def llm_prompt_text(prompt):
+    """Join the message contents of a prompt (for logs and size checks)"""
+    return "\n".join(message["content"] for message in llm_messages(prompt))
+
+# Helper function to key a prompt in the cassette
+def llm_cassette_key(prompt):
+    """Hash the request settings and prompt"""
+    return hashlib.sha1(json.dumps([LLM_REQUEST, prompt]).encode('utf-8')).hexdigest()
+
+# Helper function to read the cassette file
+def load_llm_cassette():
+    """Return {key: entry} from the cassette JSONL file (empty if it does not exist)"""
+    global llm_cassette
+    with llm_cassette_lock:
+        if llm_cassette is None:
+            llm_cassette = {}
+            if os.path.exists(LLM_CASSETTE_PATH):
+                with open(LLM_CASSETTE_PATH, encoding='utf-8') as cassette:
+                    for line in cassette:
+                        if line.strip():
+                            entry = json.loads(line)
+                            llm_cassette[entry['key']] = entry
+        return llm_cassette
+
+# Helper function to stream a reply from DeepSeek
+def deepseek_chunks(prompt):
+    """Yield the DeepSeek reply (the client returns it in one piece)"""
+    response = deepseek_client.chat.completions.create(
+        messages=llm_messages(prompt),
+        **LLM_REQUEST
+    )
+    yield response.choices[0].message.content
+
+# Helper function to stream a reply from a local stub server
+def stub_chunks(prompt):
+    """Yield content deltas from an OpenAI-style streaming endpoint"""
+    payload = dict(LLM_REQUEST, messages=llm_messages(prompt), stream=True)
+    with httpx.stream("POST", f"{LLM_STUB_URL.rstrip('/')}/chat/completions", json=payload,
+                      timeout=LLM_TIMEOUT_S) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            delta = json.loads(data)['choices'][0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+# Helper function to replay a recorded reply
+def replay_chunks(prompt):
+    """Yield the cassette reply for a prompt; raises KeyError if it was never recorded"""
+    entry = load_llm_cassette().get(llm_cassette_key(prompt))
+    if entry is None:
+        raise KeyError(f"no recorded reply for this prompt in {LLM_CASSETTE_PATH}")
+    if LLM_REPLAY_LATENCY:
+        time.sleep(entry.get('seconds', 0))
+    yield entry['response']
+
+# Live and replay backends by name
+LLM_BACKENDS = {
+    'deepseek': deepseek_chunks,
+    'stub': stub_chunks,
+    'replay': replay_chunks
+}
+
+# Helper function to record a reply in the cassette
+def record_llm_reply(prompt, response, seconds):
+    """Append a prompt/reply pair to the cassette file"""
+    entry = {'key': llm_cassette_key(prompt), 'prompt': prompt, 'response': response,
+             'seconds': round(seconds, 3), 'backend': LLM_RECORD_BACKEND}
+    with llm_cassette_lock:
+        with open(LLM_CASSETTE_PATH, 'a', encoding='utf-8') as cassette:
+            cassette.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if llm_cassette is not None:
+            llm_cassette[entry['key']] = entry
+
+# Helper function to log the latency of an LLM call
+def log_llm_latency(prompt, reply, seconds, first_chunk_seconds, error=None):
+    """Append one JSON line to FOB_LLM_LATENCY_LOG when it is set"""
+    if not LLM_LATENCY_LOG:
+        return
+    entry = {'backend': LLM_BACKEND, 'seconds': round(seconds, 4),
+             'first_chunk_seconds': None if first_chunk_seconds is None else round(first_chunk_seconds, 4),
+             'prompt_chars': len(llm_prompt_text(prompt)), 'reply_chars': len(reply), 'error': error,
+             'time': datetime.datetime.now().isoformat()}
+    with llm_cassette_lock:
+        with open(LLM_LATENCY_LOG, 'a', encoding='utf-8') as log:
+            log.write(json.dumps(entry) + "\n")
+
+# Function to stream a reply from the configured LLM backend
+def stream_llm_response(prompt):
+    """Yield reply chunks for a prompt string or messages list; failures end the stream with an 'Error ...' message"""
     global deepseek_client
     
-    # Check if client is configured, if not try to configure it
-    if deepseek_client is None:
-        if not configure_deepseek():
-            return "Error: DeepSeek AI is not properly configured. Please check your API key and try again."
+    # Check if the backend is configured, if not try to configure it
+    if not llm_ready():
+        yield "Error: DeepSeek AI is not properly configured. Please check your API key and try again."
+        return
     
+    started = time.perf_counter()
+    first_chunk_seconds = None
+    chunks = []
+    error = None
     try:
-        # Simple API call with DeepSeek
-        response = deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=2000
-        )
-        return response.choices[0].message.content
-        
+        for chunk in LLM_BACKENDS[llm_source_backend()](prompt):
+            if first_chunk_seconds is None:
+                first_chunk_seconds = time.perf_counter() - started
+            chunks.append(chunk)
+            yield chunk
     except Exception as e:
-        error_msg = str(e)
-        # Try to reconfigure if there's an error
-        deepseek_client = None
-        return f"Error generating AI response: {error_msg}. Please check your API key and try again."
+        error = str(e)
+        if llm_source_backend() == 'deepseek':
+            # Try to reconfigure if there's an error
+            deepseek_client = None
+        yield f"Error generating AI response: {error}. Please check your API key and try again."
+    
+    seconds = time.perf_counter() - started
+    reply = "".join(chunks)
+    if LLM_BACKEND == 'record' and error is None:
+        record_llm_reply(prompt, reply, seconds)
+    log_llm_latency(prompt, reply, seconds, first_chunk_seconds, error)
+
+# Helper function for LLM calls
+def make_deepseek_api_call(prompt):
+    """Send a prompt to the configured LLM backend and return the whole reply"""
+    return "".join(stream_llm_response(prompt))
 
 # Initialize DeepSeek AI
 def configure_deepseek():
@@ -441,10 +1621,9 @@ def configure_deepseek():
 def generate_ai_report(project_data, analysis_data, mode_eng, language='en', uploaded_file_content=None):
     """Generate AI-powered report using DeepSeek"""
     try:
-        # Check if client is already configured, if not configure it
-        if 'deepseek_client' not in globals() or deepseek_client is None:
-            if not configure_deepseek():
-                return "Error: Failed to configure DeepSeek AI"
+        # Check that the LLM backend is configured
+        if not llm_ready():
+            return "Error: Failed to configure DeepSeek AI"
         
         # Create prompt based on analysis mode and data
         if mode_eng == "Body Weight":
@@ -572,84 +1751,49 @@ Please provide the following analysis:
 Please provide a professional, clear format in English.
 """
 
-def process_uploaded_file(uploaded_file):
-    """Process uploaded file and return its content"""
-    try:
-        if uploaded_file is None:
-            return None
-        
-        file_extension = uploaded_file.name.split('.')[-1].lower()
-        
-        if file_extension in ['csv']:
-            # Read CSV file
-            df = pd.read_csv(uploaded_file)
-            return df.to_string()
-        elif file_extension in ['xlsx', 'xls']:
-            # Read Excel file
-            df = pd.read_excel(uploaded_file)
-            return df.to_string()
-        elif file_extension in ['txt']:
-            # Read text file
-            return uploaded_file.read().decode('utf-8')
-        else:
-            return f"Unsupported file type: {file_extension}. Supported types: CSV, Excel, TXT"
-    except Exception as e:
-        return f"Error processing file: {str(e)}"
+# Chat prompt assembly: fixed preamble, project statistics, summary of older turns, recent turns
+CHAT_TOKEN_BUDGET = int(os.getenv("FOB_CHAT_TOKEN_BUDGET", "3000"))  # prompt tokens per chat call
+CHAT_RECENT_MESSAGES = 6  # latest messages sent word for word
+CHAT_STATISTICS_SHARE = 0.3  # most of the budget project statistics may take
+CHAT_REFERENCE_SHARE = 0.35  # most of the budget guide passages may take
+CHAT_EXCERPT_SHARE = 0.35  # most of the budget uploaded file excerpts may take
+CHAT_SUMMARY_LINE_TOKENS = 40  # tokens kept per older message in the summary
+
+# Local token estimate: one token per CJK character, digit group or symbol, about six letters per word token
+CHAT_TOKEN_PATTERN = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]|[^\W\d_]+|\d{1,3}|[^\w\s]|_")
+CHAT_MESSAGE_TOKENS = 4  # role and separator tokens added per message
+
+# Words that tie a chat question to a test mode
+CHAT_MODE_KEYWORDS = {
+    "General Behavior": ("general behavio", "一般行为"),
+    "Autonomic and Sensorimotor Functions": ("autonomic", "sensorimotor", "自主神经", "感觉运动"),
+    "Reflex Capabilities": ("reflex", "反射"),
+    "Body Temperature": ("temperature", "体温"),
+    "Body Weight": ("weight", "体重"),
+    "Convulsive Behaviors and Excitability": ("convuls", "excitab", "seizure", "惊厥", "兴奋")
+}
 
-def generate_chatbot_response(user_message, language='en'):
-    """Generate chatbot response using DeepSeek AI"""
-    try:
-        # Check if client is already configured, if not configure it
-        if 'deepseek_client' not in globals() or deepseek_client is None:
-            if not configure_deepseek():
-                return "Error: Failed to configure DeepSeek AI"
-        
-        # Create chatbot prompt with comprehensive functionality summary
-        if language == 'zh':
-            prompt = f"""
-你是一个专业的FOB测试分析仪表板使用指导助手。你的主要任务是帮助用户学习如何使用这个工具。
+# Instructions sent unchanged at the start of the system message of every tutor and chatbot call
+CHAT_PREAMBLES = {
+    'en': """You are a professional FOB Test Analysis Dashboard {assistant}. Your main task is to help users learn how to use this tool effectively.
 
-**仪表板功能总结：**
-这是一个功能观察电池（FOB）测试分析仪表板，包含以下核心功能：
+Focus on tool usage guidance, step-by-step instructions, feature explanations, common issues and best practices.
+Be friendly, patient and professional; give specific, actionable steps in simple language, name the buttons and options involved, and format with numbers or bullet points.
+Use the conversation so far to understand follow-up questions, and base statements about the user's data only on the project statistics provided.
 
-1. **项目管理**：创建项目，设置动物类型（小鼠/大鼠/自定义），每组动物数量，组数
-2. **6种分析模式**：
-   - 一般行为：0/4/8评分系统，正常范围2-6
-   - 自主神经功能：正常/异常二元评分
-   - 反射能力：正常/异常二元评分
-   - 体温：温度测量，正常范围36-38°C
-   - 体重：实验前后体重测量，自动计算变化
-   - 惊厥行为：正常/异常二元评分
-3. **数据录入**：手动保存和自动保存两种模式，支持添加时间点
-4. **组管理**：多组实验，可设置对照组
-5. **数据分析**：异常事件跟踪，统计分析和可视化
-6. **报告生成**：综合报告导出，图表下载
-7. **多语言支持**：中英文界面
-
-用户问题：{user_message}
-
-请专注于提供以下帮助：
-1. **工具使用指导**：详细说明如何在仪表板中操作各个功能
-2. **步骤说明**：提供清晰的分步操作指南
-3. **功能解释**：解释每个功能的作用和用途
-4. **常见问题**：解答用户在使用过程中遇到的问题
-5. **最佳实践**：提供使用建议和技巧
-
-回答要求：
-- 保持友好、耐心、专业的态度
-- 提供具体、可操作的步骤
-- 使用简单易懂的语言
-- 如果涉及界面操作，请明确指出按钮和选项的位置
-- 格式要清晰，可以使用编号或要点
-- 基于上述功能总结提供准确的指导
-
-请用中文回答，重点放在工具使用指导上。
-"""
-        else:
-            prompt = f"""
-You are a professional FOB Test Analysis Dashboard usage guide assistant. Your main task is to help users learn how to use this tool effectively.
+Please answer in English.""",
+    'zh': """你是一个专业的FOB测试分析仪表板{assistant}。你的主要任务是帮助用户学习如何使用这个工具。
+
+请专注于工具使用指导、分步操作说明、功能解释、常见问题和最佳实践。
+保持友好、耐心、专业的态度；用简单易懂的语言提供具体、可操作的步骤，明确指出相关按钮和选项，并使用编号或要点。
+结合之前的对话理解追问，关于用户数据的陈述只能基于提供的项目统计数据。
 
-**Dashboard Functionality Summary:**
+请用中文回答。"""
+}
+
+# Feature summary the chatbot gets after the preamble (the tutor gets guide passages instead)
+CHAT_DASHBOARD_SUMMARIES = {
+    'en': """**Dashboard Functionality Summary:**
 This is a Functional Observational Battery (FOB) test analysis dashboard with the following core features:
 
 1. **Project Management**: Create projects, set animal types (mouse/rat/custom), animals per group, number of groups
@@ -664,48 +1808,8 @@ This is a Functional Observational Battery (FOB) test analysis dashboard with th
 4. **Group Management**: Multiple experimental groups, can set comparison group
 5. **Data Analysis**: Abnormal episode tracking, statistical analysis and visualization
 6. **Report Generation**: Comprehensive report export, chart downloads
-7. **Multi-language Support**: English and Chinese interfaces
-
-User Question: {user_message}
-
-Please focus on providing the following help:
-1. **Tool Usage Guidance**: Detailed instructions on how to operate various features in the dashboard
-2. **Step-by-step Instructions**: Provide clear, actionable step-by-step guides
-3. **Feature Explanation**: Explain what each feature does and its purpose
-4. **Common Issues**: Answer questions users encounter while using the tool
-5. **Best Practices**: Provide usage tips and recommendations
-
-Response Requirements:
-- Maintain a friendly, patient, and professional attitude
-- Provide specific, actionable steps
-- Use simple, understandable language
-- If involving interface operations, clearly indicate button and option locations
-- Format clearly, using numbers or bullet points when appropriate
-- Base guidance on the above functionality summary for accuracy
-
-Please answer in English, focusing on tool usage guidance.
-        """
-        
-        # Use DeepSeek API
-        return make_deepseek_api_call(prompt)
-        
-    except Exception as e:
-        return f"Error generating chatbot response: {str(e)}"
-
-def generate_tutor_response(user_message, language='en'):
-    """Generate tutor response using DeepSeek AI"""
-    try:
-        # Check if client is already configured, if not configure it
-        if 'deepseek_client' not in globals() or deepseek_client is None:
-            if not configure_deepseek():
-                return "Error: Failed to configure DeepSeek AI"
-        
-        # Create tutor prompt
-        if language == 'zh':
-            prompt = f"""
-你是一个专业的FOB测试分析仪表板导师。你的主要任务是帮助用户学习如何使用这个工具。
-
-**仪表板功能总结：**
+7. **Multi-language Support**: English and Chinese interfaces""",
+    'zh': """**仪表板功能总结：**
 这是一个功能观察电池（FOB）测试分析仪表板，包含以下核心功能：
 
 1. **项目管理**：创建项目，设置动物类型（小鼠/大鼠/自定义），每组动物数量，组数
@@ -717,70 +1821,514 @@ def generate_tutor_response(user_message, language='en'):
    - 体重：实验前后体重测量，自动计算变化
    - 惊厥行为：正常/异常二元评分
 3. **数据录入**：手动保存和自动保存两种模式，支持添加时间点
-4. **管理组**：多组实验，可设置对照组
+4. **组管理**：多组实验，可设置对照组
 5. **数据分析**：异常事件跟踪，统计分析和可视化
 6. **报告生成**：综合报告导出，图表下载
-7. **多语言支持**：中英文界面
-
-用户问题：{user_message}
-
-请专注于提供以下帮助：
-1. **工具使用指导**：详细说明如何在仪表板中操作各个功能
-2. **步骤说明**：提供清晰的分步操作指南
-3. **功能解释**：解释每个功能的作用和用途
-4. **常见问题**：解答用户在使用过程中遇到的问题
-5. **最佳实践**：提供使用建议和技巧
-
-回答要求：
-- 保持友好、耐心、专业的态度
-- 提供具体、可操作的步骤
-- 使用简单易懂的语言
-- 如果涉及界面操作，请明确指出按钮和选项的位置
-- 格式要清晰，可以使用编号或要点
-- 基于上述功能总结提供准确的指导
-
-请用中文回答，重点放在工具使用指导上。
-"""
-        else:
-            prompt = f"""
-You are a professional FOB Test Analysis Dashboard tutor. Your main task is to help users learn how to use this tool effectively.
+7. **多语言支持**：中英文界面"""
+}
 
-**Dashboard Functionality Summary:**
-This is a Functional Observational Battery (FOB) test analysis dashboard with the following core features:
+# Assistant names used in the preamble
+CHAT_ASSISTANT_NAMES = {
+    'chatbot': {'en': "usage guide assistant", 'zh': "使用指导助手"},
+    'tutor': {'en': "tutor", 'zh': "导师"}
+}
 
-1. **Project Management**: Create projects, set animal types (mouse/rat/custom), animals per group, number of groups
-2. **6 Analysis Modes**:
-   - General Behavior: 0/4/8 scoring system, normal range 2-6
-   - Autonomic Functions: Normal/Abnormal binary scoring
-   - Reflex Capabilities: Normal/Abnormal binary scoring
-   - Body Temperature: Temperature measurements, normal range 36-38°C
-   - Body Weight: Before/after weight measurements with automatic change calculations
-   - Convulsive Behaviors: Normal/Abnormal binary scoring
-3. **Data Entry**: Manual save and auto-save modes, support for adding time points
-4. **Group Management**: Multiple experimental groups, can set comparison group
-5. **Data Analysis**: Abnormal episode tracking, statistical analysis and visualization
-6. **Report Generation**: Comprehensive report export, chart downloads
-7. **Multi-language Support**: English and Chinese interfaces
-
-User Question: {user_message}
-
-Please focus on providing the following help:
-1. **Tool Usage Guidance**: Detailed instructions on how to operate various features in the dashboard
-2. **Step-by-step Instructions**: Provide clear, actionable step-by-step guides
-3. **Feature Explanation**: Explain what each feature does and its purpose
-4. **Common Issues**: Answer questions users encounter while using the tool
-5. **Best Practices**: Provide usage tips and recommendations
-
-Response Requirements:
-- Maintain a friendly, patient, and professional attitude
-- Provide specific, actionable steps
-- Use simple, understandable language
-- If involving interface operations, clearly indicate button and option locations
-- Format clearly, using numbers or bullet points when appropriate
-- Base guidance on the above functionality summary for accuracy
-
-Please answer in English, focusing on tool usage guidance.
-        """
+# Helper function to count prompt tokens locally
+def count_tokens(text):
+    """Estimate the model's token count of a text without a network call"""
+    return sum(1 + (len(match.group()) - 1) // 6 for match in CHAT_TOKEN_PATTERN.finditer(text or ""))
+
+# Helper function to cut a text to a token budget
+def truncate_to_tokens(text, max_tokens):
+    """Return the longest prefix of text within max_tokens, marked with '…' when cut"""
+    if max_tokens <= 0:
+        return ""
+    used = 0
+    for match in CHAT_TOKEN_PATTERN.finditer(text):
+        used += 1 + (len(match.group()) - 1) // 6
+        if used > max_tokens - 1:
+            return text[:match.start()].rstrip() + "…"
+    return text
+
+# Helper function to count the tokens of a messages list
+def count_prompt_tokens(messages):
+    """Estimate the token count of a chat prompt, including per-message overhead"""
+    return sum(count_tokens(message['content']) + CHAT_MESSAGE_TOKENS for message in messages)
+
+# Helper function to keep the leading lines of a text within a token budget
+def fit_lines_to_tokens(text, max_tokens):
+    """Return the first whole lines of text that fit in max_tokens"""
+    kept = []
+    used = 0
+    for line in text.splitlines():
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).strip()
+
+# Helper function to get the chat messages of a conversation history
+def chat_history_messages(history):
+    """Keep user and assistant turns with content, dropping error replies"""
+    messages = []
+    for message in history or []:
+        content = str(message.get('content') or "").strip()
+        if message.get('role') not in ('user', 'assistant') or not content:
+            continue
+        if message['role'] == 'assistant' and content.startswith("Error"):
+            continue
+        messages.append({"role": message['role'], "content": content})
+    return messages
+
+# Helper function to compress older turns into a short summary
+def summarize_chat_turns(messages, max_tokens):
+    """Keep the first sentence of each older message, newest lines first when the budget runs out"""
+    lines = []
+    for message in messages:
+        first_sentence = re.split(r"(?<=[.!?。！？])\s*|\n", message['content'].strip(), maxsplit=1)[0]
+        speaker = "User" if message['role'] == 'user' else "Assistant"
+        lines.append(f"- {speaker}: {truncate_to_tokens(first_sentence, CHAT_SUMMARY_LINE_TOKENS)}")
+
+    kept = []
+    used = count_tokens("Summary of the earlier conversation:")
+    for line in reversed(lines):
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            break
+        kept.insert(0, line)
+        used += cost
+    if not kept:
+        return ""
+    return "Summary of the earlier conversation:\n" + "\n".join(kept)
+
+# Helper function to pick the project statistics relevant to a chat
+def chat_statistics_context(text):
+    """Return statistics of the active project for the modes named in text (else the current mode)"""
+    project_id = st.session_state.get('active_project')
+    projects = st.session_state.get('projects', {})
+    if project_id is None or project_id not in projects:
+        return ""
+    project = projects[project_id]
+
+    lowered = (text or "").lower()
+    modes = [mode for mode in ALL_MODES if any(word in lowered for word in CHAT_MODE_KEYWORDS[mode])]
+    if not modes and st.session_state.get('mode') in ALL_MODES:
+        modes = [st.session_state.mode]
+
+    parts = []
+    for mode in modes:
+        try:
+            statistics = describe_mode_statistics(project_id, project, mode)
+        except Exception:
+            statistics = ""
+        if statistics:
+            parts.append(f"{mode}:\n{statistics}")
+    if not parts:
+        return ""
+    header = (f"Statistics of the user's current project '{project.get('name', 'N/A')}' "
+              f"({project.get('animal_type', 'N/A')}, {project.get('num_animals', 'N/A')} animals per group):")
+    return header + "\n\n" + "\n\n".join(parts)
+
+# Function to assemble a chat prompt within the token budget
+def assemble_chat_prompt(role, user_message, history=None, language='en', budget=None, references=None,
+                         excerpts=""):
+    """Return chat messages: fixed preamble, feature summary or references, uploaded file excerpts,
+    project statistics, summary of older turns, recent turns, question"""
+    budget = budget or CHAT_TOKEN_BUDGET
+    preamble = CHAT_PREAMBLES.get(language, CHAT_PREAMBLES['en']).format(
+        assistant=CHAT_ASSISTANT_NAMES[role].get(language, CHAT_ASSISTANT_NAMES[role]['en']))
+    messages = chat_history_messages(history)
+    recent, older = messages[-CHAT_RECENT_MESSAGES:], messages[:-CHAT_RECENT_MESSAGES]
+
+    # The preamble and the question always go; the question is cut if it alone overruns the budget
+    remaining = budget - count_tokens(preamble) - 2 * CHAT_MESSAGE_TOKENS
+    question = truncate_to_tokens(user_message, max(remaining // 2, 1))
+    remaining -= count_tokens(question)
+
+    # Retrieved guide passages when given, otherwise the static feature summary
+    if references is None:
+        references = CHAT_DASHBOARD_SUMMARIES.get(language, CHAT_DASHBOARD_SUMMARIES['en'])
+    references = fit_lines_to_tokens(references, min(remaining, int(budget * CHAT_REFERENCE_SHARE)))
+    remaining -= count_tokens(references)
+    if excerpts:
+        excerpts = fit_lines_to_tokens(excerpts, min(remaining, int(budget * CHAT_EXCERPT_SHARE)))
+        remaining -= count_tokens(excerpts)
+
+    # Project statistics for the modes the conversation is about, whole table rows only
+    topic = " ".join([message['content'] for message in recent if message['role'] == 'user'] + [user_message])
+    statistics = chat_statistics_context(topic)
+    if statistics:
+        statistics = fit_lines_to_tokens(statistics, min(remaining, int(budget * CHAT_STATISTICS_SHARE)))
+        remaining -= count_tokens(statistics)
+
+    # Recent turns, newest first, until the budget runs out; turns that do not fit join the summary
+    kept = []
+    for message in reversed(recent):
+        cost = count_tokens(message['content']) + CHAT_MESSAGE_TOKENS
+        if cost > remaining:
+            break
+        kept.insert(0, message)
+        remaining -= cost
+    older = older + recent[:len(recent) - len(kept)]
+    summary = summarize_chat_turns(older, remaining) if older else ""
+
+    system = "\n\n".join(part for part in [preamble, references, excerpts, statistics, summary] if part)
+    return [{"role": "system", "content": system}] + kept + [{"role": "user", "content": question}]
+
+# Offline FAQ index for the AI Tutor: BM25 over the user guide, the score definitions and the UI labels
+FAQ_README_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "README_AI.md")
+FAQ_TOP_K = int(os.getenv("FOB_FAQ_TOP_K", "4"))  # guide passages sent to the model
+FAQ_ANSWER_COVERAGE = float(os.getenv("FOB_FAQ_ANSWER_COVERAGE", "0.8"))  # share of the question a local answer covers
+FAQ_ANSWER_MARGIN = float(os.getenv("FOB_FAQ_ANSWER_MARGIN", "1.2"))  # its score over the runner-up's
+FAQ_ANSWER_MIN_TERMS = 2  # questions with fewer words (bare numbers do not count) go to the model
+FAQ_PASSAGE_WORDS = 120
+FAQ_LABELS_PER_PASSAGE = 10
+FAQ_BM25_K1 = 1.5
+FAQ_BM25_B = 0.75
+
+# Latin words, score codes like 0/4/8, numbers and runs of Chinese characters
+FAQ_TERM_PATTERN = re.compile(r"\d+(?:/\d+)+|[a-z]+|\d+(?:\.\d+)?|[\u4e00-\u9fff]+")
+FAQ_STOPWORDS = frozenset("""a an and are as at be by can do does for from how i if in is it its me my of on or
+the this to use used using what when where which who why will with you your""".split())
+
+# Helper function to split a text into index terms
+def faq_terms(text):
+    """Lowercase words without stopwords and with plural/verb endings cut; Chinese as character bigrams"""
+    terms = []
+    for token in FAQ_TERM_PATTERN.findall((text or "").lower()):
+        if '\u4e00' <= token[0] <= '\u9fff':
+            terms.extend([token] if len(token) == 1 else [token[i:i + 2] for i in range(len(token) - 1)])
+        elif token not in FAQ_STOPWORDS:
+            terms.append(re.sub(r"(?<=\w{3})(ing|ed|es|e|s)$", "", token))
+    return terms
+
+# Helper function to cut a markdown document into passages
+def split_markdown_passages(text, source):
+    """Return one passage per section, split at blank lines past FAQ_PASSAGE_WORDS; titled by heading path"""
+    passages = []
+    headings = []
+    lines = []
+    in_code = False
+
+    def flush():
+        body = "\n".join(lines).strip()
+        if body:
+            passages.append({'title': " > ".join(headings) or source, 'text': body, 'source': source})
+        lines.clear()
+
+    for line in text.splitlines():
+        if line.startswith("```"):
+            in_code = not in_code
+        heading = None if in_code else re.match(r"^(#{1,4})\s+(.*)$", line)
+        if heading:
+            flush()
+            level = len(heading.group(1))
+            headings[:] = headings[:level - 1] + [heading.group(2).replace("*", "").strip()]
+            continue
+        if not line.strip() and len(" ".join(lines).split()) >= FAQ_PASSAGE_WORDS:
+            flush()
+            continue
+        lines.append(line)
+    flush()
+    return passages
+
+# Helper function to collect the passages of the FAQ index
+def collect_faq_passages():
+    """Gather passages from README_AI.md, the Definition of Scores help and the translation strings"""
+    passages = []
+    if os.path.exists(FAQ_README_PATH):
+        with open(FAQ_README_PATH, encoding='utf-8') as readme:
+            passages.extend(split_markdown_passages(readme.read(), 'guide'))
+
+    for title, body in SCORING_HELP_SECTIONS + [("💡 Tips", SCORING_HELP_TIPS)]:
+        passages.append({'title': f"Definition of Scores > {title}", 'text': body, 'source': 'scores'})
+
+    # UI labels in English and Chinese, a few neighbouring strings per passage
+    keys = [key for key, value in TRANSLATIONS['en'].items() if isinstance(value, str)]
+    for start in range(0, len(keys), FAQ_LABELS_PER_PASSAGE):
+        rows = [f"- {TRANSLATIONS['en'][key]} / {TRANSLATIONS['zh'].get(key, '')}"
+                for key in keys[start:start + FAQ_LABELS_PER_PASSAGE]]
+        passages.append({'title': "Dashboard labels", 'text': "\n".join(rows), 'source': 'labels'})
+    return passages
+
+# Function to build the FAQ index once per server process
+@st.cache_resource
+def get_faq_index():
+    """Return the passages, term columns, idf and BM25 weight matrix (passages x terms) of the FAQ index"""
+    passages = collect_faq_passages()
+    # The passage's own heading counts twice, its parent headings once
+    documents = [faq_terms(f"{passage['title']} {passage['title'].split(' > ')[-1]} {passage['text']}")
+                 for passage in passages]
+    vocabulary = {}
+    for terms in documents:
+        for term in terms:
+            vocabulary.setdefault(term, len(vocabulary))
+
+    counts = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    for row, terms in enumerate(documents):
+        np.add.at(counts[row], [vocabulary[term] for term in terms], 1)
+
+    lengths = counts.sum(axis=1, keepdims=True)
+    document_frequency = (counts > 0).sum(axis=0)
+    idf = np.log(1 + (len(documents) - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+    norm = FAQ_BM25_K1 * (1 - FAQ_BM25_B + FAQ_BM25_B * lengths / max(float(lengths.mean()), 1.0))
+    weights = idf * counts * (FAQ_BM25_K1 + 1) / (counts + norm)
+    return {'passages': passages, 'vocabulary': vocabulary, 'idf': idf, 'weights': weights}
+
+# Function to search the FAQ index
+def search_faq(query, top_k=FAQ_TOP_K, sources=None):
+    """Return up to top_k (score, coverage, passage) triples, best BM25 score first; coverage is the
+    idf-weighted share of the query terms found in the passage (unknown terms count as the rarest)"""
+    index = get_faq_index()
+    terms = list(dict.fromkeys(faq_terms(query)))
+    if not terms or not index['passages']:
+        return []
+    columns = [index['vocabulary'][term] for term in terms if term in index['vocabulary']]
+    if not columns:
+        return []
+    idf = index['idf'][columns]
+    ideal = float(idf.sum()) + float(index['idf'].max()) * (len(terms) - len(columns))
+
+    matched = index['weights'][:, columns]
+    scores = matched.sum(axis=1)
+    coverage = (matched > 0).astype(np.float32) @ idf / ideal
+    if sources is not None:
+        scores = np.where([passage['source'] in sources for passage in index['passages']], scores, 0)
+    best = np.argsort(-scores)[:top_k]
+    return [(float(scores[row]), float(coverage[row]), index['passages'][row]) for row in best if scores[row] > 0]
+
+# Helper function to answer a tutor question from the guide alone
+def faq_answer(question):
+    """Return the guide or score passage that clearly answers a question, else None"""
+    if len({term for term in faq_terms(question) if not term.replace('.', '').isdigit()}) < FAQ_ANSWER_MIN_TERMS:
+        return None
+    results = search_faq(question, top_k=2, sources=('guide', 'scores'))
+    if not results or results[0][1] < FAQ_ANSWER_COVERAGE:
+        return None
+    if len(results) > 1 and results[0][0] < FAQ_ANSWER_MARGIN * results[1][0]:
+        return None
+    return results[0][2]
+
+# Helper function to format the guide passages sent to the model
+def faq_context(query, top_k=FAQ_TOP_K):
+    """Return the top guide passages for a query as a reference block ('' if nothing matches)"""
+    results = search_faq(query, top_k)
+    if not results:
+        return ""
+    blocks = [f"[{passage['title']}]\n{passage['text']}" for _, _, passage in results]
+    return "**Relevant Dashboard Documentation:**\n\n" + "\n\n".join(blocks)
+
+# Uploaded files for the AI tools: chunked into a per-session inverted index, searched with BM25
+FILE_CHUNK_ROWS = 20  # table rows per chunk, each chunk repeats the header
+FILE_CHUNK_TOKENS = 250  # text chunk size
+FILE_TOP_K = int(os.getenv("FOB_FILE_TOP_K", "6"))  # chunks considered per prompt
+FILE_MIN_SCORE_RATIO = 0.2  # chunks scoring below this share of the best one are left out
+FILE_REPORT_TOKENS = int(os.getenv("FOB_FILE_REPORT_TOKENS", "1500"))  # file excerpts in an AI report prompt
+FILE_SUMMARY_TOKENS = 3000  # file text sent for a file summary
+FILE_INDEX_MAX_FILES = int(os.getenv("FOB_FILE_INDEX_MAX_FILES", "20"))
+FILE_INDEX_MAX_CHUNKS = int(os.getenv("FOB_FILE_INDEX_MAX_CHUNKS", "5000"))
+
+# Helper function to pack lines of text into chunks
+def pack_text_chunks(text, max_tokens=FILE_CHUNK_TOKENS):
+    """Group lines into chunks of about max_tokens, preferring paragraph breaks; overlong lines are split"""
+    chunks = []
+    lines = []
+    used = 0
+    for line in text.splitlines():
+        cost = count_tokens(line)
+        while cost > max_tokens:
+            piece = truncate_to_tokens(line, max_tokens).rstrip("…")
+            chunks.append(piece)
+            line = line[len(piece):]
+            cost = count_tokens(line)
+        if lines and (used + cost > max_tokens or (not line.strip() and used > max_tokens // 2)):
+            chunks.append("\n".join(lines).strip())
+            lines, used = [], 0
+        lines.append(line)
+        used += cost
+    chunks.append("\n".join(lines).strip())
+    return [chunk for chunk in chunks if chunk]
+
+# Helper function to read an uploaded file for the AI tools
+def read_uploaded_file_chunks(uploaded_file):
+    """Return (chunks, message): CSV/Excel in row blocks under their header, text in paragraph blocks"""
+    try:
+        if uploaded_file is None:
+            return [], "No file uploaded"
+        
+        uploaded_file.seek(0)
+        file_extension = uploaded_file.name.split('.')[-1].lower()
+        
+        if file_extension in ['csv', 'xlsx', 'xls']:
+            # Read CSV or Excel file
+            df = pd.read_csv(uploaded_file) if file_extension == 'csv' else pd.read_excel(uploaded_file)
+            chunks = [df.iloc[start:start + FILE_CHUNK_ROWS].to_string()
+                      for start in range(0, len(df), FILE_CHUNK_ROWS)] or [df.to_string()]
+        elif file_extension in ['txt']:
+            # Read text file
+            chunks = pack_text_chunks(uploaded_file.read().decode('utf-8'))
+        else:
+            return [], f"Unsupported file type: {file_extension}. Supported types: CSV, Excel, TXT"
+        
+        if not chunks:
+            return [], "The file is empty"
+        return chunks, f"{len(chunks)} chunk(s)"
+    except Exception as e:
+        return [], f"Error processing file: {str(e)}"
+
+# Helper function to get this session's file index
+def get_file_index():
+    """Return the session's index: files (least recently used first), chunks, postings and total length"""
+    if 'file_index' not in st.session_state:
+        st.session_state.file_index = {'files': OrderedDict(), 'chunks': {}, 'postings': {}, 'total_length': 0}
+    return st.session_state.file_index
+
+# Helper function to drop one file from the index
+def remove_indexed_file(digest):
+    """Remove a file's chunks and postings"""
+    index = get_file_index()
+    entry = index['files'].pop(digest, None)
+    if entry is None:
+        return
+    for chunk_id in entry['chunks']:
+        chunk = index['chunks'].pop(chunk_id)
+        index['total_length'] -= chunk['length']
+        for term in chunk['terms']:
+            postings = index['postings'][term]
+            del postings[chunk_id]
+            if not postings:
+                del index['postings'][term]
+
+# Function to add an uploaded file to the index
+def index_file_chunks(filename, digest, chunks):
+    """Index a file's chunks (once per content digest); returns the names of files evicted to stay within caps"""
+    index = get_file_index()
+    if digest in index['files']:
+        index['files'].move_to_end(digest)
+        return []
+    
+    chunk_ids = []
+    for part, text in enumerate(chunks, start=1):
+        chunk_id = f"{digest[:12]}:{part}"
+        terms = {}
+        for term in faq_terms(text):
+            terms[term] = terms.get(term, 0) + 1
+        length = sum(terms.values())
+        index['chunks'][chunk_id] = {'digest': digest, 'filename': filename, 'part': part, 'parts': len(chunks),
+                                     'text': text, 'terms': terms, 'length': length}
+        index['total_length'] += length
+        for term, count in terms.items():
+            index['postings'].setdefault(term, {})[chunk_id] = count
+        chunk_ids.append(chunk_id)
+    index['files'][digest] = {'filename': filename, 'chunks': chunk_ids}
+    
+    # Least recently used files go first, the new one always stays
+    evicted = []
+    while len(index['files']) > 1 and (len(index['files']) > FILE_INDEX_MAX_FILES
+                                       or len(index['chunks']) > FILE_INDEX_MAX_CHUNKS):
+        oldest = next(iter(index['files']))
+        evicted.append(index['files'][oldest]['filename'])
+        remove_indexed_file(oldest)
+    return evicted
+
+# Function to search the uploaded files
+def search_file_chunks(query, top_k=FILE_TOP_K):
+    """Return up to top_k (score, chunk) pairs for a query, best first"""
+    index = get_file_index()
+    if not index['chunks']:
+        return []
+    chunk_count = len(index['chunks'])
+    average_length = max(index['total_length'] / chunk_count, 1.0)
+    
+    scores = {}
+    for term in set(faq_terms(query)):
+        postings = index['postings'].get(term)
+        if not postings:
+            continue
+        idf = np.log(1 + (chunk_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for chunk_id, count in postings.items():
+            norm = FAQ_BM25_K1 * (1 - FAQ_BM25_B + FAQ_BM25_B * index['chunks'][chunk_id]['length'] / average_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * count * (FAQ_BM25_K1 + 1) / (count + norm)
+    
+    best = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    best = [chunk_id for chunk_id in best if scores[chunk_id] >= FILE_MIN_SCORE_RATIO * scores[best[0]]]
+    for chunk_id in best:
+        index['files'].move_to_end(index['chunks'][chunk_id]['digest'])
+    return [(float(scores[chunk_id]), index['chunks'][chunk_id]) for chunk_id in best]
+
+# Helper function to format the file excerpts for a prompt
+def file_context(query, max_tokens):
+    """Return the file chunks most relevant to a query within max_tokens ('' without files); when nothing
+    matches, the first chunk of the most recently used files"""
+    index = get_file_index()
+    chunks = [chunk for _, chunk in search_file_chunks(query)]
+    if not chunks:
+        chunks = [index['chunks'][entry['chunks'][0]] for entry in reversed(index['files'].values())]
+    
+    blocks = []
+    used = count_tokens("Relevant excerpts from uploaded files:")
+    for chunk in chunks:
+        block = f"[{chunk['filename']}, part {chunk['part']} of {chunk['parts']}]\n{chunk['text']}"
+        cost = count_tokens(block)
+        if used + cost <= max_tokens:
+            blocks.append(block)
+            used += cost
+    if not blocks:
+        return ""
+    return "**Relevant excerpts from uploaded files:**\n\n" + "\n\n".join(blocks)
+
+# Helper function to pick the file excerpts for an AI report
+def report_file_context(project_id, project_data, mode_eng):
+    """Return excerpts of the uploaded files that mention the report's mode, project or groups"""
+    query = " ".join([mode_eng, *CHAT_MODE_KEYWORDS.get(mode_eng, ()), project_data.get('name', ''),
+                      *get_project_groups(project_id)])
+    return file_context(query, FILE_REPORT_TOKENS)
+
+def generate_chatbot_response(user_message, language='en', stream=False, history=None):
+    """Generate chatbot response using DeepSeek AI; with stream=True returns an iterator of reply chunks"""
+    try:
+        # Check that the LLM backend is configured
+        if not llm_ready():
+            error = "Error: Failed to configure DeepSeek AI"
+            return iter([error]) if stream else error
+        
+        # Only the uploaded file chunks relevant to the question (and the previous one, for follow-ups)
+        previous = [message['content'] for message in chat_history_messages(history) if message['role'] == 'user'][-1:]
+        excerpts = file_context(" ".join(previous + [user_message]), int(CHAT_TOKEN_BUDGET * CHAT_EXCERPT_SHARE))
+        
+        # Preamble, file excerpts, project statistics and conversation so far within the token budget
+        prompt = assemble_chat_prompt('chatbot', user_message, history, language, excerpts=excerpts)
+        
+        # Use DeepSeek API
+        if stream:
+            return stream_llm_response(prompt)
+        return make_deepseek_api_call(prompt)
+        
+    except Exception as e:
+        error = f"Error generating chatbot response: {str(e)}"
+        return iter([error]) if stream else error
+
+def generate_tutor_response(user_message, language='en', history=None):
+    """Generate tutor response from the local guide index, or using DeepSeek AI with the relevant guide passages"""
+    try:
+        # Questions the guide answers with high confidence need no AI call
+        if language == 'en':
+            passage = faq_answer(user_message)
+            if passage is not None:
+                source = " > ".join(passage['title'].split(" > ")[-2:])
+                return f"{passage['text']}\n\n*From the dashboard guide: {source}*"
+        
+        # Check that the LLM backend is configured
+        if not llm_ready():
+            return "Error: Failed to configure DeepSeek AI"
+        
+        # Guide passages for the question (and the previous one, for follow-ups) replace the feature summary
+        previous = [message['content'] for message in chat_history_messages(history) if message['role'] == 'user'][-1:]
+        references = faq_context(" ".join(previous + [user_message]))
+        
+        # Preamble, guide passages, project statistics and conversation so far within the token budget
+        prompt = assemble_chat_prompt('tutor', user_message, history, language, references=references)
         
         # Use DeepSeek API
         return make_deepseek_api_call(prompt)
@@ -791,10 +2339,9 @@ Please answer in English, focusing on tool usage guidance.
 def generate_file_summary(file_content, filename, language='en'):
     """Generate summary of uploaded file content"""
     try:
-        # Check if client is already configured, if not configure it
-        if 'deepseek_client' not in globals() or deepseek_client is None:
-            if not configure_deepseek():
-                return "Error: Failed to configure DeepSeek AI"
+        # Check that the LLM backend is configured
+        if not llm_ready():
+            return "Error: Failed to configure DeepSeek AI"
         
         # Create file summary prompt
         if language == 'zh':
@@ -855,133 +2402,62 @@ def generate_group_specific_description(mode, project_data, language='en'):
         # Collect data for each group
         group_data_summary = []
         
+        animal_type = project_data.get('animal_type', 'mouse')
+        if animal_type == 'custom':
+            animal_type = project_data.get('custom_animal_name', 'animal')
+        num_animals = project_data.get('num_animals', 8)
+        
         for group in project_groups:
-            worksheet_key = f"worksheet_{group}_{mode}"
-            if worksheet_key in st.session_state:
-                df = st.session_state[worksheet_key]
-                
-                # Calculate statistics based on mode
-                if mode == "Body Weight":
-                    # Get before and after weights
-                    before_df = df[df['time'] == t('before')] if t('before') in df['time'].values else pd.DataFrame()
-                    after_df = df[df['time'] == t('after')] if t('after') in df['time'].values else pd.DataFrame()
-                    
-                    if not before_df.empty and not after_df.empty:
-                        animal_type = project_data.get('animal_type', 'mouse')
-                        if animal_type == 'custom':
-                            animal_type = project_data.get('custom_animal_name', 'animal')
-                        num_animals = project_data.get('num_animals', 8)
-                        
-                        before_weights = []
-                        after_weights = []
-                        for i in range(1, num_animals + 1):
-                            col = f'{animal_type}_{i}'
-                            if col in before_df.columns:
-                                for val in before_df[col]:
-                                    try:
-                                        before_weights.append(float(val))
-                                    except:
-                                        pass
-                            if col in after_df.columns:
-                                for val in after_df[col]:
-                                    try:
-                                        after_weights.append(float(val))
-                                    except:
-                                        pass
-                        
-                        if before_weights and after_weights:
-                            avg_before = np.mean(before_weights)
-                            avg_after = np.mean(after_weights)
-                            change = avg_after - avg_before
-                            change_pct = (change / avg_before * 100) if avg_before > 0 else 0
-                            group_data_summary.append({
-                                'group': group,
-                                'avg_before': avg_before,
-                                'avg_after': avg_after,
-                                'change': change,
-                                'change_pct': change_pct
-                            })
-                
-                elif mode == "Body Temperature":
-                    # Calculate average temperature
-                    animal_type = project_data.get('animal_type', 'mouse')
-                    if animal_type == 'custom':
-                        animal_type = project_data.get('custom_animal_name', 'animal')
-                    num_animals = project_data.get('num_animals', 8)
-                    
-                    all_temps = []
-                    for i in range(1, num_animals + 1):
-                        col = f'{animal_type}_{i}'
-                        if col in df.columns:
-                            for val in df[col]:
-                                try:
-                                    all_temps.append(float(val))
-                                except:
-                                    pass
-                    
-                    if all_temps:
-                        avg_temp = np.mean(all_temps)
-                        std_temp = np.std(all_temps)
-                        group_data_summary.append({
-                            'group': group,
-                            'avg_temp': avg_temp,
-                            'std_temp': std_temp
-                        })
+            # Typed frames hold floats (or label codes), so invalid cells are already missing
+            typed_df = get_typed_worksheet(get_worksheet_key(project_id, group, mode), mode, animal_type, num_animals)
+            if typed_df is None:
+                continue
+            animal_columns = [col for col in typed_df.columns if col not in ('time', 'observation')]
+            values = typed_df[animal_columns]
+            
+            # Calculate statistics based on mode
+            if mode == "Body Weight":
+                # Get before and after weights
+                before_weights = values[typed_df['time'] == 'before'].stack().dropna()
+                after_weights = values[typed_df['time'] == 'after'].stack().dropna()
                 
-                elif mode in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-                    # Calculate abnormal percentage
-                    animal_type = project_data.get('animal_type', 'mouse')
-                    if animal_type == 'custom':
-                        animal_type = project_data.get('custom_animal_name', 'animal')
-                    num_animals = project_data.get('num_animals', 8)
-                    
-                    total_count = 0
-                    abnormal_count = 0
-                    for i in range(1, num_animals + 1):
-                        col = f'{animal_type}_{i}'
-                        if col in df.columns:
-                            for val in df[col]:
-                                total_count += 1
-                                val_str = str(val).lower()
-                                if val_str in [t('abnormal').lower(), t('pale').lower(), t('cyanosis').lower()]:
-                                    abnormal_count += 1
-                    
-                    if total_count > 0:
-                        abnormal_pct = (abnormal_count / total_count * 100)
-                        group_data_summary.append({
-                            'group': group,
-                            'abnormal_pct': abnormal_pct,
-                            'abnormal_count': abnormal_count,
-                            'total_count': total_count
-                        })
+                if not before_weights.empty and not after_weights.empty:
+                    avg_before = before_weights.mean()
+                    avg_after = after_weights.mean()
+                    change = avg_after - avg_before
+                    change_pct = (change / avg_before * 100) if avg_before > 0 else 0
+                    group_data_summary.append({
+                        'group': group,
+                        'avg_before': avg_before,
+                        'avg_after': avg_after,
+                        'change': change,
+                        'change_pct': change_pct
+                    })
+            
+            elif mode in BINARY_MODES:
+                # Calculate abnormal percentage; every label except normal is abnormal
+                total_count = values.size
+                abnormal_count = int(values.gt(0).fillna(False).to_numpy().sum())
                 
-                else:  # General Behavior
-                    # Calculate mean score
-                    animal_type = project_data.get('animal_type', 'mouse')
-                    if animal_type == 'custom':
-                        animal_type = project_data.get('custom_animal_name', 'animal')
-                    num_animals = project_data.get('num_animals', 8)
-                    
-                    all_scores = []
-                    for i in range(1, num_animals + 1):
-                        col = f'{animal_type}_{i}'
-                        if col in df.columns:
-                            for val in df[col]:
-                                try:
-                                    score = float(val)
-                                    if not pd.isna(score):
-                                        all_scores.append(score)
-                                except:
-                                    pass
-                    
-                    if all_scores:
-                        avg_score = np.mean(all_scores)
-                        std_score = np.std(all_scores)
-                        group_data_summary.append({
-                            'group': group,
-                            'avg_score': avg_score,
-                            'std_score': std_score
-                        })
+                if total_count > 0:
+                    abnormal_pct = (abnormal_count / total_count * 100)
+                    group_data_summary.append({
+                        'group': group,
+                        'abnormal_pct': abnormal_pct,
+                        'abnormal_count': abnormal_count,
+                        'total_count': total_count
+                    })
+            
+            else:
+                # Body Temperature: average temperature; General Behavior: mean score
+                readings = values.stack().dropna()
+                if not readings.empty:
+                    prefix = 'temp' if mode == "Body Temperature" else 'score'
+                    group_data_summary.append({
+                        'group': group,
+                        f'avg_{prefix}': readings.mean(),
+                        f'std_{prefix}': readings.std(ddof=0)
+                    })
         
         # Generate description based on collected data
         if language == 'zh':
@@ -1026,122 +2502,117 @@ def generate_group_specific_description(mode, project_data, language='en'):
     except Exception as e:
         return f"Error generating description: {str(e)}"
 
-def generate_powerpoint_content(project_data, mode_eng, language='en', file_summaries=None):
-    """Generate comprehensive PowerPoint content using AI"""
-    try:
-        # Check if client is already configured, if not configure it
-        if 'deepseek_client' not in globals() or deepseek_client is None:
-            if not configure_deepseek():
-                return "Error: Failed to configure DeepSeek AI"
-        
-        # Create AI prompt for PowerPoint content
-        if language == 'zh':
-            prompt = f"""
-你是一个专业的科学演示文稿制作专家。请为FOB测试分析创建一个完整的PowerPoint演示文稿内容。
-
-项目信息：
-- 项目名称：{project_data.get('name', 'N/A')}
-- 动物类型：{project_data.get('animal_type', 'N/A')}
-- 每组动物数量：{project_data.get('num_animals', 'N/A')}
-- 分析模式：{mode_eng}
-
-请创建以下幻灯片内容：
-
-1. **标题页**：项目标题和基本信息
-2. **介绍**：FOB测试的背景、目的和重要性
-3. **实验设计**：实验方法、动物分组、观察参数
-4. **实验描述**：具体的实验步骤和观察指标
-5. **结果分析**：主要发现和数据分析
-6. **讨论**：结果解释和意义
-7. **结论**：主要结论和建议
-
-请为每个幻灯片提供：
-- 幻灯片标题
-- 要点内容（使用项目符号）
-- 简洁明了的表述
-
-格式要求：
-- 使用中文
-- 内容专业且易于理解
-- 适合学术演示
-- 包含关键数据点
-"""
-        else:
-            prompt = f"""
-You are a professional scientific presentation expert. Please create comprehensive PowerPoint content for FOB test analysis.
-
-Project Information:
-- Project Name: {project_data.get('name', 'N/A')}
-- Animal Type: {project_data.get('animal_type', 'N/A')}
-- Animals per Group: {project_data.get('num_animals', 'N/A')}
-- Analysis Mode: {mode_eng}
-
-Please create content for the following slides:
-
-1. **Title Slide**: Project title and basic information
-2. **Introduction**: Background, purpose, and importance of FOB testing
-3. **Experimental Design**: Methods, animal grouping, observation parameters
-4. **Experiment Description**: Specific experimental procedures and observation indicators
-5. **Results Analysis**: Main findings and data analysis
-6. **Discussion**: Result interpretation and significance
-7. **Conclusion**: Main conclusions and recommendations
-
-For each slide, provide:
-- Slide title
-- Bullet point content
-- Clear and concise language
-
-Format requirements:
-- Use English
-- Professional and understandable content
-- Suitable for academic presentation
-- Include key data points
-        """
-        
-        # Use DeepSeek API
-        return make_deepseek_api_call(prompt)
-        
-    except Exception as e:
-        return f"Error generating PowerPoint content: {str(e)}"
+# python-pptx chart types for native chart specs
+NATIVE_CHART_TYPES = {
+    'bar': XL_CHART_TYPE.BAR_CLUSTERED,
+    'column_clustered': XL_CHART_TYPE.COLUMN_CLUSTERED,
+    'line': XL_CHART_TYPE.LINE_MARKERS
+}
 
-def create_powerpoint_presentation(project_data, mode_eng, language='en', file_summaries=None, charts_data=None):
-    """Create a PowerPoint presentation with AI-generated content, charts, and professional template"""
+# Helper function to place a chart on a slide
+def add_chart_to_slide(slide, chart, left, top, width, height, native_charts=False):
+    """Add an editable native chart when requested and available, otherwise the chart image fitted to the box"""
+    spec = chart.get('native')
+    if native_charts and spec:
+        chart_data = CategoryChartData()
+        chart_data.categories = spec['categories']
+        for name, values in spec['series']:
+            chart_data.add_series(name, [None if value is None or pd.isna(value) else float(value) for value in values])
+        graphic_frame = slide.shapes.add_chart(NATIVE_CHART_TYPES[spec['chart_type']], left, top, width, height, chart_data)
+        native_chart = graphic_frame.chart
+        native_chart.has_legend = len(spec['series']) > 1
+        if native_chart.has_legend:
+            native_chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+            native_chart.legend.include_in_layout = False
+        native_chart.value_axis.has_title = True
+        native_chart.value_axis.axis_title.text_frame.text = spec['value_axis_title']
+        return graphic_frame
+    if chart.get('data') is None:
+        return None
+    
+    # Fit the image inside the box without stretching it and center it there
+    picture = slide.shapes.add_picture(BytesIO(chart['data']), left, top)
+    scale = min(width / picture.width, height / picture.height)
+    picture.width, picture.height = int(picture.width * scale), int(picture.height * scale)
+    picture.left = int(left + (width - picture.width) / 2)
+    picture.top = int(top + (height - picture.height) / 2)
+    return picture
+
+# Deck colors shared by the base template and the slide builders
+DECK_BACKGROUND_COLOR = RGBColor(240, 248, 255)  # Light blue background
+DECK_TITLE_COLOR = RGBColor(25, 25, 112)  # Dark blue
+DECK_BODY_COLOR = RGBColor(47, 84, 150)  # Medium blue
+
+# Helper function to style every level of a master text style
+def style_text_levels(text_style, size, color, bold=None):
+    """Set the default size, color and weight of each lvlNpPr in a master title/body style"""
+    for level in text_style:
+        if not level.tag.startswith(qn('a:lvl')):
+            continue
+        default_run = level.find(qn('a:defRPr'))
+        if default_run is None:
+            default_run = etree.SubElement(level, qn('a:defRPr'))
+        default_run.set('sz', str(int(size.pt * 100)))
+        if bold is not None:
+            default_run.set('b', '1' if bold else '0')
+        for fill in default_run.findall(qn('a:solidFill')):
+            default_run.remove(fill)
+        # The fill follows an optional outline and precedes the typeface elements
+        fill = parse_xml(f'<a:solidFill {nsdecls("a")}><a:srgbClr val="{color}"/></a:solidFill>')
+        default_run.insert(1 if default_run.find(qn('a:ln')) is not None else 0, fill)
+
+# Function to build the base PowerPoint template once per process
+@st.cache_resource
+def get_deck_base_template():
+    """Return the bytes of a 16:9 deck whose master carries the background, title and body fonts"""
+    prs = Presentation()
+    prs.slide_width = Inches(13.33)
+    prs.slide_height = Inches(7.5)
+    
+    master = prs.slide_master
+    master.background.fill.solid()
+    master.background.fill.fore_color.rgb = DECK_BACKGROUND_COLOR
+    text_styles = master._element.find(qn('p:txStyles'))
+    style_text_levels(text_styles.find(qn('p:titleStyle')), Pt(44), DECK_TITLE_COLOR, bold=True)
+    style_text_levels(text_styles.find(qn('p:bodyStyle')), Pt(18), DECK_BODY_COLOR)
+    
+    # Layout placeholders inherit the master fonts instead of their own colors
+    for layout in prs.slide_layouts:
+        for placeholder in layout.placeholders:
+            for fill in placeholder._element.findall('.//' + qn('a:lstStyle') + '//' + qn('a:solidFill')):
+                fill.getparent().remove(fill)
+    
+    template = BytesIO()
+    prs.save(template)
+    return template.getvalue()
+
+# Helper function to start a deck from the base template
+def new_deck_presentation():
+    """Return a fresh Presentation cloned from the cached base template"""
+    return Presentation(BytesIO(get_deck_base_template()))
+
+def create_powerpoint_presentation(project_data, mode_eng, language='en', file_summaries=None, charts_data=None,
+                                   native_charts=False, sections=None):
+    """Create a PowerPoint presentation with AI-generated content, charts, and professional template.
+
+    sections maps a mode to its cached deck section (see get_deck_section); their
+    results text and AI narrative (see fill_deck_narratives) are reused instead of
+    being regenerated, with the built-in text as fallback.
+    """
     try:
-        # Generate AI content first
-        ai_content = generate_powerpoint_content(project_data, mode_eng, language, file_summaries)
+        # Clone the base template (16:9, background and fonts already applied)
+        prs = new_deck_presentation()
         
-        # Create a new presentation
-        prs = Presentation()
-        
-        # Set slide dimensions (16:9 aspect ratio)
-        prs.slide_width = Inches(13.33)
-        prs.slide_height = Inches(7.5)
-        
-        # Apply professional template styling
+        # Fill a slide's placeholders; the template supplies the styling
         def apply_template_styling(slide, title_text, content_text=""):
-            """Apply professional styling to slides"""
-            # Set background color (light blue gradient effect)
-            background = slide.background
-            fill = background.fill
-            fill.solid()
-            fill.fore_color.rgb = RGBColor(240, 248, 255)  # Light blue background
-            
-            # Style the title
+            """Set the title and content text, emphasizing bullet lines"""
             if slide.shapes.title:
-                title = slide.shapes.title
-                title.text = title_text
-                title.text_frame.paragraphs[0].font.size = Pt(44)
-                title.text_frame.paragraphs[0].font.bold = True
-                title.text_frame.paragraphs[0].font.color.rgb = RGBColor(25, 25, 112)  # Dark blue
-                title.text_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
+                slide.shapes.title.text = title_text
             
-            # Style the content
             if content_text and slide.placeholders[1]:
                 content = slide.placeholders[1]
                 content.text = content_text
                 for paragraph in content.text_frame.paragraphs:
-                    paragraph.font.size = Pt(18)
-                    paragraph.font.color.rgb = RGBColor(47, 84, 150)  # Medium blue
                     if paragraph.text.startswith('•') or paragraph.text.startswith('-'):
                         paragraph.font.bold = True
                         paragraph.font.size = Pt(20)
@@ -1199,6 +2670,10 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
         """
         apply_template_styling(slide, method_title, method_content)
         
+        # Each distinct chart is placed once; identical images share one media part
+        if charts_data:
+            charts_data = list({chart.get('digest', id(chart)): chart for chart in charts_data}.values())
+        
         # Add comprehensive analysis slides for each mode
         if charts_data:
             # Group charts by mode
@@ -1292,6 +2767,10 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
                     Results from this analysis provide essential data for understanding the comprehensive impact of experimental treatments on neurological and physiological function.
                     """
                 
+                # Prefer the section's narrative written from this mode's statistics
+                narrative = (sections or {}).get(mode, {}).get('narrative') or {}
+                mode_intro_content = narrative.get('intro', mode_intro_content)
+                
                 apply_template_styling(slide, mode_intro_title, mode_intro_content)
                 
                 # Part 2: Results Slides (Grouped by chart type)
@@ -1299,10 +2778,6 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
                 group_charts = [c for c in mode_charts if 'Group Comparison' in c['title']]
                 if group_charts:
                     slide = prs.slides.add_slide(prs.slide_layouts[6])
-                    background = slide.background
-                    fill = background.fill
-                    fill.solid()
-                    fill.fore_color.rgb = RGBColor(240, 248, 255)
                     
                     # Add chart title
                     title_box = slide.shapes.add_textbox(Inches(1), Inches(0.5), Inches(11.33), Inches(1))
@@ -1310,36 +2785,39 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
                     title_frame.text = f"{mode} - Group Comparison Results"
                     title_frame.paragraphs[0].font.size = Pt(28)
                     title_frame.paragraphs[0].font.bold = True
-                    title_frame.paragraphs[0].font.color.rgb = RGBColor(25, 25, 112)
+                    title_frame.paragraphs[0].font.color.rgb = DECK_TITLE_COLOR
                     title_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
                     
-                    # Add chart image
-                    chart_box = slide.shapes.add_picture(
-                        BytesIO(group_charts[0]['data']), 
+                    # Add chart (native or image)
+                    chart_box = add_chart_to_slide(
+                        slide,
+                        group_charts[0], 
                         Inches(1.5), 
                         Inches(2), 
                         Inches(7), 
-                        Inches(4)
+                        Inches(4),
+                        native_charts
                     )
                     
                     # Generate group-specific description based on actual data
-                    results_desc = generate_group_specific_description(mode, project_data, language)
+                    if narrative.get('results'):
+                        results_desc = narrative['results']
+                    elif sections and mode in sections:
+                        results_desc = sections[mode]['results_desc']
+                    else:
+                        results_desc = generate_group_specific_description(mode, project_data, language)
                     
                     desc_box = slide.shapes.add_textbox(Inches(1), Inches(6.5), Inches(11.33), Inches(1))
                     desc_frame = desc_box.text_frame
                     desc_frame.text = results_desc
                     desc_frame.paragraphs[0].font.size = Pt(14)
-                    desc_frame.paragraphs[0].font.color.rgb = RGBColor(47, 84, 150)
+                    desc_frame.paragraphs[0].font.color.rgb = DECK_BODY_COLOR
                     desc_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
                 
                 # Time series results
                 time_charts = [c for c in mode_charts if 'Time Series' in c['title']]
                 if time_charts:
                     slide = prs.slides.add_slide(prs.slide_layouts[6])
-                    background = slide.background
-                    fill = background.fill
-                    fill.solid()
-                    fill.fore_color.rgb = RGBColor(240, 248, 255)
                     
                     # Add chart title
                     title_box = slide.shapes.add_textbox(Inches(1), Inches(0.5), Inches(11.33), Inches(1))
@@ -1347,49 +2825,35 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
                     title_frame.text = f"{mode} - Time Series Analysis"
                     title_frame.paragraphs[0].font.size = Pt(28)
                     title_frame.paragraphs[0].font.bold = True
-                    title_frame.paragraphs[0].font.color.rgb = RGBColor(25, 25, 112)
+                    title_frame.paragraphs[0].font.color.rgb = DECK_TITLE_COLOR
                     title_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
                     
-                    # Add chart image
-                    chart_box = slide.shapes.add_picture(
-                        BytesIO(time_charts[0]['data']), 
+                    # Add chart (native or image)
+                    chart_box = add_chart_to_slide(
+                        slide,
+                        time_charts[0], 
                         Inches(1.5), 
                         Inches(2), 
                         Inches(7), 
-                        Inches(4)
+                        Inches(4),
+                        native_charts
                     )
                     
-                    # Add results description (150 words max)
-                    if mode == "General Behavior":
-                        results_desc = "Time series analysis revealed dynamic changes in behavioral patterns over the experimental period. Control animals maintained consistent behavioral performance throughout, while treatment groups showed time-dependent modifications. Peak effects were observed at specific timepoints, indicating temporal dynamics of treatment response."
-                    elif mode == "Autonomic and Sensorimotor Functions":
-                        results_desc = "Temporal analysis showed evolving patterns in autonomic function across the experimental timeline. Control animals maintained stable autonomic responses, while treatment groups exhibited time-dependent changes in sensorimotor coordination. Peak autonomic effects were observed at specific timepoints."
-                    elif mode == "Reflex Capabilities":
-                        results_desc = "Time-dependent analysis revealed changing patterns in reflex responses throughout the experimental period. Control animals maintained consistent reflex function, while treatment groups showed temporal modifications in response patterns. Peak reflex effects were observed at specific timepoints."
-                    elif mode == "Body Temperature":
-                        results_desc = "Temporal monitoring revealed dynamic changes in body temperature patterns over the experimental timeline. Control animals maintained stable temperature regulation, while treatment groups showed time-dependent temperature modifications. Peak thermoregulatory effects were observed at specific timepoints."
-                    elif mode == "Body Weight":
-                        results_desc = "Time series analysis showed progressive changes in body weight patterns throughout the experimental period. Control animals maintained stable weight trajectories, while treatment groups exhibited time-dependent weight modifications. Peak weight effects were observed at specific timepoints."
-                    elif mode == "Convulsive Behaviors and Excitability":
-                        results_desc = "Temporal analysis revealed changing patterns in excitability responses over the experimental timeline. Control animals maintained consistent excitability levels, while treatment groups showed time-dependent modifications in convulsive behaviors. Peak excitability effects were observed at specific timepoints."
-                    else:
-                        results_desc = f"Time series analysis of {mode} revealed dynamic changes over the experimental period, with control animals maintaining consistent responses and treatment groups showing time-dependent modifications. Peak effects were observed at specific timepoints, indicating temporal dynamics of treatment response."
+                    # Describe what the statistics show; the chart's own description is the neutral fallback
+                    results_desc = (narrative.get('time_series') or (sections or {}).get(mode, {}).get('time_series_desc')
+                                    or time_charts[0].get('description') or f"Group means of {mode} at each time point")
                     
                     desc_box = slide.shapes.add_textbox(Inches(1), Inches(6.5), Inches(11.33), Inches(1))
                     desc_frame = desc_box.text_frame
                     desc_frame.text = results_desc
                     desc_frame.paragraphs[0].font.size = Pt(14)
-                    desc_frame.paragraphs[0].font.color.rgb = RGBColor(47, 84, 150)
+                    desc_frame.paragraphs[0].font.color.rgb = DECK_BODY_COLOR
                     desc_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
                 
                 # Statistical summary results
                 stats_charts = [c for c in mode_charts if 'Statistical Summary' in c['title']]
                 if stats_charts:
                     slide = prs.slides.add_slide(prs.slide_layouts[6])
-                    background = slide.background
-                    fill = background.fill
-                    fill.solid()
-                    fill.fore_color.rgb = RGBColor(240, 248, 255)
                     
                     # Add chart title
                     title_box = slide.shapes.add_textbox(Inches(1), Inches(0.5), Inches(11.33), Inches(1))
@@ -1397,39 +2861,29 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
                     title_frame.text = f"{mode} - Statistical Summary"
                     title_frame.paragraphs[0].font.size = Pt(28)
                     title_frame.paragraphs[0].font.bold = True
-                    title_frame.paragraphs[0].font.color.rgb = RGBColor(25, 25, 112)
+                    title_frame.paragraphs[0].font.color.rgb = DECK_TITLE_COLOR
                     title_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
                     
-                    # Add chart image
-                    chart_box = slide.shapes.add_picture(
-                        BytesIO(stats_charts[0]['data']), 
+                    # Add chart (native or image)
+                    chart_box = add_chart_to_slide(
+                        slide,
+                        stats_charts[0], 
                         Inches(1.5), 
                         Inches(2), 
                         Inches(7), 
-                        Inches(4)
+                        Inches(4),
+                        native_charts
                     )
                     
-                    # Add results description (150 words max)
-                    if mode == "General Behavior":
-                        results_desc = "Statistical analysis confirmed significant treatment effects on behavioral parameters, with clear differences in mean scores, standard deviations, and distribution patterns across groups. Control animals showed optimal statistical measures, while treatment groups exhibited varying degrees of statistical modification."
-                    elif mode == "Autonomic and Sensorimotor Functions":
-                        results_desc = "Statistical evaluation revealed significant treatment effects on autonomic parameters, with distinct differences in mean values and variability across experimental groups. Control animals maintained optimal statistical measures, while treatment groups showed significant statistical modifications in autonomic function."
-                    elif mode == "Reflex Capabilities":
-                        results_desc = "Statistical analysis confirmed significant treatment effects on reflex parameters, with clear differences in response distributions and variability across groups. Control animals demonstrated optimal statistical measures, while treatment groups exhibited significant statistical modifications in reflex function."
-                    elif mode == "Body Temperature":
-                        results_desc = "Statistical evaluation revealed significant treatment effects on temperature parameters, with distinct differences in mean temperatures and variability across experimental groups. Control animals maintained optimal statistical measures, while treatment groups showed significant statistical modifications in thermoregulation."
-                    elif mode == "Body Weight":
-                        results_desc = "Statistical analysis confirmed significant treatment effects on weight parameters, with clear differences in weight distributions and variability across groups. Control animals demonstrated optimal statistical measures, while treatment groups exhibited significant statistical modifications in weight patterns."
-                    elif mode == "Convulsive Behaviors and Excitability":
-                        results_desc = "Statistical evaluation revealed significant treatment effects on excitability parameters, with distinct differences in response distributions and variability across experimental groups. Control animals maintained optimal statistical measures, while treatment groups showed significant statistical modifications in excitability patterns."
-                    else:
-                        results_desc = f"Statistical analysis of {mode} confirmed significant treatment effects, with clear differences in mean values, standard deviations, and distribution patterns across experimental groups. Control animals demonstrated optimal statistical measures, while treatment groups exhibited significant statistical modifications."
+                    # Describe what the statistics show; the chart's own description is the neutral fallback
+                    results_desc = (narrative.get('summary') or (sections or {}).get(mode, {}).get('summary_desc')
+                                    or stats_charts[0].get('description') or f"Summary statistics of {mode} per group at the last time point")
                     
                     desc_box = slide.shapes.add_textbox(Inches(1), Inches(6.5), Inches(11.33), Inches(1))
                     desc_frame = desc_box.text_frame
                     desc_frame.text = results_desc
                     desc_frame.paragraphs[0].font.size = Pt(14)
-                    desc_frame.paragraphs[0].font.color.rgb = RGBColor(47, 84, 150)
+                    desc_frame.paragraphs[0].font.color.rgb = DECK_BODY_COLOR
                     desc_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
                 
                 # Part 3: Mode Conclusion (150 words max)
@@ -1494,6 +2948,8 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
                     The results contribute essential data for understanding the safety and efficacy profile of experimental treatments and support informed decision-making in drug development protocols.
                     """
                 
+                mode_conclusion_content = narrative.get('conclusion', mode_conclusion_content)
+                
                 apply_template_styling(slide, mode_conclusion_title, mode_conclusion_content)
         
         # Add Statistical Summary slide
@@ -1580,6 +3036,42 @@ def create_powerpoint_presentation(project_data, mode_eng, language='en', file_s
     except Exception as e:
         return f"Error creating PowerPoint presentation: {str(e)}"
 
+# Definition of Scores help: shown in the main area and indexed for the AI Tutor
+SCORING_HELP_SECTIONS = [
+    ("🐭 General Behavior (0/4/8 System)", """- **0**: Normal behavior, no abnormalities
+- **4**: Mild abnormalities, slight deviations from normal
+- **8**: Severe abnormalities, significant deviations
+- **+/-**: Modifiers (e.g., 4+ = mild to moderate, 4- = very mild)
+- **Normal Range**: 2-6 (scores outside this range indicate abnormalities)
+- **Default Initialization**: All scores start at 4"""),
+    ("🫁 Autonomic and Sensorimotor Functions (Binary)", """- **Normal**: Standard autonomic responses, normal skin color, regular breathing
+- **Abnormal**: Piloerection, cyanosis, irregular breathing, stertorous breathing
+- **Scoring**: Each observation is marked as Normal or Abnormal
+- **Default Initialization**: All scores start as Normal"""),
+    ("🦴 Reflex Capabilities (Binary)", """- **Normal**: Proper reflex responses, normal gait, appropriate pain response
+- **Abnormal**: Reduced reflexes, abnormal gait, catalepsy, poor pain response
+- **Scoring**: Each reflex test is marked as Normal or Abnormal
+- **Default Initialization**: All scores start as Normal"""),
+    ("🌡️ Body Temperature (Continuous)", """- **Normal Range**: 36-38°C (96.8-100.4°F)
+- **Mice**: Typically 37.0°C ± 0.5°C
+- **Rats**: Typically 37.5°C ± 0.5°C
+- **Scoring**: Record actual temperature values in degrees Celsius
+- **Default Initialization**: Mice start at 37.0°C, Rats at 37.5°C"""),
+    ("⚖️ Body Weight (Continuous)", """- **Measurement**: Before and after experiment weights in grams
+- **Calculation**: Automatic weight change calculation
+- **Normal**: Slight weight loss due to stress/food restriction
+- **Scoring**: Record actual weight values, changes calculated automatically
+- **Default Initialization**: Mice start at 25.0g, Rats at 250.0g"""),
+    ("⚡ Convulsive Behaviors and Excitability (Binary)", """- **Normal**: No convulsive activity, normal excitability
+- **Abnormal**: Tremors, convulsions, stereotypy, excessive excitability
+- **Scoring**: Each behavior is marked as Normal or Abnormal
+- **Default Initialization**: All scores start as Normal""")
+]
+SCORING_HELP_TIPS = """- **Consistency**: Use the same scoring criteria across all observations
+- **Documentation**: Record specific observations that led to each score
+- **Training**: Ensure all observers are trained on scoring criteria
+- **Validation**: Cross-check scores between observers for reliability"""
+
 # Language translations - Updated with Body Weight mode
 TRANSLATIONS = {
     'en': {
@@ -1690,11 +3182,39 @@ TRANSLATIONS = {
         'export_success': 'Project data exported successfully!',
         'import_success': 'Project data imported successfully!',
         'import_warning': 'This will replace all current data. Continue?',
+        'delta_export': 'Only changes since last export',
+        'store_unavailable': 'Project store unavailable: changes in this session are not saved. See the server log for details.',
+        'autosave_failed': 'Autosave failed: {error}',
+        'delta_export_help': 'Write only worksheets changed since the last export downloaded in this session. Import the full export together with its deltas to restore.',
+        'bulk_import': 'Bulk Import Workbook',
+        'bulk_import_help': 'Upload one Excel workbook (or ZIP of CSVs) with a sheet per group and mode, named {group}_{code}. Codes: GB, ASF, RC, BT, BW, CBE.',
+        'bulk_import_success': 'Imported {worksheets} worksheets',
+        'bulk_import_errors': 'Nothing was imported; invalid cells or sheets found',
+        'bulk_import_empty': 'No worksheets found in file',
+        'unrecognized_sheet': 'Sheet name does not match {group}_{code}',
+        'duplicate_sheet': 'Same group and mode as sheet "{sheet}"',
+        'export_workbook': 'Export Excel Workbook',
+        'export_workbook_help': 'Download every worksheet with mean scores, episodes and weight changes as one .xlsx',
+        'include_charts': 'Include charts',
+        'download_workbook': 'Download Workbook',
+        'charts': 'Charts',
         'no_project_to_export': 'No active project to export',
         'invalid_zip_file': 'Invalid ZIP file format',
         'filling_all': 'Filling all worksheets with random data...',
         'fill_complete': 'All worksheets filled with random data!',
         'download_plot': 'Download Plot',
+        'interactive_charts': 'Interactive charts',
+        'interactive_charts_help': 'Zoom, pan and show/hide groups in the browser. Turn off for static images.',
+        'prepare_plot_export': 'Prepare Image Export',
+        'image_format': 'Image format',
+        'statistics_by_time': 'Statistics by Group and Time',
+        'statistics_by_time_help': 'One value per animal and time: the mean over observations (% abnormal observations for Normal/Abnormal modes, grams for body weight)',
+        'stat_n': 'N',
+        'stat_mean': 'Mean',
+        'stat_std': 'SD',
+        'stat_min': 'Min',
+        'stat_max': 'Max',
+        'stat_median': 'Median',
         'abnormal_count': 'Abnormal Count',
         'binary_instruction': '**Instructions**: Click on any cell to toggle between Normal (default) and Abnormal (red). Each observation is assessed as either Normal or Abnormal for each animal.',
         'percentage_abnormal': '% Abnormal',
@@ -1743,6 +3263,9 @@ TRANSLATIONS = {
         'fob_test': 'FOB Test',
         'description_of_scores': 'Description of Scores',
         'project_management': 'Project Management',
+        'saved_stores': 'Saved Sessions',
+        'saved_stores_help': 'Open the projects autosaved by an earlier session, for example after a restart or a lost link.',
+        'open_saved_store': 'Open',
         'create_new_project': 'Create New Project',
         'no_projects_yet': 'No projects created yet. Click \'Create New Project\' to get started.',
         'ai_tutor': 'AI Tutor',
@@ -1754,11 +3277,31 @@ TRANSLATIONS = {
         'upload_help': 'Upload a filled-in CSV or Excel file that matches the worksheet template',
         'download_template': 'Download Template',
         'file_uploaded_success': 'File uploaded and data imported successfully!',
+        'upload_parsed': '{rows} rows, {times} time points, {values} valid values',
         'invalid_file_format': 'Invalid file format. Please upload a CSV or Excel file.',
         'template_mismatch': 'File format does not match the expected template. Please check the column structure.',
         'import_data': 'Import Data',
         'replace_data': 'Replace Current Data',
         'merge_data': 'Merge with Current Data',
+        'merge_policy': 'When uploaded values differ from current data',
+        'take_incoming': 'Take uploaded values',
+        'keep_existing': 'Keep current values',
+        'fail_on_conflict': 'Stop and show conflicts',
+        'merge_conflicts': 'Merge stopped: uploaded values conflict with existing data',
+        'undo': 'Undo',
+        'redo': 'Redo',
+        'undo_help': 'Undo the last change to the worksheets in this session, including changes synced to other groups and modes',
+        'redo_help': 'Redo the last undone change',
+        'audit_trail': 'Audit Trail',
+        'download_audit': 'Download Audit Trail (CSV)',
+        'no_edits': 'No edits recorded for this worksheet yet',
+        'edited': 'edit',
+        'undo_of': 'undo of action {action}',
+        'redo_of': 'redo of action {action}',
+        'nothing_to_undo': 'Nothing to undo',
+        'nothing_to_redo': 'Nothing to redo',
+        'undo_unavailable': 'A worksheet changed by this step is no longer available; nothing was changed',
+        'invalid_cells': 'Invalid cells found',
         'fob_intro_title': 'FOB (Functional Observational Battery) - Rodent Functional Scale Observation',
         'fob_intro_desc': 'FOB is a systematic **animal neurobehavioral observation method**, primarily used to assess the effects or toxicity of compounds or drugs on **central nervous system function**. It evaluates the functional status of animals (usually rats or mice) through a series of standardized behavioral, physiological, and neural reflex indicators, providing qualitative and semi-quantitative assessment.',
         'fob_purpose_title': 'Purpose',
@@ -1890,11 +3433,39 @@ TRANSLATIONS = {
         'export_success': '项目数据导出成功！',
         'import_success': '项目数据导入成功！',
         'import_warning': '这将替换所有当前数据。继续吗？',
+        'delta_export': '仅导出上次导出后的更改',
+        'store_unavailable': '项目存储不可用：本次会话的更改不会被保存。详情请查看服务器日志。',
+        'autosave_failed': '自动保存失败：{error}',
+        'delta_export_help': '仅写入本次会话上次下载的导出之后更改的工作表。恢复时请将完整导出与其增量文件一起导入。',
+        'bulk_import': '批量导入工作簿',
+        'bulk_import_help': '上传一个Excel工作簿（或CSV压缩包），每个组和模式一个工作表，命名为 {group}_{code}。代码：GB、ASF、RC、BT、BW、CBE。',
+        'bulk_import_success': '已导入 {worksheets} 个工作表',
+        'bulk_import_errors': '未导入任何数据；发现无效单元格或工作表',
+        'bulk_import_empty': '文件中未找到工作表',
+        'unrecognized_sheet': '工作表名称不符合 {group}_{code} 格式',
+        'duplicate_sheet': '与工作表“{sheet}”的组和模式相同',
+        'export_workbook': '导出Excel工作簿',
+        'export_workbook_help': '将所有工作表及平均分数、异常事件和体重变化下载为一个.xlsx文件',
+        'include_charts': '包含图表',
+        'download_workbook': '下载工作簿',
+        'charts': '图表',
         'no_project_to_export': '没有活动项目可导出',
         'invalid_zip_file': '无效的ZIP文件格式',
         'filling_all': '正在为所有工作表填充随机数据...',
         'fill_complete': '所有工作表已填充随机数据！',
         'download_plot': '下载图表',
+        'interactive_charts': '交互式图表',
+        'interactive_charts_help': '在浏览器中缩放、平移和显示/隐藏组。关闭后显示静态图片。',
+        'prepare_plot_export': '准备图片导出',
+        'image_format': '图片格式',
+        'statistics_by_time': '按组别和时间的统计',
+        'statistics_by_time_help': '每只动物每个时间点取一个值：各观察项的平均值（正常/异常模式为异常观察项百分比，体重为克）',
+        'stat_n': '样本数',
+        'stat_mean': '均值',
+        'stat_std': '标准差',
+        'stat_min': '最小值',
+        'stat_max': '最大值',
+        'stat_median': '中位数',
         'abnormal_count': '异常计数',
         'binary_instruction': '**说明**：点击任意单元格在正常（默认）和异常（红色）之间切换。每个观察项对每只动物评估为正常或异常。',
         'percentage_abnormal': '异常百分比',
@@ -1943,6 +3514,9 @@ TRANSLATIONS = {
         'fob_test': 'FOB测试',
         'description_of_scores': '评分说明',
         'project_management': '项目管理',
+        'saved_stores': '已保存的会话',
+        'saved_stores_help': '打开之前会话自动保存的项目，例如在重启或链接丢失之后。',
+        'open_saved_store': '打开',
         'create_new_project': '创建新项目',
         'no_projects_yet': '尚未创建项目。点击"创建新项目"开始使用。',
         'ai_tutor': 'AI导师',
@@ -1954,11 +3528,31 @@ TRANSLATIONS = {
         'upload_help': '上传已填写的CSV或Excel文件，该文件应与工作表模板匹配',
         'download_template': '下载模板',
         'file_uploaded_success': '文件上传成功，数据已导入！',
+        'upload_parsed': '{rows} 行，{times} 个时间点，{values} 个有效值',
         'invalid_file_format': '无效的文件格式。请上传CSV或Excel文件。',
         'template_mismatch': '文件格式与预期模板不匹配。请检查列结构。',
         'import_data': '导入数据',
         'replace_data': '替换当前数据',
         'merge_data': '与当前数据合并',
+        'merge_policy': '上传值与当前数据不一致时',
+        'take_incoming': '采用上传值',
+        'keep_existing': '保留当前值',
+        'fail_on_conflict': '停止并显示冲突',
+        'merge_conflicts': '合并已停止：上传值与现有数据冲突',
+        'undo': '撤销',
+        'redo': '重做',
+        'undo_help': '撤销本次会话中对工作表的上一次更改，包括同步到其他组和模式的更改',
+        'redo_help': '重做上一次撤销的更改',
+        'audit_trail': '审计追踪',
+        'download_audit': '下载审计追踪 (CSV)',
+        'no_edits': '此工作表尚无编辑记录',
+        'edited': '编辑',
+        'undo_of': '撤销操作 {action}',
+        'redo_of': '重做操作 {action}',
+        'nothing_to_undo': '没有可撤销的操作',
+        'nothing_to_redo': '没有可重做的操作',
+        'undo_unavailable': '此步骤修改的工作表已不可用；未做任何更改',
+        'invalid_cells': '发现无效单元格',
         'fob_intro_title': 'FOB（Functional Observational Battery）啮齿动物功能量表观察简介',
         'fob_intro_desc': 'FOB 是一种系统的**动物神经行为学观察方法**，主要用于评估化合物或药物对**中枢神经系统功能的影响或毒性**。它通过一系列标准化的行为、生理和神经反射指标，对动物（通常为大鼠或小鼠）的功能状态进行定性与半定量评价。',
         'fob_purpose_title': '一、目的',
@@ -2198,9 +3792,17 @@ set_custom_style()
 
 
 
+# Restore saved projects once per session
+if 'store_restored' not in st.session_state:
+    st.session_state.store_restored = True
+    if restore_project_store():
+        load_project_worksheets(None)
+
 # Sidebar
 with st.sidebar:
     st.title(f"🔬 {t('fob_test')}")
+    if PROJECT_STORE_PATH and get_project_store() is None:
+        st.warning(t('store_unavailable'))
     
     # Help Icon for Scoring System
     if st.button(f"❓ {t('description_of_scores')}", use_container_width=True, help="Click to see how scoring is determined for each mode", key="sidebar_scoring_help"):
@@ -2270,23 +3872,33 @@ with st.sidebar:
             
             # Export/Import buttons
             st.markdown("**📤 Export/Import:**")
+            export_delta = st.checkbox(
+                t('delta_export'),
+                value=False,
+                disabled=st.session_state.get('last_export') is None,
+                help=t('delta_export_help'),
+                key="export_delta"
+            )
             col_export, col_import = st.columns(2)
             
             with col_export:
                 if st.button("📤 Export", use_container_width=True, help="Download project data as ZIP file"):
                     with st.spinner("Exporting project data..."):
-                        zip_data, message = export_project_data_as_zip()
+                        zip_data, message = export_project_data_as_zip(delta=export_delta)
                         if zip_data:
                             project_name = project['name'].replace(' ', '_')
                             timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-                            filename = f"{project_name}_export_{timestamp}.zip"
+                            export_kind = "delta" if export_delta else "export"
+                            filename = f"{project_name}_{export_kind}_{timestamp}.zip"
                             
                             st.download_button(
                                 label="📥 Download ZIP",
                                 data=zip_data,
                                 file_name=filename,
                                 mime="application/zip",
-                                use_container_width=True
+                                use_container_width=True,
+                                on_click=confirm_export_download,
+                                args=(st.session_state.pending_export['export_id'],)
                             )
                             st.success(t('export_success'))
                         else:
@@ -2296,6 +3908,12 @@ with st.sidebar:
                 if st.button("📥 Import", use_container_width=True, help="Upload ZIP file to restore project data"):
                     st.session_state.show_import_dialog = True
             
+            if st.button(f"📚 {t('bulk_import')}", use_container_width=True, help=t('bulk_import_help')):
+                st.session_state.show_bulk_import_dialog = True
+            
+            if st.button(f"📊 {t('export_workbook')}", use_container_width=True, help=t('export_workbook_help')):
+                st.session_state.show_workbook_export = True
+            
             # Project management buttons
             col_delete, col_rename = st.columns(2)
             with col_delete:
@@ -2304,13 +3922,11 @@ with st.sidebar:
                         project_name = st.session_state.projects[st.session_state.active_project]['name']
                         project_id_to_delete = st.session_state.active_project
                         
-                        # Remove related experiments
-                        project_groups_to_remove = get_project_groups(project_id_to_delete)
-                        for group in project_groups_to_remove:
-                            if group in st.session_state.experiments:
-                                del st.session_state.experiments[group]
-                            if group in st.session_state.group_projects:
-                                del st.session_state.group_projects[group]
+                        # Remove the project's groups and their worksheets
+                        for group in list(get_project_groups(project_id_to_delete)):
+                            remove_project_group(project_id_to_delete, group)
+                        st.session_state.group_index.pop(project_id_to_delete, None)
+                        st.session_state.worksheet_index.pop(project_id_to_delete, None)
                         
                         # Remove the project
                         del st.session_state.projects[project_id_to_delete]
@@ -2326,6 +3942,35 @@ with st.sidebar:
     else:
         st.info(t('no_projects_yet'))
     
+    # Projects saved by earlier sessions (after a restart the URL's store id may be gone)
+    saved_stores = [item for item in list_project_stores() if item[0] != get_store_id()]
+    if saved_stores:
+        with st.expander(f"💾 {t('saved_stores')}"):
+            labels = {store_id: f"{', '.join(names)} ({saved_at[:16].replace('T', ' ')})"
+                      for store_id, names, saved_at in saved_stores}
+            selected_store = st.selectbox(t('saved_stores'), list(labels), format_func=labels.get,
+                                          label_visibility="collapsed", key="saved_store_selector")
+            st.caption(t('saved_stores_help'))
+            if st.button(t('open_saved_store'), use_container_width=True, key="open_saved_store"):
+                open_project_store(selected_store)
+                st.rerun()
+    
+    # Undo/redo is one control for the session: a step can span several worksheets
+    journal = get_edit_journal()
+    col_undo, col_redo = st.columns(2)
+    with col_undo:
+        undo_clicked = st.button(f"↩️ {t('undo')}", key="undo_edit", disabled=not journal['undo_stack'],
+                                 help=t('undo_help'), use_container_width=True)
+    with col_redo:
+        redo_clicked = st.button(f"↪️ {t('redo')}", key="redo_edit", disabled=not journal['redo_stack'],
+                                 help=t('redo_help'), use_container_width=True)
+    if undo_clicked or redo_clicked:
+        touched, message = undo_last_edit() if undo_clicked else redo_last_edit()
+        if touched is None:
+            st.error(message)
+        else:
+            st.rerun()
+    
     st.markdown("---")
     
     # AI Features Section
@@ -2340,10 +3985,10 @@ with st.sidebar:
         st.session_state.ai_report_active = False
     if 'ai_powerpoint_active' not in st.session_state:
         st.session_state.ai_powerpoint_active = False
-    if 'uploaded_file_content' not in st.session_state:
-        st.session_state.uploaded_file_content = None
     if 'file_summaries' not in st.session_state:
         st.session_state.file_summaries = []
+    if 'indexed_uploads' not in st.session_state:
+        st.session_state.indexed_uploads = set()  # file_uploader file ids already indexed
     if 'tutor_chat_history' not in st.session_state:
         st.session_state.tutor_chat_history = []
         # Add welcome message for tutor
@@ -2522,57 +4167,9 @@ ALL_MODES = [
 
 
 # Helper function to save plot as bytes
-def save_plot_as_bytes(fig):
-    """Save matplotlib figure as bytes for download"""
-    img_buffer = BytesIO()
-    fig.savefig(img_buffer, format='png', dpi=300, bbox_inches='tight')
-    img_buffer.seek(0)
-    return img_buffer.getvalue()
-
-# Helper function to parse the scoring system
-def parse_score(score_str, observation=None):
-    """Parse 0/4/8 scoring system with +/- modifiers or Normal/Abnormal"""
-    if pd.isna(score_str):
-        return np.nan
-    
-    # Handle binary Normal/Abnormal (both English and Chinese)
-    score_lower = str(score_str).lower()
-    
-    # Check for normal values
-    if score_lower in ['normal'] or score_lower in [t('normal').lower()]:
-        return 0  # Normal is 0
-    
-    # Check for abnormal values (including pale and cyanosis)
-    if score_lower in ['abnormal', 'pale', 'cyanosis'] or score_lower in [t('abnormal').lower(), t('pale').lower(), t('cyanosis').lower()]:
-        return 1  # All abnormal variations are 1
-    
-    # Convert to string if it's a number
-    if isinstance(score_str, (int, float)):
-        return float(score_str)
-    
-    # Extract base score and modifiers
-    match = re.match(r'(\d+(?:\.\d+)?)([\+\-]*)', str(score_str))
-    if not match:
-        return np.nan
-    
-    base_score = float(match.group(1))
-    modifiers = match.group(2)
-    
-    # Calculate numerical value
-    value = base_score
-    if modifiers:
-        modifier_value = len(modifiers) * (1 if '+' in modifiers else -1)
-        value += modifier_value
-    
-    return value
-
-# Function to calculate mean score from animal data
-def calculate_mean_score(animal_scores, observation=None):
-    """Calculate mean score from individual animal scores"""
-    parsed_scores = [parse_score(score, observation) for score in animal_scores if pd.notna(score)]
-    if parsed_scores:
-        return np.mean(parsed_scores)
-    return np.nan
+def save_plot_as_bytes(fig, file_format='png'):
+    """Save matplotlib figure as bytes for download (print profile)"""
+    return render_figure(fig, 'print', file_format)
 
 # Function to generate random data
 def generate_random_data(mode, times, num_animals=8, animal_type="mouse"):
@@ -2709,6 +4306,7 @@ def generate_random_data(mode, times, num_animals=8, animal_type="mouse"):
         return pd.DataFrame(data)
 
 # Function to fill all worksheets with random data
+@journal_action()
 def fill_all_worksheets_with_random_data():
     """Fill all worksheets for all groups and all modes with random data"""
     if st.session_state.active_project is None:
@@ -2742,7 +4340,7 @@ def fill_all_worksheets_with_random_data():
             progress_bar.progress(progress)
             progress_placeholder.text(f"{t('filling_all')} ({current_worksheet}/{total_worksheets})")
             
-            worksheet_key = f"worksheet_{group}_{mode}"
+            worksheet_key = create_worksheet_key(st.session_state.active_project, group, mode)
             
             # Generate appropriate observations for this mode
             if mode == "Autonomic and Sensorimotor Functions":
@@ -2783,7 +4381,7 @@ def fill_all_worksheets_with_random_data():
                             else:
                                 row[f'{animal_type}_{i}'] = '0'
                         data.append(row)
-                st.session_state[worksheet_key] = pd.DataFrame(data)
+                store_worksheet(worksheet_key, pd.DataFrame(data))
             
             # Get existing times from the worksheet
             existing_df = st.session_state[worksheet_key]
@@ -2796,8 +4394,7 @@ def fill_all_worksheets_with_random_data():
             random_df = generate_random_data(mode, times, num_animals, animal_type)
             
             # Update the worksheet
-            st.session_state[worksheet_key] = random_df
-            st.session_state.worksheet_data[f"{group}_{mode}"] = random_df
+            store_worksheet(worksheet_key, random_df)
             filled_count += 1
     
     # Clear progress indicators
@@ -2826,9 +4423,329 @@ def validate_uploaded_file(df, mode, animal_type, num_animals):
     
     return True, "Valid format"
 
+# Modes scored with Normal/Abnormal labels
+BINARY_MODES = [
+    "Autonomic and Sensorimotor Functions",
+    "Reflex Capabilities",
+    "Convulsive Behaviors and Excitability"
+]
+
+# Integer codes for binary labels; every code above 0 counts as abnormal
+BINARY_LABEL_CODES = {'normal': 0, 'abnormal': 1, 'pale': 2, 'cyanosis': 3}
+
+# 0/4/8 scoring grammar: a base score followed by a run of + or - modifiers
+SCORE_PATTERN = r'^\s*(\d+(?:\.\d+)?)\s*(\++|-+)?\s*$'
+
+ERROR_REPORT_COLUMNS = ['row', 'column', 'value', 'error']
+
+# Function to compile the validation schema for a mode
+@functools.lru_cache(maxsize=None)
+def compile_worksheet_schema(mode, animal_type, num_animals):
+    """Compile value rules and label lookups for a worksheet mode (both languages)"""
+    if mode == "Autonomic and Sensorimotor Functions":
+        observations = AUTONOMIC_OBSERVATIONS
+    elif mode == "Reflex Capabilities":
+        observations = REFLEX_OBSERVATIONS
+    elif mode == "Convulsive Behaviors and Excitability":
+        observations = CONVULSIVE_OBSERVATIONS
+    elif mode == "Body Temperature":
+        observations = ['body temperature']
+    elif mode == "Body Weight":
+        observations = ['body weight']
+    else:
+        observations = GENERAL_BEHAVIOR_OBSERVATIONS
+
+    # Ranges follow the worksheet editor column configuration
+    if mode in BINARY_MODES:
+        kind, value_range = 'binary', None
+    elif mode == "Body Temperature":
+        kind, value_range = 'numeric', (30.0, 45.0)
+    elif mode == "Body Weight":
+        kind, value_range = 'numeric', (0.0, 1000.0)
+    else:
+        kind, value_range = 'score', (0.0, 20.0)
+
+    observation_lookup = {}
+    label_lookup = {}
+    time_lookup = {}
+    for language in TRANSLATIONS:
+        for obs in observations:
+            observation_lookup[OBSERVATION_TRANSLATIONS[language].get(obs, obs).lower()] = obs
+        for label, code in BINARY_LABEL_CODES.items():
+            label_lookup[TRANSLATIONS[language][label].lower()] = code
+        for label in ['before', 'after']:
+            time_lookup[TRANSLATIONS[language][label].lower()] = label
+    for obs in observations:
+        observation_lookup[obs.lower()] = obs
+    for label, code in BINARY_LABEL_CODES.items():
+        label_lookup[label] = code
+    for label in ['before', 'after']:
+        time_lookup[label] = label
+
+    return {
+        'mode': mode,
+        'kind': kind,
+        'value_range': value_range,
+        'time_range': None if mode == "Body Weight" else (0, 300),
+        'time_labels': time_lookup if mode == "Body Weight" else None,
+        'observations': observation_lookup,
+        'labels': label_lookup,
+        'animal_columns': [f'{animal_type}_{i}' for i in range(1, num_animals + 1)]
+    }
+
+# Helper function to turn a cell mask into error report rows
+def collect_cell_errors(mask, raw, message):
+    """Return error report rows for the cells selected by a boolean mask"""
+    if isinstance(mask, pd.Series):
+        mask = mask.to_frame()
+        raw = raw.to_frame()
+    rows, cols = np.nonzero(mask.fillna(False).to_numpy(dtype=bool))
+    if len(rows) == 0:
+        return pd.DataFrame(columns=ERROR_REPORT_COLUMNS)
+    return pd.DataFrame({
+        'row': raw.index[rows],
+        'column': raw.columns[cols],
+        'value': raw.to_numpy(dtype=object)[rows, cols],
+        'error': message
+    })
+
+# Helper function to parse a column of 0/4/8 scores with +/- modifiers
+def parse_score_column(values):
+    """Vectorized equivalent of parse_score for one column"""
+    parts = values.astype(str).str.extract(SCORE_PATTERN)
+    base = pd.to_numeric(parts[0], errors='coerce')
+    modifiers = parts[1].fillna('')
+    sign = np.where(modifiers.str.startswith('-'), -1, 1)
+    return base, base + modifiers.str.len() * sign
+
+# Function to validate and coerce a whole worksheet in one pass
+def validate_worksheet_frame(df, mode, animal_type, num_animals):
+    """Validate and coerce a worksheet frame against its mode schema.
+
+    Returns (typed_df, errors_df). typed_df has canonical observation keys,
+    numeric times (or 'before'/'after' for Body Weight), float values and
+    integer label codes for binary modes; invalid cells are left missing.
+    errors_df lists every rejected cell with its row, column, value and reason.
+    """
+    schema = compile_worksheet_schema(mode, animal_type, num_animals)
+    errors = []
+    typed = pd.DataFrame(index=df.index)
+
+    # Time column
+    if schema['time_labels'] is not None:
+        typed['time'] = df['time'].astype(str).str.strip().str.lower().map(schema['time_labels'])
+        errors.append(collect_cell_errors(typed['time'].isna(), df['time'], "expected before/after"))
+    else:
+        low, high = schema['time_range']
+        typed['time'] = pd.to_numeric(df['time'], errors='coerce')
+        errors.append(collect_cell_errors(typed['time'].isna(), df['time'], "time is not a number"))
+        errors.append(collect_cell_errors((typed['time'] < low) | (typed['time'] > high), df['time'],
+                                          f"time outside {low}-{high} min"))
+
+    # Observation column
+    typed['observation'] = df['observation'].astype(str).str.strip().str.lower().map(schema['observations'])
+    errors.append(collect_cell_errors(typed['observation'].isna(), df['observation'],
+                                      f"unknown observation for {mode}"))
+
+    # Animal columns
+    animal_columns = [col for col in schema['animal_columns'] if col in df.columns]
+    missing = [col for col in schema['animal_columns'] if col not in df.columns]
+    if missing:
+        errors.append(pd.DataFrame({'row': None, 'column': missing, 'value': None, 'error': "missing column"}))
+
+    raw = df[animal_columns]
+    blank = raw.isna() | raw.apply(lambda col: col.astype(str).str.strip().eq(''))
+
+    if schema['kind'] == 'binary':
+        labels = schema['labels']
+        values = raw.apply(lambda col: col.astype(str).str.strip().str.lower().map(labels))
+        errors.append(collect_cell_errors(values.isna() & ~blank, raw, "unknown label"))
+        values = values.astype('Int8')
+    else:
+        if schema['kind'] == 'score':
+            parsed = {col: parse_score_column(raw[col]) for col in raw.columns}
+            base = pd.DataFrame({col: parsed[col][0] for col in raw.columns}, index=raw.index)
+            values = pd.DataFrame({col: parsed[col][1] for col in raw.columns}, index=raw.index)
+            message = "not a 0/4/8 score"
+        else:
+            values = raw.apply(lambda col: pd.to_numeric(col, errors='coerce'))
+            base = values
+            message = "not a number"
+        values = values.astype(float)
+        errors.append(collect_cell_errors(values.isna() & ~blank, raw, message))
+        # Range applies to the base score; +/- modifiers may step just outside it
+        low, high = schema['value_range']
+        out_of_range = (base < low) | (base > high)
+        errors.append(collect_cell_errors(out_of_range, raw, f"outside {low:g}-{high:g}"))
+        values = values.mask(out_of_range)
+
+    typed = pd.concat([typed, values], axis=1)
+    errors = [e for e in errors if not e.empty]
+    errors_df = pd.concat(errors, ignore_index=True) if errors else pd.DataFrame(columns=ERROR_REPORT_COLUMNS)
+    return typed, errors_df
+
+# Helper function to get the typed form of a stored worksheet
+def get_typed_worksheet(worksheet_key, mode, animal_type, num_animals):
+    """Return the validated typed frame for a worksheet, reusing it until the worksheet changes"""
+    df = st.session_state.get(worksheet_key)
+    if df is None:
+        return None
+    if 'typed_worksheets' not in st.session_state:
+        st.session_state.typed_worksheets = {}
+    cached = st.session_state.typed_worksheets.get(worksheet_key)
+    if cached is not None and cached[0] is df and cached[1] == (mode, animal_type, num_animals):
+        return cached[2]
+    typed, _ = validate_worksheet_frame(df, mode, animal_type, num_animals)
+    st.session_state.typed_worksheets[worksheet_key] = (df, (mode, animal_type, num_animals), typed)
+    return typed
+
+# Running aggregates: per worksheet, (time, observation) -> [n, mean, m2] kept with Welford updates.
+# Binary modes aggregate 1 for abnormal and 0 otherwise over every animal, so mean is the abnormal fraction.
+
+# Helper function to coerce a single animal cell the way validate_worksheet_frame does
+def typed_cell_value(value, schema):
+    """Return the typed value of one animal cell, or NaN if it is blank or invalid"""
+    value = journal_value(value)
+    if value is None or str(value).strip() == '':
+        return np.nan
+    if schema['kind'] == 'binary':
+        code = schema['labels'].get(str(value).strip().lower())
+        return np.nan if code is None else float(code)
+    if schema['kind'] == 'score':
+        match = re.match(SCORE_PATTERN, str(value))
+        if match is None:
+            return np.nan
+        base = float(match.group(1))
+        modifiers = match.group(2) or ''
+        parsed = base + len(modifiers) * (-1 if modifiers.startswith('-') else 1)
+    else:
+        try:
+            base = parsed = float(value)
+        except (TypeError, ValueError):
+            return np.nan
+    low, high = schema['value_range']
+    return parsed if low <= base <= high else np.nan
+
+# Helper function to turn a typed cell into the sample the aggregates track
+def aggregate_sample(typed_value, schema):
+    """Binary codes count as 1 (abnormal) or 0 (normal or blank); other values pass through"""
+    if schema['kind'] == 'binary':
+        return 1.0 if typed_value > 0 else 0.0
+    return typed_value
+
+# Helper function to add a sample to running statistics
+def welford_add(stats, x):
+    """Welford update of [n, mean, m2] with one sample; NaN is ignored"""
+    if np.isnan(x):
+        return
+    stats[0] += 1
+    delta = x - stats[1]
+    stats[1] += delta / stats[0]
+    stats[2] += delta * (x - stats[1])
+
+# Helper function to remove a sample from running statistics
+def welford_remove(stats, x):
+    """Inverse Welford update of [n, mean, m2]; NaN is ignored"""
+    if np.isnan(x):
+        return
+    if stats[0] <= 1:
+        stats[:] = [0, 0.0, 0.0]
+        return
+    n = stats[0] - 1
+    mean = (stats[0] * stats[1] - x) / n
+    stats[2] = max(stats[2] - (x - stats[1]) * (x - mean), 0.0)
+    stats[0], stats[1] = n, mean
+
+# Helper function to merge two sets of running statistics
+def welford_merge(stats, other):
+    """Combine [n, mean, m2] from another partition into stats (Chan et al.)"""
+    n_other, mean_other, m2_other = other
+    if n_other == 0:
+        return
+    n = stats[0] + n_other
+    delta = mean_other - stats[1]
+    stats[1] += delta * n_other / n
+    stats[2] += m2_other + delta * delta * stats[0] * n_other / n
+    stats[0] = n
+
+# Helper function to read mean and standard deviation from running statistics
+def aggregate_statistics(stats):
+    """Return (n, mean, population std) for [n, mean, m2]; NaN mean and std when empty"""
+    if stats is None or stats[0] == 0:
+        return 0, np.nan, np.nan
+    return int(stats[0]), stats[1], np.sqrt(stats[2] / stats[0])
+
+# Function to build the running aggregates of a worksheet with one full scan
+def build_worksheet_aggregates(df, mode, animal_type, num_animals):
+    """Return {(time, observation): [n, mean, m2]} keyed by the raw row keys the journal uses"""
+    schema = compile_worksheet_schema(mode, animal_type, num_animals)
+    typed, _ = validate_worksheet_frame(df, mode, animal_type, num_animals)
+    columns = [col for col in schema['animal_columns'] if col in typed.columns]
+    values = typed[columns].astype(float)
+    if schema['kind'] == 'binary':
+        values = (values.fillna(0) > 0).astype(float)
+    
+    counts = values.notna().sum(axis=1).to_numpy()
+    means = values.mean(axis=1).fillna(0.0).to_numpy()
+    m2s = values.sub(means, axis=0).pow(2).sum(axis=1).to_numpy()
+    
+    cells = {}
+    row_keys = zip(*(df[col].map(journal_value) for col in JOURNAL_ROW_KEYS))
+    for key, n, mean, m2 in zip(row_keys, counts, means, m2s):
+        welford_merge(cells.setdefault(key, [0, 0.0, 0.0]), (int(n), float(mean), float(m2)))
+    return cells
+
+# Function to get the running aggregates of a stored worksheet
+def get_worksheet_aggregates(worksheet_key, mode, animal_type, num_animals):
+    """Return the aggregates for a worksheet, rebuilding them only if they no longer match it"""
+    df = st.session_state.get(worksheet_key)
+    if df is None:
+        return {}
+    if 'worksheet_aggregates' not in st.session_state:
+        st.session_state.worksheet_aggregates = {}
+    entry = st.session_state.worksheet_aggregates.get(worksheet_key)
+    if entry is not None and entry['frame'] is df and entry['schema'] == (mode, animal_type, num_animals):
+        return entry['cells']
+    entry = {
+        'frame': df,
+        'schema': (mode, animal_type, num_animals),
+        'cells': build_worksheet_aggregates(df, mode, animal_type, num_animals)
+    }
+    st.session_state.worksheet_aggregates[worksheet_key] = entry
+    return entry['cells']
+
+# Function to apply a journal transaction to a worksheet's running aggregates
+def update_worksheet_aggregates(worksheet_key, previous_df, new_df, transaction, undo=False):
+    """Update the aggregates in O(1) per changed cell; layout changes drop them for a lazy rebuild"""
+    entry = st.session_state.get('worksheet_aggregates', {}).get(worksheet_key)
+    if entry is None or entry['frame'] is not previous_df:
+        return
+    if transaction is None:
+        entry['frame'] = new_df
+        return
+    
+    # Added/removed rows, edited row keys or positional row keys change which cells the aggregates cover
+    if (transaction['rows_before'] is not None or transaction['columns_before'] is not None or
+            any(not isinstance(row, tuple) or column in JOURNAL_ROW_KEYS
+                for row, column, _, _ in transaction['cells'])):
+        del st.session_state.worksheet_aggregates[worksheet_key]
+        return
+    
+    schema = compile_worksheet_schema(*entry['schema'])
+    animal_columns = set(schema['animal_columns'])
+    for row, column, old, new in transaction['cells']:
+        if column not in animal_columns:
+            continue
+        if undo:
+            old, new = new, old
+        stats = entry['cells'].setdefault(row, [0, 0.0, 0.0])
+        welford_remove(stats, aggregate_sample(typed_cell_value(old, schema), schema))
+        welford_add(stats, aggregate_sample(typed_cell_value(new, schema), schema))
+    entry['frame'] = new_df
+
 # Function to process uploaded file
 def process_uploaded_file(uploaded_file, mode, animal_type, num_animals):
-    """Process uploaded CSV/Excel file and return DataFrame"""
+    """Process uploaded CSV/Excel file and return (DataFrame, typed DataFrame, message, cell error report)"""
     try:
         # Read file based on extension
         if uploaded_file.name.endswith('.csv'):
@@ -2836,19 +4753,452 @@ def process_uploaded_file(uploaded_file, mode, animal_type, num_animals):
         elif uploaded_file.name.endswith(('.xlsx', '.xls')):
             df = pd.read_excel(uploaded_file)
         else:
-            return None, t('invalid_file_format')
+            return None, None, t('invalid_file_format'), None
         
         # Validate format
         is_valid, message = validate_uploaded_file(df, mode, animal_type, num_animals)
         if not is_valid:
-            return None, f"{t('template_mismatch')}: {message}"
+            return None, None, f"{t('template_mismatch')}: {message}", None
         
-        # Data will be displayed in the current language without migration
+        # Validate every cell against the mode schema
+        typed_df, errors = validate_worksheet_frame(df, mode, animal_type, num_animals)
+        if not errors.empty:
+            return None, None, f"{t('invalid_cells')}: {len(errors)}", errors
         
-        return df, "Success"
+        # Merge keys come from the typed frame, so a file in either language matches the worksheet rows;
+        # cell values keep their worksheet text for the editor
+        df = df.copy()
+        df['time'] = typed_df['time']
+        df['observation'] = typed_df['observation'].map(t_obs)
         
+        return df, typed_df, "Success", errors
+        
+    except Exception as e:
+        return None, None, f"Error processing file: {str(e)}", None
+
+# Worksheet rows are identified by (time, observation); merges upsert on this key
+MERGE_KEY_COLUMNS = ['time', 'observation']
+MERGE_POLICIES = ['incoming', 'existing', 'fail']
+
+# Helper function to compare two aligned frames cell by cell
+def find_changed_cells(old_values, new_values):
+    """Return a boolean frame marking cells where both sides are set and differ"""
+    old_num = old_values.apply(pd.to_numeric, errors='coerce')
+    new_num = new_values.apply(pd.to_numeric, errors='coerce')
+    both_numeric = old_num.notna() & new_num.notna()
+    numeric_diff = old_num.ne(new_num)
+    text_diff = old_values.astype(str).ne(new_values.astype(str))
+    both_set = old_values.notna() & new_values.notna()
+    return both_set & numeric_diff.where(both_numeric, text_diff)
+
+# Helper function to build a cell-level conflict report
+def build_conflict_report(changed, old_values, new_values):
+    """Build a long-format conflict report from a changed-cell mask"""
+    columns = MERGE_KEY_COLUMNS + ['column', 'existing', 'incoming']
+    if not changed.values.any():
+        return pd.DataFrame(columns=columns)
+    mask = changed.stack()
+    mask = mask[mask]
+    report = mask.index.to_frame(index=False)
+    report.columns = MERGE_KEY_COLUMNS + ['column']
+    report['existing'] = old_values.stack().reindex(mask.index).values
+    report['incoming'] = new_values.stack().reindex(mask.index).values
+    return report[columns]
+
+# Function to upsert uploaded rows into an existing worksheet
+def upsert_worksheet_data(existing_df, incoming_df, policy='incoming'):
+    """Merge incoming rows into a worksheet keyed on (time, observation).
+
+    policy: 'incoming' takes uploaded values, 'existing' keeps current values,
+    'fail' rejects the merge when any shared cell differs.
+    Returns (merged_df, conflicts_df); merged_df is None when the merge is rejected.
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown merge policy: {policy}")
+
+    incoming = incoming_df.drop_duplicates(subset=MERGE_KEY_COLUMNS, keep='last').set_index(MERGE_KEY_COLUMNS)
+    if existing_df is None or existing_df.empty:
+        merged = incoming
+        conflicts = build_conflict_report(pd.DataFrame(), pd.DataFrame(), pd.DataFrame())
+    else:
+        existing = existing_df.drop_duplicates(subset=MERGE_KEY_COLUMNS, keep='last').set_index(MERGE_KEY_COLUMNS)
+
+        # Compare only the cells both frames define
+        overlap = existing.index.intersection(incoming.index)
+        shared_columns = existing.columns.intersection(incoming.columns)
+        old_values = existing.loc[overlap, shared_columns]
+        new_values = incoming.loc[overlap, shared_columns]
+        conflicts = build_conflict_report(find_changed_cells(old_values, new_values), old_values, new_values)
+
+        if policy == 'fail' and not conflicts.empty:
+            return None, conflicts
+
+        # combine_first keeps the caller's values and fills gaps from the other frame
+        if policy == 'incoming':
+            merged = incoming.combine_first(existing)
+        else:
+            merged = existing.combine_first(incoming)
+        merged = merged[list(existing.columns) + [c for c in incoming.columns if c not in existing.columns]]
+
+        # combine_first sorts the keys; keep the worksheet's row order and append new keys in upload order
+        merged = merged.reindex(existing.index.append(incoming.index.difference(existing.index, sort=False)))
+
+    merged = merged.reset_index()
+    if pd.api.types.is_numeric_dtype(merged['time']):
+        # New time points move into place; observations keep their protocol order within a time
+        merged = merged.sort_values('time', kind='stable').reset_index(drop=True)
+    return merged, conflicts
+
+# Function to upsert many uploaded files in a single pass
+def bulk_upsert_worksheet_data(existing_df, incoming_dfs, policy='incoming'):
+    """Merge several uploaded frames into a worksheet with one upsert.
+
+    Files are applied in order: with 'incoming' later files win, with 'existing'
+    earlier files win, and with 'fail' disagreements between files are reported.
+    """
+    incoming_dfs = [df for df in incoming_dfs if df is not None and not df.empty]
+    if not incoming_dfs:
+        return existing_df, build_conflict_report(pd.DataFrame(), pd.DataFrame(), pd.DataFrame())
+
+    batch = pd.concat(incoming_dfs, ignore_index=True)
+
+    if policy == 'fail':
+        # Report keys that appear in several files with different values
+        value_columns = [c for c in batch.columns if c not in MERGE_KEY_COLUMNS]
+        duplicated = batch[batch.duplicated(subset=MERGE_KEY_COLUMNS, keep=False)]
+        if not duplicated.empty:
+            first = duplicated.groupby(MERGE_KEY_COLUMNS, sort=False)[value_columns].first()
+            last = duplicated.groupby(MERGE_KEY_COLUMNS, sort=False)[value_columns].last()
+            batch_conflicts = build_conflict_report(find_changed_cells(first, last), first, last)
+            if not batch_conflicts.empty:
+                return None, batch_conflicts
+
+    keep = 'first' if policy == 'existing' else 'last'
+    batch = batch.drop_duplicates(subset=MERGE_KEY_COLUMNS, keep=keep)
+    return upsert_worksheet_data(existing_df, batch, policy)
+
+# Short sheet-name codes for each mode in bulk workbooks ({group}_{code})
+MODE_SHEET_CODES = {
+    "GB": "General Behavior",
+    "ASF": "Autonomic and Sensorimotor Functions",
+    "RC": "Reflex Capabilities",
+    "BT": "Body Temperature",
+    "BW": "Body Weight",
+    "CBE": "Convulsive Behaviors and Excitability"
+}
+
+BULK_IMPORT_WORKERS = 8
+
+# Helper function to split a bulk sheet name into group and mode
+def parse_bulk_sheet_name(name):
+    """Return (group, mode) for a '{group}_{code}' sheet name, or None"""
+    name = os.path.splitext(os.path.basename(name))[0].strip()
+    for mode in ALL_MODES:
+        if name.endswith(f"_{mode}"):
+            return name[:-len(mode) - 1], mode
+    if '_' not in name:
+        return None
+    group, code = name.rsplit('_', 1)
+    mode = MODE_SHEET_CODES.get(code.upper())
+    if not group or mode is None:
+        return None
+    return group, mode
+
+# Helper function to read one sheet from a workbook in read-only mode
+def read_workbook_sheet(workbook_bytes, sheet_name):
+    """Stream one worksheet into a DataFrame without loading the whole workbook"""
+    from openpyxl import load_workbook
+    workbook = load_workbook(BytesIO(workbook_bytes), read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [str(col).strip() if col is not None else '' for col in header]
+        data = [row for row in rows if any(cell is not None for cell in row)]
+        return pd.DataFrame(data, columns=columns)
+    finally:
+        workbook.close()
+
+# Function to read every sheet of a bulk import file in parallel
+def read_bulk_import_file(uploaded_file):
+    """Read an Excel workbook or ZIP of CSVs into a list of (sheet name, DataFrame)"""
+    file_bytes = uploaded_file.read()
+    if uploaded_file.name.endswith('.zip'):
+        with zipfile.ZipFile(BytesIO(file_bytes), 'r') as zip_file:
+            members = {name: zip_file.read(name) for name in zip_file.namelist()
+                       if name.endswith('.csv') and not name.startswith('__MACOSX')}
+        read_one = lambda name: pd.read_csv(BytesIO(members[name]))
+        names = list(members)
+    elif uploaded_file.name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(BytesIO(file_bytes), read_only=True)
+        names = list(workbook.sheetnames)
+        workbook.close()
+        # Each worker opens its own read-only handle; openpyxl workbooks are not thread-safe
+        read_one = lambda name: read_workbook_sheet(file_bytes, name)
+    else:
+        raise ValueError(t('invalid_file_format'))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BULK_IMPORT_WORKERS, len(names)))) as executor:
+        frames = list(executor.map(read_one, names))
+    return list(zip(names, frames))
+
+# Function to import a whole project from one workbook or ZIP
+def bulk_import_project_data(uploaded_file, project_id):
+    """Validate every group x mode sheet and commit them all to the project, or none.
+
+    Returns (True, summary) on success or (False, (message, error report)) otherwise.
+    """
+    project = st.session_state.projects[project_id]
+    animal_type = project['animal_type']
+    num_animals = project['num_animals']
+
+    try:
+        sheets = read_bulk_import_file(uploaded_file)
     except Exception as e:
-        return None, f"Error processing file: {str(e)}"
+        return False, (f"Import failed: {str(e)}", None)
+
+    # Summary sheets written by export_project_workbook are derived data, not worksheets
+    summary_sheets = {excel_sheet_name(TRANSLATIONS[language][key])
+                      for language in TRANSLATIONS for key in WORKBOOK_SUMMARY_SHEETS}
+
+    # Exported workbooks list each sheet's group and mode; other files are matched by sheet name
+    sheet_stem = lambda name: os.path.splitext(os.path.basename(name))[0].strip()
+    sheet_index = {}
+    for name, df in sheets:
+        if sheet_stem(name) == WORKBOOK_INDEX_SHEET and {'sheet', 'group', 'mode'} <= set(df.columns):
+            sheet_index = {str(row['sheet']): (str(row['group']), row['mode'])
+                           for _, row in df.iterrows() if row['mode'] in ALL_MODES}
+
+    staged = {}
+    sheet_names = {}  # (group, mode) -> first sheet that resolved to it
+    reports = []
+    for name, df in sheets:
+        if name in summary_sheets or sheet_stem(name) == WORKBOOK_INDEX_SHEET:
+            continue
+        parsed = sheet_index.get(sheet_stem(name)) or parse_bulk_sheet_name(name)
+        if parsed is None:
+            reports.append(pd.DataFrame({'sheet': [name], 'row': [None], 'column': [None],
+                                         'value': [None], 'error': [t('unrecognized_sheet')]}))
+            continue
+        group, mode = parsed
+        if parsed in sheet_names:
+            # Two sheets for one worksheet would silently overwrite each other
+            reports.append(pd.DataFrame({'sheet': [name], 'row': [None], 'column': [None], 'value': [None],
+                                         'error': [t('duplicate_sheet').format(sheet=sheet_names[parsed])]}))
+            continue
+        sheet_names[parsed] = name
+        is_valid, message = validate_uploaded_file(df, mode, animal_type, num_animals)
+        if not is_valid:
+            reports.append(pd.DataFrame({'sheet': [name], 'row': [None], 'column': [None],
+                                         'value': [None], 'error': [message]}))
+            continue
+        _, errors = validate_worksheet_frame(df, mode, animal_type, num_animals)
+        if not errors.empty:
+            errors.insert(0, 'sheet', name)
+            reports.append(errors)
+            continue
+        staged[(group, mode)] = df
+
+    if reports:
+        report = pd.concat(reports, ignore_index=True)
+        return False, (f"{t('bulk_import_errors')}: {len(report)}", report)
+    if not staged:
+        return False, (t('bulk_import_empty'), None)
+
+    # Every sheet validated, so commit them all
+    project_groups = set(get_project_groups(project_id))
+    new_groups = []
+    for group, mode in staged:
+        if group not in project_groups and group not in new_groups:
+            new_groups.append(group)
+    for group in new_groups:
+        add_project_group(project_id, group)
+    # The whole import is one undo step
+    with journal_action():
+        for (group, mode), df in staged.items():
+            store_worksheet(create_worksheet_key(project_id, group, mode), df)
+
+    return True, {'worksheets': len(staged), 'new_groups': new_groups}
+
+# Helper function to summarize a typed worksheet per time point and observation
+def summarize_typed_worksheet(typed_df, mode):
+    """Return time/observation rows with valid count and mean score (or % abnormal for binary modes)"""
+    animal_columns = [col for col in typed_df.columns if col not in ('time', 'observation')]
+    values = typed_df.melt(id_vars=['time', 'observation'], value_vars=animal_columns, value_name='value')
+    if mode in BINARY_MODES:
+        # Percentage is taken over all animals, including blank cells
+        values['abnormal'] = values['value'].fillna(0) > 0
+        summary = values.groupby(['time', 'observation'], sort=True).agg(
+            n=('value', 'count'), abnormal=('abnormal', 'sum'), total=('abnormal', 'size'))
+        summary['percent_abnormal'] = summary['abnormal'] / summary['total'] * 100
+        return summary.drop(columns='total').reset_index()
+    summary = values.groupby(['time', 'observation'], sort=True)['value'].agg(['count', 'mean'])
+    return summary.rename(columns={'count': 'n'}).reset_index()
+
+# Helper function to compute per-animal weight change from a typed Body Weight worksheet
+def compute_weight_changes(typed_df):
+    """Return per-animal before/after weights with absolute and percent change"""
+    animal_columns = [col for col in typed_df.columns if col not in ('time', 'observation')]
+    before = typed_df[typed_df['time'] == 'before'][animal_columns]
+    after = typed_df[typed_df['time'] == 'after'][animal_columns]
+    if before.empty or after.empty:
+        return pd.DataFrame(columns=['animal', 'before', 'after', 'change', 'percent_change'])
+    changes = pd.DataFrame({'animal': animal_columns,
+                            'before': before.iloc[0].to_numpy(dtype=float),
+                            'after': after.iloc[0].to_numpy(dtype=float)})
+    changes['change'] = changes['after'] - changes['before']
+    changes['percent_change'] = changes['change'] / changes['before'].where(changes['before'] != 0) * 100
+    return changes.dropna(subset=['before', 'after'])
+
+# Helper function to make a cell value writable by xlsxwriter
+def excel_cell_value(value):
+    """Convert NaN/NA to blank and numpy scalars to Python values"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# Helper function to stream a DataFrame into an xlsxwriter worksheet row by row
+def write_frame_to_sheet(worksheet, df, header_format, start_row=0):
+    """Write header and rows in order (required by constant_memory mode); returns next free row"""
+    worksheet.write_row(start_row, 0, [str(col) for col in df.columns], header_format)
+    row_number = start_row + 1
+    for row in df.itertuples(index=False, name=None):
+        worksheet.write_row(row_number, 0, [excel_cell_value(value) for value in row])
+        row_number += 1
+    if len(df.columns):
+        worksheet.set_column(0, len(df.columns) - 1, 16)
+    return row_number
+
+# Translation keys of the derived sheets added after the worksheets in a project workbook
+WORKBOOK_SUMMARY_SHEETS = ['mean_scores', 'abnormal_episodes', 'weight_summary', 'charts']
+
+# Sheet mapping each worksheet's sheet name to its group and mode, so names never have to be parsed back
+WORKBOOK_INDEX_SHEET = '_index'
+
+# Helper function to make a string a valid Excel sheet name
+def excel_sheet_name(name, max_length=31):
+    """Strip characters Excel forbids in sheet names and trim to the length limit"""
+    return re.sub(r'[\[\]:*?/\\]', ' ', str(name)).strip()[:max_length]
+
+# Function to export a whole project as one Excel workbook
+def export_project_workbook(project_id, include_charts=False):
+    """Write every group x mode worksheet plus summary sheets into one .xlsx (streaming)"""
+    import xlsxwriter
+    try:
+        project = st.session_state.projects[project_id]
+        animal_type = project['animal_type']
+        num_animals = project['num_animals']
+        mode_codes = {mode: code for code, mode in MODE_SHEET_CODES.items()}
+
+        output = BytesIO()
+        # constant_memory flushes each row to a temp file once written
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        header_format = workbook.add_format({'bold': True, 'bg_color': '#D9E1F2'})
+
+        mean_scores = []
+        episodes = []
+        weight_changes = []
+        sheet_index = []
+        used_names = {WORKBOOK_INDEX_SHEET}
+        # Every mode of a group gets the same group prefix (room is left for the longest code)
+        prefix_length = 31 - max(len(code) for code in MODE_SHEET_CODES) - 1
+        for group in get_project_groups(project_id):
+            for mode in ALL_MODES:
+                worksheet_key = get_worksheet_key(project_id, group, mode)
+                df = st.session_state.get(worksheet_key)
+                if df is None or df.empty:
+                    continue
+
+                # Sheet names follow the bulk-import naming; the index sheet records the exact group and mode
+                suffix = f"_{mode_codes[mode]}"
+                sheet_name = f"{excel_sheet_name(group, prefix_length)}{suffix}"
+                while sheet_name.lower() in used_names:
+                    sheet_name = f"{sheet_name[:27]}~{len(used_names)}"[:31]
+                used_names.add(sheet_name.lower())
+                sheet_index.append({'sheet': sheet_name, 'group': group, 'mode': mode})
+                write_frame_to_sheet(workbook.add_worksheet(sheet_name), df, header_format)
+
+                typed_df = get_typed_worksheet(worksheet_key, mode, animal_type, num_animals)
+                if mode == "Body Weight":
+                    changes = compute_weight_changes(typed_df)
+                    changes.insert(0, 'group', group)
+                    weight_changes.append(changes)
+                    continue
+                summary = summarize_typed_worksheet(typed_df, mode)
+                summary.insert(0, 'mode', mode)
+                summary.insert(0, 'group', group)
+                mean_scores.append(summary)
+                group_episodes = process_data_with_episodes(typed_df, mode, animal_type, num_animals)
+                if not group_episodes.empty:
+                    group_episodes.insert(0, t('analysis_mode'), mode)
+                    group_episodes.insert(0, t('group'), group)
+                    episodes.append(group_episodes)
+
+        if mean_scores:
+            mean_df = pd.concat(mean_scores, ignore_index=True)
+            mean_df = mean_df.rename(columns={
+                'group': t('group'), 'mode': t('analysis_mode'), 'time': t('time'),
+                'observation': t('observation'), 'n': t('valid'), 'mean': t('mean_score'),
+                'abnormal': t('abnormal_count'), 'percent_abnormal': t('percentage_abnormal')})
+            write_frame_to_sheet(workbook.add_worksheet(excel_sheet_name(t('mean_scores'))), mean_df, header_format)
+        if episodes:
+            write_frame_to_sheet(workbook.add_worksheet(excel_sheet_name(t('abnormal_episodes'))),
+                                 pd.concat(episodes, ignore_index=True), header_format)
+        if weight_changes:
+            weight_df = pd.concat(weight_changes, ignore_index=True).rename(columns={
+                'group': t('group'), 'animal': t('animal'), 'before': f"{t('before_experiment')} (g)",
+                'after': f"{t('after_experiment')} (g)", 'change': t('change_g'),
+                'percent_change': t('percent_change')})
+            write_frame_to_sheet(workbook.add_worksheet(excel_sheet_name(t('weight_summary'))), weight_df, header_format)
+
+        if include_charts and st.session_state.all_experiment_charts:
+            chart_sheet = workbook.add_worksheet(excel_sheet_name(t('charts')))
+            row_number = 0
+            for chart in st.session_state.all_experiment_charts:
+                if chart.get('data') is None:
+                    continue
+                chart_sheet.write(row_number, 0, chart['title'], header_format)
+                chart_sheet.insert_image(row_number + 1, 0, f"{chart['title']}.png",
+                                         {'image_data': BytesIO(chart['data']), 'x_scale': 0.6, 'y_scale': 0.6})
+                row_number += 30
+
+        if sheet_index:
+            write_frame_to_sheet(workbook.add_worksheet(WORKBOOK_INDEX_SHEET), pd.DataFrame(sheet_index), header_format)
+
+        workbook.close()
+        output.seek(0)
+        return output.getvalue(), "Success"
+    except Exception as e:
+        return None, f"Workbook export failed: {str(e)}"
+
+# Function to get the project workbook, rebuilt only when its contents change
+def get_project_workbook(project_id, include_charts=False):
+    """Return (workbook bytes, message), cached on the worksheet digests, project settings, language and charts"""
+    worksheets = []
+    for group in get_project_groups(project_id):
+        for mode in ALL_MODES:
+            worksheet_key = get_worksheet_key(project_id, group, mode)
+            df = st.session_state.get(worksheet_key) if worksheet_key else None
+            if isinstance(df, pd.DataFrame):
+                worksheets.append((group, mode, get_frame_digest(df)))
+    charts = []
+    if include_charts:
+        charts = [chart.get('digest') or hashlib.sha1(chart['data']).hexdigest()
+                  for chart in st.session_state.all_experiment_charts if chart.get('data') is not None]
+    signature = (project_id, json.dumps(st.session_state.projects[project_id], sort_keys=True, default=str),
+                 st.session_state.language, tuple(worksheets), include_charts, tuple(charts))
+
+    cached = st.session_state.get('workbook_export')
+    if cached is not None and cached[0] == signature:
+        return cached[1], cached[2]
+    workbook_data, message = export_project_workbook(project_id, include_charts)
+    if workbook_data is not None:
+        st.session_state.workbook_export = (signature, workbook_data, message)
+    return workbook_data, message
 
 # Function to migrate existing English data to Chinese
 def migrate_data_to_chinese(df, mode):
@@ -2898,30 +5248,48 @@ def migrate_data_to_chinese(df, mode):
     return df_copy
 
 # Function to process data with onset/offset tracking
-def process_data_with_episodes(df, mode, animal_type="mouse", num_animals=8):
-    """Process data and track onset/offset of abnormal episodes"""
+def process_data_with_episodes(typed_df, mode, animal_type="mouse", num_animals=8):
+    """Track onset/offset of abnormal episodes in a typed worksheet (see get_typed_worksheet)"""
     results = []
     
     # Skip weight mode as it doesn't have episodes
-    if mode == "Body Weight":
+    if mode == "Body Weight" or typed_df is None or typed_df.empty:
         return pd.DataFrame(results)
     
     # Get appropriate observations based on mode
     if mode == "Autonomic and Sensorimotor Functions":
-        observations = [t_obs(obs) for obs in AUTONOMIC_OBSERVATIONS]
+        observations = AUTONOMIC_OBSERVATIONS
     elif mode == "Reflex Capabilities":
-        observations = [t_obs(obs) for obs in REFLEX_OBSERVATIONS]
+        observations = REFLEX_OBSERVATIONS
     elif mode == "Convulsive Behaviors and Excitability":
-        observations = [t_obs(obs) for obs in CONVULSIVE_OBSERVATIONS]
+        observations = CONVULSIVE_OBSERVATIONS
     elif mode == "Body Temperature":
-        observations = [t_obs('body temperature')]
+        observations = ['body temperature']
     else:  # General Behavior
-        observations = df['observation'].unique()
+        observations = typed_df['observation'].dropna().unique()
+    
+    # Row scores: % of animals abnormal for binary modes, else the mean of the valid values
+    animal_columns = [f'{animal_type}_{i}' for i in range(1, num_animals + 1) if f'{animal_type}_{i}' in typed_df.columns]
+    values = typed_df[animal_columns]
+    binary = mode in BINARY_MODES
+    if binary:
+        # Any label other than normal (pale and cyanosis included) is abnormal
+        abnormal = values.gt(0).fillna(False)
+        row_scores = abnormal.sum(axis=1) / len(animal_columns) * 100 if animal_columns else abnormal.sum(axis=1)
+        row_abnormal = abnormal.any(axis=1)
+    else:
+        row_scores = values.mean(axis=1)
+        if mode == "Body Temperature":
+            # Abnormal if outside 36-38°C range
+            row_abnormal = (row_scores < 36) | (row_scores > 38)
+        else:
+            # General Behavior: abnormal if mean < 2 or > 6
+            row_abnormal = (row_scores < 2) | (row_scores > 6)
     
     for obs in observations:
-        obs_df = df[df['observation'] == obs].sort_values('time')
+        obs_rows = typed_df[(typed_df['observation'] == obs) & typed_df['time'].notna()].sort_values('time')
         
-        if obs_df.empty:
+        if obs_rows.empty:
             continue
         
         # Track episodes
@@ -2929,38 +5297,17 @@ def process_data_with_episodes(df, mode, animal_type="mouse", num_animals=8):
         in_episode = False
         peak_score = 0
         
-        for _, row in obs_df.iterrows():
-            # Calculate mean score from all animals
-            animal_scores = [row[f'{animal_type}_{i}'] for i in range(1, num_animals + 1) 
-                           if f'{animal_type}_{i}' in row]
+        for row_id, time in obs_rows['time'].items():
+            mean_score = row_scores[row_id]
+            is_abnormal = bool(row_abnormal[row_id])
             
-            if mode in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-                # For binary modes, count percentage of abnormal
-                # For all observations in Autonomic mode: pale and cyanosis are both abnormal
-                abnormal_count = sum(1 for score in animal_scores 
-                                   if str(score).lower() in [t('abnormal').lower(), t('pale').lower(), t('cyanosis').lower()])
-                
-                mean_score = (abnormal_count / len(animal_scores)) * 100 if animal_scores else 0
-                is_abnormal = abnormal_count > 0  # Any animal abnormal
-            else:
-                mean_score = calculate_mean_score(animal_scores)
-                
-                # Track peak score
-                if not pd.isna(mean_score) and mean_score > peak_score:
-                    peak_score = mean_score
-                
-                # Determine if abnormal based on mode
-                is_abnormal = False
-                if mode == "Body Temperature":
-                    # Abnormal if outside 36-38°C range
-                    is_abnormal = mean_score < 36 or mean_score > 38
-                else:  # General Behavior
-                    # Abnormal if mean < 2 or > 6
-                    is_abnormal = mean_score < 2 or mean_score > 6
+            # Track peak score
+            if not binary and not pd.isna(mean_score) and mean_score > peak_score:
+                peak_score = mean_score
             
             if is_abnormal and not in_episode:
                 # Start of abnormal episode
-                onset_time = row['time']
+                onset_time = time
                 in_episode = True
                 peak_score = mean_score
             elif not is_abnormal and in_episode:
@@ -2968,9 +5315,9 @@ def process_data_with_episodes(df, mode, animal_type="mouse", num_animals=8):
                 results.append({
                     t('observation'): t_obs(obs),
                     t('onset_time'): onset_time,
-                    t('offset_time'): row['time'],
-                    t('duration'): row['time'] - onset_time,
-                    t('peak_score'): peak_score if mode not in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"] else f"{peak_score:.0f}%"
+                    t('offset_time'): time,
+                    t('duration'): time - onset_time,
+                    t('peak_score'): f"{peak_score:.0f}%" if binary else peak_score
                 })
                 in_episode = False
                 onset_time = None
@@ -2981,9 +5328,9 @@ def process_data_with_episodes(df, mode, animal_type="mouse", num_animals=8):
             results.append({
                 t('observation'): t_obs(obs),
                 t('onset_time'): onset_time,
-                t('offset_time'): obs_df['time'].max(),
-                t('duration'): obs_df['time'].max() - onset_time,
-                t('peak_score'): peak_score if mode not in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"] else f"{peak_score:.0f}%"
+                t('offset_time'): obs_rows['time'].max(),
+                t('duration'): obs_rows['time'].max() - onset_time,
+                t('peak_score'): f"{peak_score:.0f}%" if binary else peak_score
             })
     
     return pd.DataFrame(results)
@@ -3110,8 +5457,8 @@ def create_worksheet(mode, experiment_name, project_info):
     elif mode == "Body Weight":
         st.markdown(f'<div class="binary-instruction">{t("weight_instruction")}</div>', unsafe_allow_html=True)
     
-    # Create a unique key for this worksheet that includes mode
-    worksheet_key = f"worksheet_{experiment_name}_{mode}"
+    # Look up this group's worksheet for the mode in the active project
+    worksheet_key = create_worksheet_key(st.session_state.active_project, experiment_name, mode)
     
     # Initialize worksheet data if not exists
     if worksheet_key not in st.session_state:
@@ -3163,7 +5510,22 @@ def create_worksheet(mode, experiment_name, project_info):
                         row[f'{animal_type}_{i}'] = '4'
                 data.append(row)
         
-        st.session_state[worksheet_key] = pd.DataFrame(data)
+        store_worksheet(worksheet_key, pd.DataFrame(data))
+    
+    # Audit trail for this worksheet (undo/redo is in the sidebar)
+    with st.expander(f"📜 {t('audit_trail')}", expanded=False):
+        audit_df = build_audit_trail(worksheet_key).drop(columns='worksheet')
+        if audit_df.empty:
+            st.info(t('no_edits'))
+        else:
+            st.dataframe(audit_df, use_container_width=True, hide_index=True)
+            st.download_button(
+                label=t('download_audit'),
+                data=audit_df.to_csv(index=False).encode('utf-8'),
+                file_name=f"{experiment_name}_{mode}_audit_trail.csv",
+                mime="text/csv",
+                key=f"audit_download_{worksheet_key}"
+            )
     
     # Get the dataframe from session state and migrate to Chinese if needed
     df = st.session_state[worksheet_key].copy()
@@ -3309,14 +5671,15 @@ def create_worksheet(mode, experiment_name, project_info):
                 final_df = final_df.sort_values(['time', 'observation']).reset_index(drop=True)
                 
                 # Update session state with edited data
-                st.session_state[worksheet_key] = final_df
-                st.session_state.worksheet_data[f"{experiment_name}_{mode}"] = final_df
-                st.session_state.save_status[experiment_name] = "saved"
+                # One undo step covers this save and the worksheets it syncs
+                with journal_action():
+                    store_worksheet(worksheet_key, final_df)
+                    st.session_state.save_status[experiment_name] = "saved"
                 
-                # Synchronize time points if time column was modified - sync to ALL modes
-                if mode != "Body Weight" and st.session_state.active_project:
-                    new_times = sorted(final_df['time'].unique())
-                    synchronize_time_points_across_worksheets(st.session_state.active_project, new_times, mode=None)
+                    # Synchronize time points if time column was modified - sync to ALL modes
+                    if mode != "Body Weight" and st.session_state.active_project:
+                        new_times = sorted(final_df['time'].unique())
+                        synchronize_time_points_across_worksheets(st.session_state.active_project, new_times, mode=None)
                 
                 # Clear temp changes
                 if temp_key in st.session_state:
@@ -3332,7 +5695,7 @@ def create_worksheet(mode, experiment_name, project_info):
                 else:
                     times = sorted(edited_df['time'].unique())
                 random_df = generate_random_data(mode, times, num_animals, animal_type)
-                st.session_state[worksheet_key] = random_df
+                store_worksheet(worksheet_key, random_df)
                 st.rerun()
             
             if add_timestep and mode != "Body Weight":
@@ -3353,13 +5716,14 @@ def create_worksheet(mode, experiment_name, project_info):
                 # Append new rows and sort by time
                 new_df = pd.concat([edited_df, pd.DataFrame(new_rows)], ignore_index=True)
                 new_df = new_df.sort_values(['time', 'observation']).reset_index(drop=True)
-                st.session_state[worksheet_key] = new_df
-                st.session_state.worksheet_data[f"{experiment_name}_{mode}"] = new_df
+                # One undo step covers this save and the worksheets it syncs
+                with journal_action():
+                    store_worksheet(worksheet_key, new_df)
                 
-                # IMPORTANT: Synchronize time points IMMEDIATELY across all worksheets - sync to ALL modes
-                # This happens before saving, so other modes update instantly
-                if st.session_state.active_project:
-                    synchronize_time_points_across_worksheets(st.session_state.active_project, [new_timestep], mode=None)
+                    # IMPORTANT: Synchronize time points IMMEDIATELY across all worksheets - sync to ALL modes
+                    # This happens before saving, so other modes update instantly
+                    if st.session_state.active_project:
+                        synchronize_time_points_across_worksheets(st.session_state.active_project, [new_timestep], mode=None)
                 
                 st.success(f"{t('add_timestep')} {new_timestep} min - {t('changes_saved')} (所有模式已同步)")
                 st.rerun()
@@ -3383,7 +5747,7 @@ def create_worksheet(mode, experiment_name, project_info):
                 else:
                     times = sorted(st.session_state[worksheet_key]['time'].unique())
                 random_df = generate_random_data(mode, times, num_animals, animal_type)
-                st.session_state[worksheet_key] = random_df
+                store_worksheet(worksheet_key, random_df)
                 st.rerun()
         
         # Create editable dataframe without form (auto-saves)
@@ -3404,14 +5768,15 @@ def create_worksheet(mode, experiment_name, project_info):
             # Sort by time to ensure proper ordering
             final_df_auto = final_df_auto.sort_values(['time', 'observation']).reset_index(drop=True)
             
-            st.session_state[worksheet_key] = final_df_auto
-            st.session_state.worksheet_data[f"{experiment_name}_{mode}"] = final_df_auto
-            st.session_state.save_status[experiment_name] = "saved"
+            # One undo step covers this save and the worksheets it syncs
+            with journal_action():
+                store_worksheet(worksheet_key, final_df_auto)
+                st.session_state.save_status[experiment_name] = "saved"
             
-            # Synchronize time points if time column was modified - sync to ALL modes
-            if mode != "Body Weight" and st.session_state.active_project:
-                new_times = sorted(final_df_auto['time'].unique())
-                synchronize_time_points_across_worksheets(st.session_state.active_project, new_times, mode=None)
+                # Synchronize time points if time column was modified - sync to ALL modes
+                if mode != "Body Weight" and st.session_state.active_project:
+                    new_times = sorted(final_df_auto['time'].unique())
+                    synchronize_time_points_across_worksheets(st.session_state.active_project, new_times, mode=None)
         
         # Show save status with timestamp
         st.success(f"{t('auto_saved')} {datetime.datetime.now().strftime('%H:%M:%S')}")
@@ -3449,13 +5814,14 @@ def create_worksheet(mode, experiment_name, project_info):
                     # Append new rows and sort by time
                     new_df = pd.concat([edited_df_auto, pd.DataFrame(new_rows)], ignore_index=True)
                     new_df = new_df.sort_values(['time', 'observation']).reset_index(drop=True)
-                    st.session_state[worksheet_key] = new_df
-                    st.session_state.worksheet_data[f"{experiment_name}_{mode}"] = new_df
+                    # One undo step covers this save and the worksheets it syncs
+                    with journal_action():
+                        store_worksheet(worksheet_key, new_df)
                     
-                    # IMPORTANT: Synchronize time points IMMEDIATELY across all worksheets - sync to ALL modes
-                    # This happens automatically, so other modes update instantly without needing to save
-                    if st.session_state.active_project:
-                        synchronize_time_points_across_worksheets(st.session_state.active_project, [new_timestep_auto], mode=None)
+                        # IMPORTANT: Synchronize time points IMMEDIATELY across all worksheets - sync to ALL modes
+                        # This happens automatically, so other modes update instantly without needing to save
+                        if st.session_state.active_project:
+                            synchronize_time_points_across_worksheets(st.session_state.active_project, [new_timestep_auto], mode=None)
                     
                     st.success(f"{t('add_timestep')} {new_timestep_auto} min - {t('auto_saved')} (所有模式已同步)")
                     st.rerun()
@@ -3464,45 +5830,79 @@ def create_worksheet(mode, experiment_name, project_info):
         st.markdown(f"**{t('upload_data')}**")
         st.info(t('upload_help'))
         
-        # File upload section
-        uploaded_file = st.file_uploader(
+        # File upload section (several files are merged in one pass)
+        uploaded_files = st.file_uploader(
             t('upload_csv_excel'),
             type=['csv', 'xlsx', 'xls'],
             help=t('upload_help'),
+            accept_multiple_files=True,
             key=f"upload_{worksheet_key}"
         )
-        
-        if uploaded_file is not None:
-            # Process uploaded file
-            processed_df, message = process_uploaded_file(uploaded_file, mode, animal_type, num_animals)
-            
-            if processed_df is not None:
-                st.success(t('file_uploaded_success'))
-                
+
+        if uploaded_files:
+            # Process uploaded files
+            processed_dfs = []
+            typed_dfs = []
+            for uploaded_file in uploaded_files:
+                processed_df, typed_df, message, cell_errors = process_uploaded_file(uploaded_file, mode, animal_type, num_animals)
+                if processed_df is not None:
+                    processed_dfs.append(processed_df)
+                    typed_dfs.append(typed_df)
+                else:
+                    st.error(f"{uploaded_file.name}: {message}")
+                    if cell_errors is not None and not cell_errors.empty:
+                        st.dataframe(cell_errors, use_container_width=True, hide_index=True)
+
+            if processed_dfs:
+                st.success(f"{t('file_uploaded_success')} ({len(processed_dfs)}/{len(uploaded_files)})")
+
                 # Show preview of uploaded data
                 st.subheader("Data Preview")
-                st.dataframe(processed_df.head(10), use_container_width=True)
-                
+                st.dataframe(pd.concat(processed_dfs, ignore_index=True).head(10), use_container_width=True)
+                typed_upload = pd.concat(typed_dfs, ignore_index=True)
+                st.caption(t('upload_parsed').format(
+                    rows=len(typed_upload), times=typed_upload['time'].nunique(),
+                    values=int(typed_upload.drop(columns=['time', 'observation']).notna().to_numpy().sum())))
+
+                # Conflict resolution policy for merges
+                policy_labels = {
+                    'incoming': t('take_incoming'),
+                    'existing': t('keep_existing'),
+                    'fail': t('fail_on_conflict')
+                }
+                merge_policy = st.radio(
+                    t('merge_policy'),
+                    MERGE_POLICIES,
+                    format_func=lambda p: policy_labels[p],
+                    horizontal=True,
+                    key=f"merge_policy_{worksheet_key}"
+                )
+
                 # Import options
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button(t('replace_data'), use_container_width=True, type="primary"):
-                        st.session_state[worksheet_key] = processed_df
-                        st.session_state.worksheet_data[f"{experiment_name}_{mode}"] = processed_df
-                        st.success("Data replaced successfully!")
-                        st.rerun()
-                
+                        replaced_df, conflicts = bulk_upsert_worksheet_data(None, processed_dfs, merge_policy)
+                        if replaced_df is None:
+                            st.error(t('merge_conflicts'))
+                            st.dataframe(conflicts, use_container_width=True, hide_index=True)
+                        else:
+                            store_worksheet(worksheet_key, replaced_df)
+                            st.success("Data replaced successfully!")
+                            st.rerun()
+
                 with col2:
                     if st.button(t('merge_data'), use_container_width=True):
-                        # Merge with existing data
+                        # Upsert on (time, observation) instead of appending duplicate rows
                         existing_df = st.session_state[worksheet_key]
-                        merged_df = pd.concat([existing_df, processed_df], ignore_index=True)
-                        st.session_state[worksheet_key] = merged_df
-                        st.session_state.worksheet_data[f"{experiment_name}_{mode}"] = merged_df
-                        st.success("Data merged successfully!")
-                        st.rerun()
-            else:
-                st.error(message)
+                        merged_df, conflicts = bulk_upsert_worksheet_data(existing_df, processed_dfs, merge_policy)
+                        if merged_df is None:
+                            st.error(t('merge_conflicts'))
+                            st.dataframe(conflicts, use_container_width=True, hide_index=True)
+                        else:
+                            store_worksheet(worksheet_key, merged_df)
+                            st.success("Data merged successfully!")
+                            st.rerun()
         
         # Download template section
         st.markdown("---")
@@ -3528,32 +5928,33 @@ def create_worksheet(mode, experiment_name, project_info):
         st.subheader(t('weight_summary'))
         
         # Calculate weight changes
+        # Typed frame maps translated time labels to before/after and weights to floats
         weight_data = []
-        before_df = current_df[current_df['time'] == 'before']
-        after_df = current_df[current_df['time'] == 'after']
+        typed_df = get_typed_worksheet(worksheet_key, mode, animal_type, num_animals)
+        before_df = typed_df[typed_df['time'] == 'before']
+        after_df = typed_df[typed_df['time'] == 'after']
         
         if not before_df.empty and not after_df.empty:
             for i in range(1, num_animals + 1):
                 animal_col = f'{animal_type}_{i}'
                 if animal_col in before_df.columns:
-                    try:
-                        before_weight = float(before_df.iloc[0][animal_col])
-                        after_weight = float(after_df.iloc[0][animal_col])
-                        change = after_weight - before_weight
-                        percent_change = (change / before_weight) * 100
-                        
-                        status = t('weight_loss') if change < 0 else (t('weight_gain') if change > 0 else t('no_change'))
-                        
-                        weight_data.append({
-                            t('animal'): f'{t(animal_type).capitalize()} {i}',
-                            f"{t('before_experiment')} (g)": f"{before_weight:.1f}",
-                            f"{t('after_experiment')} (g)": f"{after_weight:.1f}",
-                            f"{t('change_g')}": f"{change:.1f}",
-                            t('percent_change'): f"{percent_change:.2f}%",
-                            t('status'): status
-                        })
-                    except (ValueError, TypeError):
+                    before_weight = before_df.iloc[0][animal_col]
+                    after_weight = after_df.iloc[0][animal_col]
+                    if pd.isna(before_weight) or pd.isna(after_weight) or before_weight == 0:
                         continue
+                    change = after_weight - before_weight
+                    percent_change = (change / before_weight) * 100
+                    
+                    status = t('weight_loss') if change < 0 else (t('weight_gain') if change > 0 else t('no_change'))
+                    
+                    weight_data.append({
+                        t('animal'): f'{t(animal_type).capitalize()} {i}',
+                        f"{t('before_experiment')} (g)": f"{before_weight:.1f}",
+                        f"{t('after_experiment')} (g)": f"{after_weight:.1f}",
+                        f"{t('change_g')}": f"{change:.1f}",
+                        t('percent_change'): f"{percent_change:.2f}%",
+                        t('status'): status
+                    })
         
         if weight_data:
             weight_df = pd.DataFrame(weight_data)
@@ -3594,32 +5995,31 @@ def create_worksheet(mode, experiment_name, project_info):
         
         summary_data = []
         filtered_df = current_df[current_df['time'].isin(selected_times)] if selected_times else current_df
+        # Running aggregates are kept current by each save, so rows are looked up rather than rescanned
+        aggregates = get_worksheet_aggregates(worksheet_key, mode, animal_type, num_animals)
         
         for _, row in filtered_df.iterrows():
-            animal_scores = [row[f'{animal_type}_{i}'] for i in range(1, num_animals + 1) 
-                            if f'{animal_type}_{i}' in row]
+            stats = aggregates.get((journal_value(row['time']), journal_value(row['observation'])))
+            count, mean_score, _ = aggregate_statistics(stats)
             
-            if mode in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-                # For binary modes, calculate percentage abnormal
-                # For all observations in Autonomic mode: pale and cyanosis are both abnormal
-                abnormal_count = sum(1 for score in animal_scores 
-                                   if str(score).lower() in [t('abnormal').lower(), t('pale').lower(), t('cyanosis').lower()])
+            if mode in BINARY_MODES:
+                # For binary modes the aggregate mean is the abnormal fraction over all animals
+                # (pale and cyanosis count as abnormal)
+                abnormal_count = int(round(mean_score * count)) if count else 0
                 
-                percent_abnormal = (abnormal_count / len(animal_scores)) * 100 if animal_scores else 0
+                percent_abnormal = (abnormal_count / count) * 100 if count else 0
                 status = t('abnormal') if abnormal_count > 0 else t('normal')
                 
                 summary_data.append({
                     t('time'): f"{int(row['time'])} min",
                     t('observation'): t_obs(row['observation']),
-                    t('abnormal_count'): f"{abnormal_count}/{len(animal_scores)}",
+                    t('abnormal_count'): f"{abnormal_count}/{count}",
                     t('percentage_abnormal'): f"{percent_abnormal:.1f}%",
                     t('status'): status
                 })
             else:
-                mean_score = calculate_mean_score(animal_scores)
-                
                 # Count how many animals have valid scores
-                valid_scores = sum(1 for score in animal_scores if pd.notna(score) and score != '')
+                valid_scores = count
                 
                 # Determine status based on mode and thresholds
                 if pd.isna(mean_score):
@@ -3655,7 +6055,8 @@ def create_worksheet(mode, experiment_name, project_info):
         
         # Display abnormal episodes (not for Body Weight)
         st.subheader(t('abnormal_episodes'))
-        episodes_df = process_data_with_episodes(current_df, mode, animal_type, num_animals)
+        episodes_df = process_data_with_episodes(get_typed_worksheet(worksheet_key, mode, animal_type, num_animals),
+                                                 mode, animal_type, num_animals)
         if not episodes_df.empty:
             st.dataframe(episodes_df, use_container_width=True, hide_index=True)
         else:
@@ -3664,8 +6065,9 @@ def create_worksheet(mode, experiment_name, project_info):
     return current_df
 
 # New function to create plots for all modes
-def create_comparative_plot(selected_for_viz, mode_eng, project, comparison_group=None):
-    """Create comparative plots for all analysis modes"""
+# Function to pick what a comparative plot shows
+def select_comparative_plot_inputs(selected_for_viz, mode_eng, project):
+    """Show the plot's time/group selectors; returns the plot inputs, or None if there is nothing to plot"""
     
     # Get animal info
     animal_type = project.get('animal_type', 'mouse')
@@ -3678,7 +6080,7 @@ def create_comparative_plot(selected_for_viz, mode_eng, project, comparison_grou
     valid_groups = []
     
     for exp in selected_for_viz:
-        worksheet_key = f"worksheet_{exp}_{mode_eng}"
+        worksheet_key = get_worksheet_key(st.session_state.active_project, exp, mode_eng)
         if worksheet_key in st.session_state:
             df = st.session_state[worksheet_key]
             if not df.empty:
@@ -3690,39 +6092,539 @@ def create_comparative_plot(selected_for_viz, mode_eng, project, comparison_grou
         st.warning("No data available for visualization")
         return None
     
-    # Create visualization based on mode
+    inputs = {'mode': mode_eng, 'groups': valid_groups, 'time': None,
+              'animal_type': animal_type, 'num_animals': num_animals}
     if mode_eng == "General Behavior":
         # For General Behavior, still use bar plot with time selection
-        selected_time = st.selectbox(
+        inputs['time'] = st.selectbox(
             t('select_time_compare'), 
             sorted(list(all_times)),
             key=f"time_select_{mode_eng}"
         )
-        return create_general_behavior_plot(valid_groups, selected_time, mode_eng, animal_type, num_animals, comparison_group)
-    elif mode_eng == "Body Weight":
-        # For Body Weight, create a special comparison plot
-        return create_body_weight_comparison_plot(valid_groups, mode_eng, animal_type, num_animals, comparison_group)
-    else:
+    elif mode_eng != "Body Weight":
         # For all other modes, use line charts
         # Allow selection of which groups to plot
         st.markdown(f"**{t('select_groups_chart')}**")
-        selected_groups_for_plot = st.multiselect(
+        inputs['groups'] = st.multiselect(
             t('groups_to_plot'),
             valid_groups,
             default=valid_groups,  # Show all groups by default
             key=f"groups_select_{mode_eng}"
         )
         
-        if not selected_groups_for_plot:
+        if not inputs['groups']:
             st.warning("Please select at least one group to plot")
             return None
+    return inputs
+
+# Function to draw a comparative plot with matplotlib (export quality) or Plotly (interactive)
+def render_comparative_plot(inputs, comparison_group=None, renderer='matplotlib'):
+    """Return a matplotlib Figure or a Plotly figure for the selected plot inputs"""
+    mode_eng = inputs['mode']
+    args = (inputs['groups'], mode_eng, inputs['animal_type'], inputs['num_animals'], comparison_group)
+    interactive = renderer == 'plotly'
+    
+    # Create visualization based on mode
+    if mode_eng == "General Behavior":
+        plot = create_general_behavior_plotly if interactive else create_general_behavior_plot
+        return plot(inputs['groups'], inputs['time'], *args[1:])
+    elif mode_eng == "Body Weight":
+        plot = create_body_weight_comparison_plotly if interactive else create_body_weight_comparison_plot
+    elif mode_eng == "Body Temperature":
+        plot = create_body_temperature_line_plotly if interactive else create_body_temperature_line_plot
+    elif mode_eng in BINARY_MODES:
+        plot = create_binary_score_line_plotly if interactive else create_binary_score_line_plot
+    else:
+        return None
+    return plot(*args)
+
+def create_comparative_plot(selected_for_viz, mode_eng, project, comparison_group=None, renderer='matplotlib'):
+    """Create comparative plots for all analysis modes"""
+    inputs = select_comparative_plot_inputs(selected_for_viz, mode_eng, project)
+    if inputs is None:
+        return None
+    return render_comparative_plot(inputs, comparison_group, renderer)
+
+# Function to build the data for a native (editable) PowerPoint chart of a comparison plot
+def build_native_chart_spec(inputs):
+    """Return {'chart_type', 'categories', 'series', 'value_axis_title'} for the plot inputs, or None"""
+    mode_eng = inputs['mode']
+    args = (inputs['groups'], mode_eng, inputs['animal_type'], inputs['num_animals'])
+    
+    if mode_eng == "General Behavior":
+        data = compute_general_behavior_plot_data(inputs['groups'], inputs['time'], *args[1:])
+        if data is None:
+            return None
+        return {'chart_type': 'column_clustered',
+                'categories': [group.split('_')[-1] for group in data['groups']],
+                'series': [(f"{t('mean_score')} ({inputs['time']} min)", data['means'])],
+                'value_axis_title': f"{t('mean_score')} (0-10)"}
+    
+    if mode_eng == "Body Weight":
+        data = compute_body_weight_plot_data(*args)
+        if data is None:
+            return None
+        return {'chart_type': 'column_clustered',
+                'categories': [group.split('_')[-1] for group in data['groups']],
+                'series': [(t('before_experiment'), data['before_means']),
+                           (t('after_experiment'), data['after_means'])],
+                'value_axis_title': t('weight_g')}
+    
+    if mode_eng == "Body Temperature":
+        data = compute_body_temperature_plot_data(*args)
+        if not data:
+            return None
+        times = sorted({time for group_times, _, _ in data.values() for time in group_times})
+        series = []
+        for group, (group_times, mean_temps, _) in data.items():
+            means = dict(zip(group_times, mean_temps))
+            series.append((group.split('_')[-1], [means.get(time) for time in times]))
+        return {'chart_type': 'line', 'categories': [f"{time} min" for time in times],
+                'series': series, 'value_axis_title': "Temperature (°C)"}
+    
+    if mode_eng in BINARY_MODES:
+        # One line per group: percent abnormal averaged over the mode's observations
+        tensor, times, present = compute_binary_abnormality_tensor(*args)
+        if not present.any() or len(times) == 0:
+            return None
+        observed = ~np.isnan(tensor)
+        counts = observed.sum(axis=1)
+        means = np.where(counts > 0, np.where(observed, tensor, 0).sum(axis=1) / np.maximum(counts, 1), np.nan)
+        series = [(group.split('_')[-1], list(means[idx])) for idx, group in enumerate(inputs['groups']) if present[idx]]
+        return {'chart_type': 'line', 'categories': [f"{time:g} min" for time in times],
+                'series': series, 'value_axis_title': f"{t('percentage_abnormal')} (%)"}
+    return None
+
+# Statistics computed per group and time for every mode, in this column order
+PROJECT_STATISTICS_COLUMNS = ['mode', 'group', 'time', 'n', 'mean', 'std', 'min', 'max', 'median']
+
+# Value axis title of each mode's statistics charts
+STATISTICS_VALUE_TITLES = {
+    "General Behavior": "Score",
+    "Body Temperature": "Temperature (°C)",
+    "Body Weight": "Weight (g)"
+}
+
+# Helper function to get one value per animal and time from a typed worksheet
+def worksheet_animal_values(typed_df, mode):
+    """Return a long frame of time/animal/value: the animal's score, temperature or weight,
+    averaged over the mode's observations (% abnormal observations for binary modes)"""
+    animal_columns = [col for col in typed_df.columns if col not in ('time', 'observation')]
+    cells = typed_df[animal_columns].astype(float)
+    if mode in BINARY_MODES:
+        # Blank cells count as normal, as in summarize_typed_worksheet
+        cells = (cells.fillna(0) > 0) * 100.0
+    per_animal = cells.groupby(typed_df['time'], sort=False).mean()
+    values = per_animal.reset_index().melt(id_vars='time', var_name='animal', value_name='value')
+    return values.dropna(subset=['value'])
+
+# Function to compute the statistics of every group and mode of a project in one pass
+def compute_project_statistics(project_id, project_data):
+    """Return n, mean, std (population), min, max and median per mode, group and time.
+
+    Every worksheet of the project is reduced to one value per animal and time and
+    the statistics come from a single groupby over all of them. The result is cached
+    until a worksheet or the project's layout changes, so the deck, the AI reports
+    and the on-screen analysis all read the same frame.
+    """
+    animal_type = project_data.get('animal_type', 'mouse')
+    if animal_type == 'custom':
+        animal_type = project_data.get('custom_animal_name', 'animal')
+    num_animals = project_data.get('num_animals', 8)
+    
+    worksheets = []
+    for mode in ALL_MODES:
+        for group in get_project_groups(project_id):
+            worksheet_key = get_worksheet_key(project_id, group, mode)
+            df = st.session_state.get(worksheet_key) if worksheet_key else None
+            if isinstance(df, pd.DataFrame):
+                worksheets.append((mode, group, worksheet_key, get_frame_digest(df)))
+    signature = (animal_type, num_animals, tuple((mode, group, digest) for mode, group, _, digest in worksheets))
+    
+    if 'project_statistics' not in st.session_state:
+        st.session_state.project_statistics = {}
+    cached = st.session_state.project_statistics.get(project_id)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    values = []
+    for mode, group, worksheet_key, _ in worksheets:
+        typed = get_typed_worksheet(worksheet_key, mode, animal_type, num_animals)
+        if typed is not None and not typed.empty:
+            values.append(worksheet_animal_values(typed, mode).assign(mode=mode, group=group))
+    if values:
+        grouped = pd.concat(values, ignore_index=True).groupby(['mode', 'group', 'time'], sort=False)['value']
+        statistics = pd.DataFrame({
+            'n': grouped.count(),
+            'mean': grouped.mean(),
+            'std': grouped.std(ddof=0),
+            'min': grouped.min(),
+            'max': grouped.max(),
+            'median': grouped.median()
+        }).reset_index()[PROJECT_STATISTICS_COLUMNS]
+    else:
+        statistics = pd.DataFrame(columns=PROJECT_STATISTICS_COLUMNS)
+    
+    st.session_state.project_statistics[project_id] = (signature, statistics)
+    return statistics
+
+# Helper function to get one mode's rows of the project statistics
+def get_mode_statistics(project_id, project_data, mode, groups=None):
+    """Return the project statistics of a mode, optionally limited to some groups"""
+    statistics = compute_project_statistics(project_id, project_data)
+    rows = statistics['mode'] == mode
+    if groups is not None:
+        rows &= statistics['group'].isin(groups)
+    return statistics[rows].drop(columns='mode').reset_index(drop=True)
+
+# Helper function to label a statistics time point
+def statistics_time_label(time):
+    """Return '15 min' for numeric times and 'Before'/'After' for body weight"""
+    return f"{time:g} min" if isinstance(time, (int, float, np.number)) else str(time).capitalize()
+
+# Function to build the time series and statistical summary charts of a mode
+def build_statistics_chart_specs(mode_stats, mode):
+    """Return (time_series, summary) native chart specs from a mode's statistics; None where there is no data.
+
+    The summary compares each group's statistics at its last time point.
+    """
+    if mode_stats.empty:
+        return None, None
+    value_title = STATISTICS_VALUE_TITLES.get(mode, "Abnormal (%)")
+    times = list(dict.fromkeys(mode_stats['time']))
+    means = mode_stats.pivot_table(index='group', columns='time', values='mean', sort=False).reindex(columns=times)
+    time_series = {'chart_type': 'line', 'categories': [statistics_time_label(time) for time in times],
+                   'series': [(group, list(row)) for group, row in means.iterrows()],
+                   'value_axis_title': value_title}
+    
+    last = mode_stats.groupby('group', sort=False).tail(1)
+    summary = {'chart_type': 'column_clustered', 'categories': ['Mean', 'Std Dev', 'Min', 'Max', 'Median'],
+               'series': [(f"{row.group} ({statistics_time_label(row.time)})",
+                           [row.mean, row.std, row.min, row.max, row.median]) for row in last.itertuples()],
+               'value_axis_title': value_title}
+    return time_series, summary
+
+# Function to describe the time series and statistical summary charts of a mode
+def describe_statistics_charts(mode_stats, mode, language='en'):
+    """Return (time_series, summary) slide text read off a mode's statistics; None where there is no data.
+
+    Only descriptive statistics are computed, so the text reports values and makes no significance claims.
+    """
+    if mode_stats.empty:
+        return None, None
+    unit = STATISTICS_VALUE_TITLES.get(mode, "Abnormal (%)")
+    zh = language == 'zh'
+    
+    # Time course: each group's mean at its first and last time point and, with more points, where it peaked
+    courses = []
+    for group, rows in mode_stats.groupby('group', sort=False):
+        rows = rows.dropna(subset=['mean'])
+        if rows.empty:
+            continue
+        first, last = rows.iloc[0], rows.iloc[-1]
+        peak = rows.loc[rows['mean'].idxmax()]
+        if zh:
+            course = (f"{group}: {statistics_time_label(first['time'])} {first['mean']:.2f} → "
+                      f"{statistics_time_label(last['time'])} {last['mean']:.2f}")
+            if len(rows) > 2:
+                course += f"，峰值 {peak['mean']:.2f}（{statistics_time_label(peak['time'])}）"
+        else:
+            course = (f"{group}: {first['mean']:.2f} at {statistics_time_label(first['time'])} to "
+                      f"{last['mean']:.2f} at {statistics_time_label(last['time'])}")
+            if len(rows) > 2:
+                course += f", peak {peak['mean']:.2f} at {statistics_time_label(peak['time'])}"
+        courses.append(course)
+    
+    # Summary: the groups at their last time point, highest mean first
+    last = mode_stats.dropna(subset=['mean']).groupby('group', sort=False).tail(1).sort_values('mean', ascending=False)
+    summaries = []
+    for row in last.itertuples():
+        spread = f"{row.std:.2f}" if pd.notna(row.std) else "-"
+        if zh:
+            summaries.append(f"{row.group}: 均值 {row.mean:.2f}（标准差 {spread}，范围 {row.min:.2f}–{row.max:.2f}，"
+                             f"中位数 {row.median:.2f}，n={row.n}）")
+        else:
+            summaries.append(f"{row.group}: mean {row.mean:.2f} (SD {spread}, range {row.min:.2f}–{row.max:.2f}, "
+                             f"median {row.median:.2f}, n={row.n})")
+    if not courses or not summaries:
+        return None, None
+    
+    if zh:
+        note = "仅为描述性统计，未进行显著性检验。"
+        return (f"各组{unit}均值随时间变化：" + "；".join(courses) + "。" + note,
+                f"各组最后时间点的{unit}（按均值由高到低）：" + "；".join(summaries) + "。" + note)
+    note = "Descriptive statistics only; no significance test was performed."
+    return (f"Group mean {unit} over time - " + "; ".join(courses) + ". " + note,
+            f"{unit} at each group's last time point, highest mean first - " + "; ".join(summaries) + ". " + note)
+
+# Function to draw a native chart spec as a matplotlib figure
+def draw_chart_spec(spec, title):
+    """Return a slide-sized Figure showing a line or clustered column chart spec"""
+    fig = Figure(figsize=SLIDE_CHART_SIZE)
+    ax = fig.subplots()
+    x = np.arange(len(spec['categories']))
+    if spec['chart_type'] == 'line':
+        for name, values in spec['series']:
+            ax.plot(x, np.asarray(values, dtype=float), 'o-', label=name, linewidth=2, markersize=6)
+    else:
+        width = 0.8 / max(len(spec['series']), 1)
+        for idx, (name, values) in enumerate(spec['series']):
+            ax.bar(x + (idx - (len(spec['series']) - 1) / 2) * width, np.asarray(values, dtype=float), width, label=name)
+    ax.set_xticks(x)
+    ax.set_xticklabels(spec['categories'])
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_ylabel(spec['value_axis_title'])
+    ax.grid(True, alpha=0.3)
+    if len(spec['series']) > 1:
+        ax.legend(fontsize=8)
+    fig.tight_layout()
+    return fig
+
+# Helper function to hash the content behind one mode's deck section
+def mode_content_hash(project_id, mode, settings=()):
+    """Hash the digests of every group's worksheet for a mode together with the section settings"""
+    content = hashlib.sha1()
+    for group in get_project_groups(project_id):
+        worksheet_key = get_worksheet_key(project_id, group, mode)
+        df = st.session_state.get(worksheet_key) if worksheet_key else None
+        digest = get_frame_digest(df) if isinstance(df, pd.DataFrame) else None
+        content.update(json.dumps([group, digest]).encode('utf-8'))
+    content.update(json.dumps(settings, default=str).encode('utf-8'))
+    return content.hexdigest()
+
+# Function to get the deck section of one mode, rebuilding it only when its data changed
+def get_deck_section(project_id, project_data, mode, language, native_charts=False):
+    """Return {'hash', 'charts', 'results_desc', 'time_series_desc', 'summary_desc', 'reused'} for a mode's slides"""
+    project_groups = get_project_groups(project_id)
+    plot_inputs = select_comparative_plot_inputs(project_groups, mode, project_data) if project_groups else None
+    content_hash = mode_content_hash(project_id, mode, [plot_inputs, language, native_charts, project_data])
+    
+    if 'deck_sections' not in st.session_state:
+        st.session_state.deck_sections = {}
+    cached = st.session_state.deck_sections.get((project_id, mode))
+    if cached is not None and cached['hash'] == content_hash:
+        cached['reused'] = True
+        return cached
+    
+    charts = []
+    if plot_inputs is not None:
+        native = build_native_chart_spec(plot_inputs)
+        
+        # Native charts need no image; otherwise create the plot for this mode
+        fig = None if native_charts and native else render_comparative_plot(plot_inputs)
+        if fig is not None or native:
+            chart_info = capture_chart_for_powerpoint(
+                fig,
+                f"{mode} - Group Comparison",
+                mode,
+                "Group Comparison Plot",
+                f"Comparative analysis showing {mode} results across selected groups",
+                add_to_session=False,
+                native=native
+            )
+            if chart_info:
+                charts.append(chart_info)
+            if fig is not None:
+                plt.close(fig)
+    
+    # Time series and statistical summary come from the shared project statistics
+    mode_stats = get_mode_statistics(project_id, project_data, mode)
+    for spec, chart_title, chart_type, description in zip(
+            build_statistics_chart_specs(mode_stats, mode),
+            [f"{mode} - Time Series", f"{mode} - Statistical Summary"],
+            ["Time Series Plot", "Statistical Summary Plot"],
+            [f"Group means of {mode} at each time point",
+             f"Mean, standard deviation, range and median of {mode} per group at the last time point"]):
+        if spec is None:
+            continue
+        fig = None if native_charts else draw_chart_spec(spec, chart_title)
+        chart_info = capture_chart_for_powerpoint(fig, chart_title, mode, chart_type, description,
+                                                  add_to_session=False, native=spec)
+        if chart_info:
+            charts.append(chart_info)
+    
+    time_series_desc, summary_desc = describe_statistics_charts(mode_stats, mode, language)
+    section = {
+        'hash': content_hash,
+        'charts': charts,
+        'results_desc': generate_group_specific_description(mode, project_data, language),
+        'time_series_desc': time_series_desc,
+        'summary_desc': summary_desc,
+        'reused': False
+    }
+    st.session_state.deck_sections[(project_id, mode)] = section
+    return section
+
+# Per-mode deck narrative: each mode's slide texts are written concurrently
+NARRATIVE_CONCURRENCY = int(os.getenv("FOB_NARRATIVE_CONCURRENCY", "4"))
+NARRATIVE_TIMEOUT_S = float(os.getenv("FOB_NARRATIVE_TIMEOUT_S", "45"))
+NARRATIVE_PARTS = ('intro', 'results', 'time_series', 'summary', 'conclusion')
+
+# Helper function to describe a mode's statistics for an AI prompt
+def describe_mode_statistics(project_id, project_data, mode, groups=None):
+    """Return the mode's per-group, per-time statistics as a text table ('' without data)"""
+    mode_stats = get_mode_statistics(project_id, project_data, mode, groups)
+    if mode_stats.empty:
+        return ""
+    mode_stats = mode_stats.assign(time=mode_stats['time'].map(statistics_time_label))
+    table = mode_stats.to_string(index=False, float_format=lambda value: f"{value:.2f}")
+    return f"Value per animal: {STATISTICS_VALUE_TITLES.get(mode, 'Abnormal (%)')}\n{table}"
+
+# Helper function to build the narrative prompt for one mode
+def build_mode_narrative_prompt(project_data, mode, statistics, language='en'):
+    """Ask for a JSON object with one paragraph per mode slide, grounded in the statistics"""
+    language_name = "Chinese" if language == 'zh' else "English"
+    return f"""You are writing the slides of a scientific presentation on a Functional Observational Battery (FOB) study.
+
+Project: {project_data.get('name', 'N/A')}
+Animal type: {project_data.get('animal_type', 'N/A')}
+Animals per group: {project_data.get('num_animals', 'N/A')}
+Test mode: {mode}
+
+Summary statistics per group:
+{statistics or 'No data recorded'}
+
+Write in {language_name}. Base every statement on the statistics above and do not invent numbers.
+These are descriptive statistics only: no significance test was run, so do not call any difference significant.
+Reply with a JSON object only, with these keys:
+- "intro": what the {mode} assessment measures and why it matters (at most 100 words)
+- "results": interpretation of the group differences shown in the statistics (at most 80 words)
+- "time_series": how each group's mean changes over the time points (at most 80 words)
+- "summary": how the groups compare in mean, spread and range at their last time point (at most 80 words)
+- "conclusion": what the results mean for the treatment's safety profile (at most 100 words)"""
+
+# Helper function to parse a narrative reply
+def parse_mode_narrative(response):
+    """Return the NARRATIVE_PARTS found in a JSON reply, keeping only non-empty strings"""
+    if not isinstance(response, str) or response.startswith("Error"):
+        return {}
+    match = re.search(r"\{.*\}", response, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {part: parsed[part].strip() for part in NARRATIVE_PARTS
+            if isinstance(parsed.get(part), str) and parsed[part].strip()}
+
+# Function to run the narrative calls concurrently
+async def generate_mode_narratives_async(prompts, executor):
+    """Fan the prompts out under a concurrency cap; a call that fails or times out yields {}"""
+    semaphore = asyncio.Semaphore(NARRATIVE_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    
+    async def narrate(mode, prompt):
+        async with semaphore:
+            try:
+                response = await asyncio.wait_for(loop.run_in_executor(executor, make_deepseek_api_call, prompt),
+                                                  NARRATIVE_TIMEOUT_S)
+            except Exception:
+                return mode, {}
+        return mode, parse_mode_narrative(response)
+    
+    return dict(await asyncio.gather(*(narrate(mode, prompt) for mode, prompt in prompts.items())))
+
+# Function to generate the narrative of several modes at once
+def generate_mode_narratives(prompts):
+    """Return {mode: narrative} for {mode: prompt}; total time is bounded by the slowest call"""
+    if not prompts:
+        return {}
+    if not llm_ready():
+        return {mode: {} for mode in prompts}
+    # Timed-out calls are abandoned rather than waited for when the loop closes
+    executor = ThreadPoolExecutor(max_workers=NARRATIVE_CONCURRENCY)
+    try:
+        return asyncio.run(generate_mode_narratives_async(prompts, executor))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Function to add AI narrative to the deck sections that do not have it yet
+def fill_deck_narratives(project_id, project_data, sections, language='en'):
+    """Generate narrative for new or changed sections in one concurrent batch"""
+    prompts = {}
+    for mode, section in sections.items():
+        if section.get('narrative'):
+            continue
+        statistics = describe_mode_statistics(project_id, project_data, mode)
+        prompts[mode] = build_mode_narrative_prompt(project_data, mode, statistics, language)
+    for mode, narrative in generate_mode_narratives(prompts).items():
+        # Sections whose calls failed stay empty and are retried with the next deck
+        sections[mode]['narrative'] = narrative
+    return sections
+
+# Figure templates: each chart shape is laid out once, later renders only move its artists
+FIGURE_TEMPLATE_CACHE_SIZE = 8
+
+# Helper function to get a cached figure template for a chart shape
+def get_figure_template(shape, build):
+    """Return (template, is_new) for a chart shape in the current language, building it on a miss"""
+    if 'figure_templates' not in st.session_state:
+        st.session_state.figure_templates = OrderedDict()
+    templates = st.session_state.figure_templates
+    shape = shape + (st.session_state.language,)
+    if shape in templates:
+        templates.move_to_end(shape)
+        return templates[shape], False
+    template = build()
+    templates[shape] = template
+    while len(templates) > FIGURE_TEMPLATE_CACHE_SIZE:
+        templates.popitem(last=False)
+    return template, True
+
+# Helper function to move an errorbar container to new data
+def update_errorbar(container, x, y, yerr):
+    """Update the data line, caps and bars of an ErrorbarContainer in place"""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    yerr = np.asarray(yerr, dtype=float)
+    data_line, caplines, barlinecols = container.lines
+    if data_line is not None:
+        data_line.set_data(x, y)
+    if caplines:
+        caplines[0].set_data(x, y - yerr)
+        caplines[1].set_data(x, y + yerr)
+    if barlinecols:
+        barlinecols[0].set_segments(np.stack([np.column_stack([x, y - yerr]), np.column_stack([x, y + yerr])], axis=1))
+
+# Helper function to rebuild a template's legend only when its entries change
+def refresh_template_legend(template, signature, make_legend):
+    """Call make_legend() if the legend labels or styles differ from the last render"""
+    if template.get('legend_signature') != signature:
+        make_legend()
+        template['legend_signature'] = signature
+
+# Helper function to get the line style of a group in the line plots
+def group_line_style(group, comparison_group):
+    """Return (linestyle, linewidth, marker); the comparison group is dashed with square markers"""
+    if group == comparison_group:
+        return '--', 3, 's'
+    return '-', 2, 'o'
+
+# Function to collect body weight means per group for plotting
+def compute_body_weight_plot_data(valid_groups, mode_eng, animal_type, num_animals):
+    """Return before/after means, stds and mean % change for groups with paired weights, or None"""
+    data = {'groups': [], 'before_means': [], 'before_stds': [], 'after_means': [], 'after_stds': [],
+            'percent_changes': []}
+    
+    for group in valid_groups:
+        worksheet_key = get_worksheet_key(st.session_state.active_project, group, mode_eng)
+        if worksheet_key in st.session_state:
+            # Typed times accept before/after labels in either language
+            typed_df = get_typed_worksheet(worksheet_key, mode_eng, animal_type, num_animals)
+            changes = compute_weight_changes(typed_df)
             
-        if mode_eng == "Body Temperature":
-            return create_body_temperature_line_plot(selected_groups_for_plot, mode_eng, animal_type, num_animals, comparison_group)
-        elif mode_eng in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-            return create_binary_score_line_plot(selected_groups_for_plot, mode_eng, animal_type, num_animals, comparison_group)
+            if not changes.empty:
+                data['groups'].append(group)
+                data['before_means'].append(changes['before'].mean())
+                data['before_stds'].append(changes['before'].std(ddof=0))
+                data['after_means'].append(changes['after'].mean())
+                data['after_stds'].append(changes['after'].std(ddof=0))
+                data['percent_changes'].append(changes['percent_change'].mean())
     
-    return None
+    return data if data['groups'] else None
 
 def create_body_weight_comparison_plot(valid_groups, mode_eng, animal_type, num_animals, comparison_group):
     """Create comparison plot for Body Weight mode"""
@@ -3730,199 +6632,196 @@ def create_body_weight_comparison_plot(valid_groups, mode_eng, animal_type, num_
     if st.session_state.language == 'zh':
         ensure_chinese_font()
     
-    fig, ax = plt.subplots(figsize=(14, 8))
-    
-    group_names = []
-    before_means = []
-    before_stds = []
-    after_means = []
-    after_stds = []
-    percent_changes = []
-    
-    for group in valid_groups:
-        worksheet_key = f"worksheet_{group}_{mode_eng}"
-        if worksheet_key in st.session_state:
-            df = st.session_state[worksheet_key]
-            
-            before_df = df[df['time'] == 'before']
-            after_df = df[df['time'] == 'after']
-            
-            if not before_df.empty and not after_df.empty:
-                before_weights = []
-                after_weights = []
-                changes = []
-                
-                for i in range(1, num_animals + 1):
-                    animal_col = f'{animal_type}_{i}'
-                    if animal_col in before_df.columns:
-                        try:
-                            before_weight = float(before_df.iloc[0][animal_col])
-                            after_weight = float(after_df.iloc[0][animal_col])
-                            before_weights.append(before_weight)
-                            after_weights.append(after_weight)
-                            changes.append(((after_weight - before_weight) / before_weight) * 100)
-                        except (ValueError, TypeError):
-                            continue
-                
-                if before_weights and after_weights:
-                    group_names.append(group.split('_')[-1])
-                    before_means.append(np.mean(before_weights))
-                    before_stds.append(np.std(before_weights))
-                    after_means.append(np.mean(after_weights))
-                    after_stds.append(np.std(after_weights))
-                    percent_changes.append(np.mean(changes))
-    
-    if not group_names:
+    data = compute_body_weight_plot_data(valid_groups, mode_eng, animal_type, num_animals)
+    if data is None:
         st.warning("No valid weight data found")
         return None
     
-    # Create grouped bar chart
-    x = np.arange(len(group_names))
+    n_groups = len(data['groups'])
+    x = np.arange(n_groups)
     width = 0.35
     
-    # Plot before/after bars
-    bars1 = ax.bar(x - width/2, before_means, width, yerr=before_stds, 
-                     label=t('before_experiment'), capsize=5, alpha=0.8, color='#3498db')
-    bars2 = ax.bar(x + width/2, after_means, width, yerr=after_stds,
-                     label=t('after_experiment'), capsize=5, alpha=0.8, color='#e74c3c')
-    
-    # Color comparison group differently
-    for i, group in enumerate(group_names):
-        full_group = f"{st.session_state.projects[st.session_state.active_project]['name']}_Group_{group}"
-        if full_group == comparison_group:
+    def build():
+        fig = Figure(figsize=(14, 8))
+        ax = fig.add_subplot()
+        
+        # Grouped before/after bars
+        bars1 = ax.bar(x - width/2, np.zeros(n_groups), width, yerr=np.zeros(n_groups),
+                       label=t('before_experiment'), capsize=5, alpha=0.8, color='#3498db')
+        bars2 = ax.bar(x + width/2, np.zeros(n_groups), width, yerr=np.zeros(n_groups),
+                       label=t('after_experiment'), capsize=5, alpha=0.8, color='#e74c3c')
+        
+        # Value labels and the percentage change label above each group
+        before_labels = [ax.text(i - width/2, 0, '', ha='center', va='bottom', fontsize=10, fontweight='bold')
+                         for i in range(n_groups)]
+        after_labels = [ax.text(i + width/2, 0, '', ha='center', va='bottom', fontsize=10, fontweight='bold')
+                        for i in range(n_groups)]
+        change_labels = [ax.text(i, 0, '', ha='center', va='bottom', fontsize=11, fontweight='bold',
+                                 bbox=dict(boxstyle="round,pad=0.3", facecolor='white'))
+                         for i in range(n_groups)]
+        
+        # Formatting
+        ax.set_xlabel(t('group'), fontsize=14)
+        ax.set_ylabel(f"{t('weight_g')}", fontsize=14)
+        ax.set_title(f"{t('body_weight')} - {t('before_experiment')} vs {t('after_experiment')} {t('comparative_viz')}", 
+                     fontsize=16, fontweight='bold')
+        ax.set_xticks(x)
+        ax.grid(True, alpha=0.3, axis='y')
+        
+        # Baseline at y=0, shown only when there are negative values
+        baseline = ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5, visible=False)
+        return {'figure': fig, 'axes': ax, 'bars': (bars1, bars2), 'baseline': baseline,
+                'labels': (before_labels, after_labels, change_labels)}
+    
+    template, is_new = get_figure_template(("Body Weight", n_groups, 1), build)
+    fig, ax = template['figure'], template['axes']
+    bars1, bars2 = template['bars']
+    before_labels, after_labels, change_labels = template['labels']
+    
+    before_means, before_stds = data['before_means'], data['before_stds']
+    after_means, after_stds = data['after_means'], data['after_stds']
+    percent_changes = data['percent_changes']
+    
+    for i in range(n_groups):
+        bars1[i].set_height(before_means[i])
+        bars2[i].set_height(after_means[i])
+        # Color comparison group differently
+        if data['groups'][i] == comparison_group:
             bars1[i].set_color('#28a745')
             bars2[i].set_color('#1e7e34')
+        else:
+            bars1[i].set_color('#3498db')
+            bars2[i].set_color('#e74c3c')
+    update_errorbar(bars1.errorbar, x - width/2, before_means, before_stds)
+    update_errorbar(bars2.errorbar, x + width/2, after_means, after_stds)
     
-    # Add value labels on bars
+    # Move value labels on bars
     for i, (before, after) in enumerate(zip(before_means, after_means)):
-        # Before weight label
-        ax.text(i - width/2, before + before_stds[i] + 0.5, f"{before:.1f}", 
-                ha='center', va='bottom', fontsize=10, fontweight='bold')
-        # After weight label
-        ax.text(i + width/2, after + after_stds[i] + 0.5, f"{after:.1f}", 
-                ha='center', va='bottom', fontsize=10, fontweight='bold')
-        
-        # Add percentage change label above the group
+        before_labels[i].set_position((i - width/2, before + before_stds[i] + 0.5))
+        before_labels[i].set_text(f"{before:.1f}")
+        after_labels[i].set_position((i + width/2, after + after_stds[i] + 0.5))
+        after_labels[i].set_text(f"{after:.1f}")
+        
         change_color = 'red' if percent_changes[i] < 0 else 'green'
-        y_pos = max(before + before_stds[i], after + after_stds[i]) + 3
-        ax.text(i, y_pos, f"{percent_changes[i]:+.1f}%", 
-                ha='center', va='bottom', fontsize=11, fontweight='bold', 
-                color=change_color, bbox=dict(boxstyle="round,pad=0.3", facecolor='white', edgecolor=change_color))
-    
-    # Formatting
-    ax.set_xlabel(t('group'), fontsize=14)
-    ax.set_ylabel(f"{t('weight_g')}", fontsize=14)
-    ax.set_title(f"{t('body_weight')} - {t('before_experiment')} vs {t('after_experiment')} {t('comparative_viz')}", 
-                 fontsize=16, fontweight='bold')
-    ax.set_xticks(x)
-    ax.set_xticklabels(group_names, fontsize=12)
-    ax.legend(fontsize=12, loc='upper left')
-    ax.grid(True, alpha=0.3, axis='y')
+        change_labels[i].set_position((i, max(before + before_stds[i], after + after_stds[i]) + 3))
+        change_labels[i].set_text(f"{percent_changes[i]:+.1f}%")
+        change_labels[i].set_color(change_color)
+        change_labels[i].get_bbox_patch().set_edgecolor(change_color)
     
-    # Add a subtle horizontal line at y=0 to show the baseline
-    if min(before_means + after_means) < 0:
-        ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
+    ax.set_xticklabels([group.split('_')[-1] for group in data['groups']], fontsize=12)
     
     # Set y-axis to start from 0 unless there are negative values
-    if min(before_means + after_means) >= 0:
+    has_negative = min(before_means + after_means) < 0
+    template['baseline'].set_visible(has_negative)
+    ax.set_autoscaley_on(True)
+    ax.relim(visible_only=True)
+    ax.autoscale_view(scalex=False)
+    if not has_negative:
         ax.set_ylim(bottom=0)
     
-    plt.tight_layout()
+    refresh_template_legend(template, (data['groups'][0] == comparison_group,),
+                            lambda: ax.legend(fontsize=12, loc='upper left'))
+    if is_new:
+        fig.tight_layout()
     return fig
 
+# Function to collect General Behavior means per group at one time point
+def compute_general_behavior_plot_data(valid_groups, selected_time, mode_eng, animal_type, num_animals):
+    """Return the mean and std of the per-observation mean scores for each group, or None"""
+    data = {'groups': [], 'means': [], 'stds': []}
+    
+    for exp in valid_groups:
+        worksheet_key = get_worksheet_key(st.session_state.active_project, exp, mode_eng)
+        if worksheet_key in st.session_state:
+            aggregates = get_worksheet_aggregates(worksheet_key, mode_eng, animal_type, num_animals)
+            all_mean_scores = [stats[1] for (time, _), stats in aggregates.items()
+                               if time == journal_value(selected_time) and stats[0] > 0]
+            
+            if all_mean_scores:
+                data['groups'].append(exp)
+                data['means'].append(np.mean(all_mean_scores))
+                data['stds'].append(np.std(all_mean_scores))
+    
+    return data if data['groups'] else None
+
 def create_general_behavior_plot(valid_groups, selected_time, mode_eng, animal_type, num_animals, comparison_group):
     """Create plot for General Behavior mode"""
     # Ensure Chinese font is loaded if language is Chinese
     if st.session_state.language == 'zh':
         ensure_chinese_font()
     
-    fig, ax = plt.subplots(figsize=(12, 8))
-    
-    overall_means = []
-    overall_stds = []
-    group_names = []
-    
-    for exp in valid_groups:
-        worksheet_key = f"worksheet_{exp}_{mode_eng}"
-        if worksheet_key in st.session_state:
-            df = st.session_state[worksheet_key]
-            filtered = df[df['time'] == selected_time]
-            
-            if not filtered.empty:
-                all_mean_scores = []
-                for _, row in filtered.iterrows():
-                    animal_scores = [row[f'{animal_type}_{i}'] for i in range(1, num_animals + 1) 
-                                   if f'{animal_type}_{i}' in row]
-                    mean_score = calculate_mean_score(animal_scores)
-                    if not pd.isna(mean_score):
-                        all_mean_scores.append(mean_score)
-                
-                if all_mean_scores:
-                    overall_means.append(np.mean(all_mean_scores))
-                    overall_stds.append(np.std(all_mean_scores))
-                    group_names.append(exp)
-    
-    if not overall_means:
+    data = compute_general_behavior_plot_data(valid_groups, selected_time, mode_eng, animal_type, num_animals)
+    if data is None:
         st.warning("No valid data for the selected time point")
         return None
     
-    # Create bar plot
-    x_pos = range(len(group_names))
-    bars = ax.bar(x_pos, overall_means, yerr=overall_stds, capsize=5, alpha=0.8)
+    n_groups = len(data['groups'])
+    x_pos = np.arange(n_groups)
+    
+    def build():
+        fig = Figure(figsize=(12, 8))
+        ax = fig.add_subplot()
+        bars = ax.bar(x_pos, np.zeros(n_groups), yerr=np.zeros(n_groups), capsize=5, alpha=0.8)
+        
+        # Formatting
+        title = ax.set_title('', fontsize=14, fontweight='bold')
+        ax.set_ylabel(f"{t('mean_score')} (0-10)", fontsize=12)
+        ax.set_xlabel(t('group'), fontsize=12)
+        ax.set_xticks(x_pos)
+        ax.set_ylim(0, 10)
+        ax.grid(True, alpha=0.3, axis='y')
+        
+        # Add threshold lines
+        ax.axhline(y=2, color='gray', linestyle='--', alpha=0.7, label='Lower threshold')
+        ax.axhline(y=6, color='gray', linestyle='--', alpha=0.7, label='Upper threshold')
+        
+        labels = [ax.text(i, 0, '', ha='center', va='bottom', fontweight='bold') for i in range(n_groups)]
+        
+        # Add legend
+        from matplotlib.patches import Patch
+        legend_elements = [
+            Patch(facecolor='#28a745', label=t('comparison_group')),
+            Patch(facecolor='#4cc9f0', label=t('normal')),
+            Patch(facecolor='#ff6b6b', label=t('abnormal'))
+        ]
+        ax.legend(handles=legend_elements, loc='upper right')
+        return {'figure': fig, 'axes': ax, 'bars': bars, 'labels': labels, 'title': title}
+    
+    template, is_new = get_figure_template(("General Behavior", n_groups, 1), build)
+    fig, ax, bars = template['figure'], template['axes'], template['bars']
     
     # Color bars based on status
-    for i, (mean, group) in enumerate(zip(overall_means, group_names)):
+    for i, (mean, group) in enumerate(zip(data['means'], data['groups'])):
+        bars[i].set_height(mean)
         if group == comparison_group:
             bars[i].set_color('#28a745')  # Green for comparison group
         elif mean < 2 or mean > 6:  # Abnormal
             bars[i].set_color('#ff6b6b')  # Red for abnormal
         else:
             bars[i].set_color('#4cc9f0')  # Blue for normal
+    update_errorbar(bars.errorbar, x_pos, data['means'], data['stds'])
     
-    # Formatting
-    ax.set_title(f"{t('general_behavior')} - {t('comparative_viz')} ({selected_time} min)", fontsize=14, fontweight='bold')
-    ax.set_ylabel(f"{t('mean_score')} (0-10)", fontsize=12)
-    ax.set_xlabel(t('group'), fontsize=12)
-    ax.set_xticks(x_pos)
-    ax.set_xticklabels([g.split('_')[-1] for g in group_names], rotation=45, ha='right')
-    ax.set_ylim(0, 10)
-    ax.grid(True, alpha=0.3, axis='y')
+    template['title'].set_text(f"{t('general_behavior')} - {t('comparative_viz')} ({selected_time} min)")
+    ax.set_xticklabels([g.split('_')[-1] for g in data['groups']], rotation=45, ha='right')
     
-    # Add threshold lines
-    ax.axhline(y=2, color='gray', linestyle='--', alpha=0.7, label='Lower threshold')
-    ax.axhline(y=6, color='gray', linestyle='--', alpha=0.7, label='Upper threshold')
-    
-    # Add value labels
-    for i, (mean, std) in enumerate(zip(overall_means, overall_stds)):
-        ax.text(i, mean + std + 0.2, f"{mean:.2f}", ha='center', va='bottom', fontweight='bold')
-    
-    # Add legend
-    from matplotlib.patches import Patch
-    legend_elements = [
-        Patch(facecolor='#28a745', label=t('comparison_group')),
-        Patch(facecolor='#4cc9f0', label=t('normal')),
-        Patch(facecolor='#ff6b6b', label=t('abnormal'))
-    ]
-    ax.legend(handles=legend_elements, loc='upper right')
+    # Move value labels
+    for i, (mean, std) in enumerate(zip(data['means'], data['stds'])):
+        template['labels'][i].set_position((i, mean + std + 0.2))
+        template['labels'][i].set_text(f"{mean:.2f}")
     
-    plt.tight_layout()
+    if is_new:
+        fig.tight_layout()
     return fig
 
-def create_body_temperature_line_plot(selected_groups, mode_eng, animal_type, num_animals, comparison_group):
-    """Create line plot for Body Temperature mode"""
-    # Ensure Chinese font is loaded if language is Chinese
-    if st.session_state.language == 'zh':
-        ensure_chinese_font()
-    
-    fig, ax = plt.subplots(figsize=(14, 8))
-    
-    # Colors for different groups
-    colors = plt.cm.tab10(np.linspace(0, 1, len(selected_groups)))
-    
-    for idx, group in enumerate(selected_groups):
-        worksheet_key = f"worksheet_{group}_{mode_eng}"
+# Function to collect body temperature means per group and time point
+def compute_body_temperature_plot_data(selected_groups, mode_eng, animal_type, num_animals):
+    """Return {group: (times, means, stds)} for groups with a worksheet"""
+    data = {}
+    for group in selected_groups:
+        worksheet_key = get_worksheet_key(st.session_state.active_project, group, mode_eng)
         if worksheet_key in st.session_state:
             df = st.session_state[worksheet_key]
+            aggregates = get_worksheet_aggregates(worksheet_key, mode_eng, animal_type, num_animals)
             
             # Get unique times and sort them
             times = sorted(df['time'].unique())
@@ -3930,57 +6829,124 @@ def create_body_temperature_line_plot(selected_groups, mode_eng, animal_type, nu
             std_temps = []
             
             for time in times:
-                time_df = df[df['time'] == time]
-                all_temps = []
+                # Merge the running aggregates of every row at this time point
+                stats = [0, 0.0, 0.0]
+                for (row_time, _), row_stats in aggregates.items():
+                    if row_time == journal_value(time):
+                        welford_merge(stats, row_stats)
+                count, mean_temp, std_temp = aggregate_statistics(stats)
                 
-                for _, row in time_df.iterrows():
-                    # Collect all animal temperatures
-                    for i in range(1, num_animals + 1):
-                        if f'{animal_type}_{i}' in row:
-                            try:
-                                temp = float(row[f'{animal_type}_{i}'])
-                                all_temps.append(temp)
-                            except (ValueError, TypeError):
-                                continue
-                
-                if all_temps:
-                    mean_temps.append(np.mean(all_temps))
-                    std_temps.append(np.std(all_temps))
+                if count:
+                    mean_temps.append(mean_temp)
+                    std_temps.append(std_temp)
                 else:
                     mean_temps.append(np.nan)
                     std_temps.append(0)
-            
-            # Plot line with error bars
-            line_style = '-' if group != comparison_group else '--'
-            line_width = 2 if group != comparison_group else 3
-            marker = 'o' if group != comparison_group else 's'
-            
-            ax.errorbar(times, mean_temps, yerr=std_temps, 
-                       label=group.split('_')[-1], 
-                       color=colors[idx],
-                       linestyle=line_style,
-                       linewidth=line_width,
-                       marker=marker,
-                       markersize=8,
-                       capsize=5,
-                       alpha=0.8)
+            data[group] = (times, mean_temps, std_temps)
+    return data
+
+def create_body_temperature_line_plot(selected_groups, mode_eng, animal_type, num_animals, comparison_group):
+    """Create line plot for Body Temperature mode"""
+    # Ensure Chinese font is loaded if language is Chinese
+    if st.session_state.language == 'zh':
+        ensure_chinese_font()
     
-    # Add normal range
-    ax.axhspan(36, 38, alpha=0.2, color='green', label='Normal range (36-38°C)')
+    data = compute_body_temperature_plot_data(selected_groups, mode_eng, animal_type, num_animals)
     
-    # Formatting
-    ax.set_title(f"{t('body_temperature')} - {t('comparative_viz')} ({t('all_time_points')})", fontsize=16, fontweight='bold')
-    ax.set_xlabel(f"{t('time')} (min)", fontsize=12)
-    ax.set_ylabel("Temperature (°C)", fontsize=12)
-    ax.grid(True, alpha=0.3)
-    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    def build():
+        fig = Figure(figsize=(14, 8))
+        ax = fig.add_subplot()
+        
+        # Colors for different groups
+        colors = plt.cm.tab10(np.linspace(0, 1, len(selected_groups)))
+        containers = [ax.errorbar([], [], yerr=[], color=colors[idx], markersize=8, capsize=5, alpha=0.8)
+                      for idx in range(len(selected_groups))]
+        
+        # Add normal range
+        span = ax.axhspan(36, 38, alpha=0.2, color='green', label='Normal range (36-38°C)')
+        
+        # Formatting
+        ax.set_title(f"{t('body_temperature')} - {t('comparative_viz')} ({t('all_time_points')})", fontsize=16, fontweight='bold')
+        ax.set_xlabel(f"{t('time')} (min)", fontsize=12)
+        ax.set_ylabel("Temperature (°C)", fontsize=12)
+        ax.grid(True, alpha=0.3)
+        
+        # Set y-axis limits
+        ax.set_ylim(34, 40)
+        return {'figure': fig, 'axes': ax, 'containers': containers, 'span': span}
     
-    # Set y-axis limits
-    ax.set_ylim(34, 40)
+    template, is_new = get_figure_template(("Body Temperature", len(selected_groups), 1), build)
+    fig, ax = template['figure'], template['axes']
     
-    plt.tight_layout()
+    legend_handles = [template['span']]
+    for idx, group in enumerate(selected_groups):
+        container = template['containers'][idx]
+        times, mean_temps, std_temps = data.get(group, ([], [], []))
+        update_errorbar(container, times, mean_temps, std_temps)
+        
+        # Line with error bars; the comparison group is dashed
+        line_style, line_width, marker = group_line_style(group, comparison_group)
+        data_line = container.lines[0]
+        data_line.set_linestyle(line_style)
+        data_line.set_linewidth(line_width)
+        data_line.set_marker(marker)
+        container.set_label(group.split('_')[-1])
+        if group in data:
+            legend_handles.append(container)
+    
+    ax.relim()
+    ax.autoscale_view(scaley=False)
+    refresh_template_legend(
+        template,
+        tuple((group, group == comparison_group, group in data) for group in selected_groups),
+        lambda: ax.legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc='upper left'))
+    if is_new:
+        fig.tight_layout()
     return fig
 
+# Function to compute the percent abnormal of a binary mode for every group, observation and time
+def compute_binary_abnormality_tensor(selected_groups, mode_eng, animal_type, num_animals):
+    """Return (tensor, times, present): tensor[group, observation, time] is % abnormal (NaN where no rows).
+
+    Observations follow the mode's observation list, times are the sorted union over
+    all groups and present flags the groups that have a worksheet. Values come from
+    the typed label codes (any code above 0 is abnormal) with one groupby per worksheet;
+    the denominator is every animal cell in the matching rows, blanks included.
+    """
+    schema = compile_worksheet_schema(mode_eng, animal_type, num_animals)
+    observations = list(dict.fromkeys(schema['observations'].values()))
+    
+    counts = []
+    present = np.zeros(len(selected_groups), dtype=bool)
+    for group_idx, group in enumerate(selected_groups):
+        worksheet_key = get_worksheet_key(st.session_state.active_project, group, mode_eng)
+        if worksheet_key not in st.session_state:
+            continue
+        present[group_idx] = True
+        typed = get_typed_worksheet(worksheet_key, mode_eng, animal_type, num_animals)
+        columns = [col for col in schema['animal_columns'] if col in typed.columns]
+        codes = typed[columns].fillna(0).to_numpy(dtype=np.int8)
+        grouped = pd.DataFrame({
+            'observation': typed['observation'],
+            'time': typed['time'],
+            'abnormal': (codes > 0).sum(axis=1),
+            'total': len(columns)
+        }).groupby(['observation', 'time'])[['abnormal', 'total']].sum()
+        counts.append((group_idx, grouped))
+    
+    times = np.array(sorted({time for _, grouped in counts for time in grouped.index.get_level_values('time')}), dtype=float)
+    tensor = np.full((len(selected_groups), len(observations), len(times)), np.nan)
+    observation_index = pd.Index(observations)
+    time_index = pd.Index(times)
+    for group_idx, grouped in counts:
+        obs_positions = observation_index.get_indexer(grouped.index.get_level_values('observation'))
+        time_positions = time_index.get_indexer(grouped.index.get_level_values('time'))
+        total = grouped['total'].to_numpy(dtype=float)
+        percent = np.divide(grouped['abnormal'].to_numpy(dtype=float) * 100, total,
+                            out=np.zeros_like(total), where=total > 0)
+        tensor[group_idx, obs_positions, time_positions] = percent
+    return tensor, times, present
+
 def create_binary_score_line_plot(selected_groups, mode_eng, animal_type, num_animals, comparison_group):
     """Create line plot for binary (Normal/Abnormal) scoring modes"""
     # Ensure Chinese font is loaded if language is Chinese
@@ -3995,93 +6961,236 @@ def create_binary_score_line_plot(selected_groups, mode_eng, animal_type, num_an
     else:  # Convulsive Behaviors
         observations = CONVULSIVE_OBSERVATIONS
     
+    # Percent abnormal for every (group, observation, time) in one pass per worksheet
+    tensor, times, present = compute_binary_abnormality_tensor(selected_groups, mode_eng, animal_type, num_animals)
+    
     # Create subplot for each observation
     n_obs = len(observations)
     n_cols = 3
     n_rows = (n_obs + n_cols - 1) // n_cols
     
-    fig, axes = plt.subplots(n_rows, n_cols, figsize=(18, 5*n_rows))
-    if n_rows == 1:
-        axes = axes.reshape(1, -1)
-    axes = axes.flatten()
-    
-    # Colors for different groups
-    colors = plt.cm.tab10(np.linspace(0, 1, len(selected_groups)))
-    
-    for obs_idx, obs in enumerate(observations):
-        ax = axes[obs_idx]
+    def build():
+        fig = Figure(figsize=(18, 5*n_rows))
+        axes = fig.subplots(n_rows, n_cols, squeeze=False).flatten()
         
-        for group_idx, group in enumerate(selected_groups):
-            worksheet_key = f"worksheet_{group}_{mode_eng}"
-            if worksheet_key in st.session_state:
-                df = st.session_state[worksheet_key]
-                
-                # Filter for this observation (use translated observation name)
-                obs_translated = t_obs(obs)
-                obs_df = df[df['observation'] == obs_translated]
-                
-                # Debug: Check if we found any data for this observation
-                if obs_df.empty:
-                    # Try to find data with English observation name as fallback
-                    obs_df = df[df['observation'] == obs]
-                
-                times = sorted(obs_df['time'].unique())
-                percentages = []
-                
-                for time in times:
-                    time_df = obs_df[obs_df['time'] == time]
-                    if not time_df.empty:
-                        abnormal_count = 0
-                        total_count = 0
-                        
-                        for _, row in time_df.iterrows():
-                            for i in range(1, num_animals + 1):
-                                if f'{animal_type}_{i}' in row:
-                                    cell_value = str(row[f'{animal_type}_{i}']).lower()
-                                    # Check for abnormal, pale, or cyanosis (all are considered abnormal)
-                                    if cell_value in [t('abnormal').lower(), t('pale').lower(), t('cyanosis').lower()]:
-                                        abnormal_count += 1
-                                    total_count += 1
-                        
-                        percentage = (abnormal_count / total_count * 100) if total_count > 0 else 0
-                        percentages.append(percentage)
-                    else:
-                        percentages.append(0)
-                
-                # Plot line
-                line_style = '-' if group != comparison_group else '--'
-                line_width = 2 if group != comparison_group else 3
-                marker = 'o' if group != comparison_group else 's'
-                
-                ax.plot(times, percentages, 
-                       label=group.split('_')[-1],
-                       color=colors[group_idx],
-                       linestyle=line_style,
-                       linewidth=line_width,
-                       marker=marker,
-                       markersize=6,
-                       alpha=0.8)
+        # Colors for different groups
+        colors = plt.cm.tab10(np.linspace(0, 1, len(selected_groups)))
         
-        # Formatting
-        ax.set_title(t_obs(obs), fontsize=12, fontweight='bold')
-        ax.set_xlabel(f"{t('time')} (min)", fontsize=10)
-        ax.set_ylabel(f"{t('percentage_abnormal')} (%)", fontsize=10)
-        ax.set_ylim(-5, 105)
-        ax.grid(True, alpha=0.3)
-        
-        # Add legend only to first subplot
-        if obs_idx == 0:
-            ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8)
+        lines = []
+        for obs_idx, obs in enumerate(observations):
+            ax = axes[obs_idx]
+            lines.append([ax.plot([], [], color=colors[group_idx], markersize=6, alpha=0.8)[0]
+                          for group_idx in range(len(selected_groups))])
+            
+            # Formatting
+            ax.set_title(t_obs(obs), fontsize=12, fontweight='bold')
+            ax.set_xlabel(f"{t('time')} (min)", fontsize=10)
+            ax.set_ylabel(f"{t('percentage_abnormal')} (%)", fontsize=10)
+            ax.set_ylim(-5, 105)
+            ax.grid(True, alpha=0.3)
+        
+        # Hide unused subplots
+        for idx in range(n_obs, len(axes)):
+            axes[idx].set_visible(False)
+        
+        # Overall title
+        mode_title = mode_eng.replace("and Sensorimotor Functions", "")
+        fig.suptitle(f"{mode_title} - {t('comparative_viz')} ({t('all_time_points')})", fontsize=16, fontweight='bold')
+        return {'figure': fig, 'axes': axes, 'lines': lines}
+    
+    template, is_new = get_figure_template((mode_eng, len(selected_groups), n_obs), build)
+    fig, axes = template['figure'], template['axes']
+    
+    for obs_idx in range(n_obs):
+        for group_idx, group in enumerate(selected_groups):
+            line = template['lines'][obs_idx][group_idx]
+            has_rows = ~np.isnan(tensor[group_idx, obs_idx]) if present[group_idx] else np.zeros(len(times), dtype=bool)
+            line.set_data(times[has_rows], tensor[group_idx, obs_idx, has_rows])
+            
+            # Plot line
+            line_style, line_width, marker = group_line_style(group, comparison_group)
+            line.set_linestyle(line_style)
+            line.set_linewidth(line_width)
+            line.set_marker(marker)
+            line.set_label(group.split('_')[-1])
+        axes[obs_idx].relim()
+        axes[obs_idx].autoscale_view(scaley=False)
+    
+    # Add legend only to first subplot
+    legend_handles = [line for group_idx, line in enumerate(template['lines'][0]) if present[group_idx]]
+    refresh_template_legend(
+        template,
+        tuple((group, group == comparison_group, bool(present[idx])) for idx, group in enumerate(selected_groups)),
+        lambda: axes[0].legend(handles=legend_handles, bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=8))
+    if is_new:
+        fig.tight_layout()
+    return fig
+
+# Plotly renderers: interactive versions of the comparison plots drawn from the same plot data
+PLOTLY_WEBGL_MIN_POINTS = 1000  # series with more points use WebGL traces
+
+# Helper function to pick a Plotly scatter trace type for a series
+def plotly_scatter_trace(n_points):
+    """Return go.Scattergl for dense series and go.Scatter otherwise"""
+    return go.Scattergl if n_points >= PLOTLY_WEBGL_MIN_POINTS else go.Scatter
+
+# Helper function to get matching group colors for Plotly
+def plotly_group_colors(n_groups):
+    """Return the tab10 colors used by the matplotlib line plots as hex strings"""
+    return [mpl.colors.to_hex(color) for color in plt.cm.tab10(np.linspace(0, 1, n_groups))]
+
+# Helper function to get the Plotly line style of a group
+def plotly_group_line_style(group, comparison_group):
+    """Return (dash, width, marker symbol); the comparison group is dashed with square markers"""
+    if group == comparison_group:
+        return 'dash', 3, 'square'
+    return 'solid', 2, 'circle'
+
+def create_general_behavior_plotly(valid_groups, selected_time, mode_eng, animal_type, num_animals, comparison_group):
+    """Create interactive plot for General Behavior mode"""
+    data = compute_general_behavior_plot_data(valid_groups, selected_time, mode_eng, animal_type, num_animals)
+    if data is None:
+        st.warning("No valid data for the selected time point")
+        return None
     
-    # Hide unused subplots
-    for idx in range(n_obs, len(axes)):
-        axes[idx].set_visible(False)
+    # Color bars based on status
+    colors = ['#28a745' if group == comparison_group else '#ff6b6b' if mean < 2 or mean > 6 else '#4cc9f0'
+              for mean, group in zip(data['means'], data['groups'])]
+    fig = go.Figure(go.Bar(
+        x=[g.split('_')[-1] for g in data['groups']],
+        y=data['means'],
+        error_y=dict(type='data', array=data['stds']),
+        marker_color=colors,
+        opacity=0.8,
+        text=[f"{mean:.2f}" for mean in data['means']],
+        textposition='outside',
+        showlegend=False
+    ))
     
-    # Overall title
-    mode_title = mode_eng.replace("and Sensorimotor Functions", "")
-    fig.suptitle(f"{mode_title} - {t('comparative_viz')} ({t('all_time_points')})", fontsize=16, fontweight='bold')
+    # Add threshold lines
+    for threshold in (2, 6):
+        fig.add_hline(y=threshold, line_dash='dash', line_color='gray', opacity=0.7)
+    
+    fig.update_layout(
+        title=f"{t('general_behavior')} - {t('comparative_viz')} ({selected_time} min)",
+        xaxis_title=t('group'),
+        yaxis_title=f"{t('mean_score')} (0-10)",
+        yaxis_range=[0, 10],
+        height=600
+    )
+    return fig
+
+def create_body_weight_comparison_plotly(valid_groups, mode_eng, animal_type, num_animals, comparison_group):
+    """Create interactive comparison plot for Body Weight mode"""
+    data = compute_body_weight_plot_data(valid_groups, mode_eng, animal_type, num_animals)
+    if data is None:
+        st.warning("No valid weight data found")
+        return None
+    
+    names = [group.split('_')[-1] for group in data['groups']]
+    is_comparison = [group == comparison_group for group in data['groups']]
+    fig = go.Figure([
+        go.Bar(name=t('before_experiment'), x=names, y=data['before_means'],
+               error_y=dict(type='data', array=data['before_stds']),
+               marker_color=['#28a745' if c else '#3498db' for c in is_comparison], opacity=0.8,
+               text=[f"{mean:.1f}" for mean in data['before_means']], textposition='outside'),
+        go.Bar(name=t('after_experiment'), x=names, y=data['after_means'],
+               error_y=dict(type='data', array=data['after_stds']),
+               marker_color=['#1e7e34' if c else '#e74c3c' for c in is_comparison], opacity=0.8,
+               text=[f"{mean:.1f}" for mean in data['after_means']], textposition='outside')
+    ])
+    
+    # Percentage change label above each group
+    for name, change, before, before_std, after, after_std in zip(
+            names, data['percent_changes'], data['before_means'], data['before_stds'],
+            data['after_means'], data['after_stds']):
+        change_color = 'red' if change < 0 else 'green'
+        fig.add_annotation(x=name, y=max(before + before_std, after + after_std), yshift=30,
+                           text=f"<b>{change:+.1f}%</b>", showarrow=False, font=dict(color=change_color),
+                           bgcolor='white', bordercolor=change_color)
+    
+    fig.update_layout(
+        barmode='group',
+        title=f"{t('body_weight')} - {t('before_experiment')} vs {t('after_experiment')} {t('comparative_viz')}",
+        xaxis_title=t('group'),
+        yaxis_title=t('weight_g'),
+        height=600
+    )
+    if min(data['before_means'] + data['after_means']) >= 0:
+        fig.update_yaxes(rangemode='tozero')
+    return fig
+
+def create_body_temperature_line_plotly(selected_groups, mode_eng, animal_type, num_animals, comparison_group):
+    """Create interactive line plot for Body Temperature mode"""
+    data = compute_body_temperature_plot_data(selected_groups, mode_eng, animal_type, num_animals)
+    colors = plotly_group_colors(len(selected_groups))
+    
+    fig = go.Figure()
+    for idx, group in enumerate(selected_groups):
+        if group not in data:
+            continue
+        times, mean_temps, std_temps = data[group]
+        dash, width, symbol = plotly_group_line_style(group, comparison_group)
+        trace = plotly_scatter_trace(len(times))
+        fig.add_trace(trace(
+            x=times, y=mean_temps, error_y=dict(type='data', array=std_temps),
+            name=group.split('_')[-1], mode='lines+markers', opacity=0.8,
+            line=dict(color=colors[idx], dash=dash, width=width),
+            marker=dict(symbol=symbol, size=8)
+        ))
+    
+    # Add normal range
+    fig.add_hrect(y0=36, y1=38, fillcolor='green', opacity=0.2, line_width=0,
+                  annotation_text='Normal range (36-38°C)', annotation_position='top left')
+    
+    fig.update_layout(
+        title=f"{t('body_temperature')} - {t('comparative_viz')} ({t('all_time_points')})",
+        xaxis_title=f"{t('time')} (min)",
+        yaxis_title="Temperature (°C)",
+        yaxis_range=[34, 40],
+        height=600
+    )
+    return fig
+
+def create_binary_score_line_plotly(selected_groups, mode_eng, animal_type, num_animals, comparison_group):
+    """Create interactive line plots for binary (Normal/Abnormal) scoring modes"""
+    if mode_eng == "Autonomic and Sensorimotor Functions":
+        observations = AUTONOMIC_OBSERVATIONS
+    elif mode_eng == "Reflex Capabilities":
+        observations = REFLEX_OBSERVATIONS
+    else:  # Convulsive Behaviors
+        observations = CONVULSIVE_OBSERVATIONS
     
-    plt.tight_layout()
+    tensor, times, present = compute_binary_abnormality_tensor(selected_groups, mode_eng, animal_type, num_animals)
+    colors = plotly_group_colors(len(selected_groups))
+    
+    # One subplot per observation; groups share a legend entry across subplots
+    n_cols = 3
+    n_rows = (len(observations) + n_cols - 1) // n_cols
+    fig = make_subplots(rows=n_rows, cols=n_cols, subplot_titles=[t_obs(obs) for obs in observations])
+    trace = plotly_scatter_trace(tensor.shape[0] * tensor.shape[1] * tensor.shape[2])
+    for obs_idx in range(len(observations)):
+        row, col = obs_idx // n_cols + 1, obs_idx % n_cols + 1
+        for group_idx, group in enumerate(selected_groups):
+            if not present[group_idx]:
+                continue
+            has_rows = ~np.isnan(tensor[group_idx, obs_idx])
+            dash, width, symbol = plotly_group_line_style(group, comparison_group)
+            fig.add_trace(trace(
+                x=times[has_rows], y=tensor[group_idx, obs_idx, has_rows],
+                name=group.split('_')[-1], legendgroup=group, showlegend=obs_idx == 0,
+                mode='lines+markers', opacity=0.8,
+                line=dict(color=colors[group_idx], dash=dash, width=width),
+                marker=dict(symbol=symbol, size=6)
+            ), row=row, col=col)
+    
+    fig.update_xaxes(title_text=f"{t('time')} (min)")
+    fig.update_yaxes(title_text=f"{t('percentage_abnormal')} (%)", range=[-5, 105])
+    mode_title = mode_eng.replace("and Sensorimotor Functions", "")
+    fig.update_layout(
+        title=f"{mode_title} - {t('comparative_viz')} ({t('all_time_points')})",
+        height=350 * n_rows
+    )
     return fig
 
 # AI Features (appear when activated from sidebar)
@@ -4132,7 +7241,8 @@ if st.session_state.ai_tutor_active:
             
             st.session_state.tutor_chat_history.append({"role": "user", "content": "How do I create a new project?"})
             with st.spinner("AI Tutor is thinking..."):
-                ai_response = generate_tutor_response("How do I create a new project?", st.session_state.language)
+                ai_response = generate_tutor_response("How do I create a new project?", st.session_state.language,
+                                                      history=st.session_state.tutor_chat_history[:-1])
                 st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
             st.rerun()
     
@@ -4148,7 +7258,8 @@ if st.session_state.ai_tutor_active:
             
             st.session_state.tutor_chat_history.append({"role": "user", "content": "What are the different analysis modes and how do I use them?"})
             with st.spinner("AI Tutor is thinking..."):
-                ai_response = generate_tutor_response("What are the different analysis modes and how do I use them?", st.session_state.language)
+                ai_response = generate_tutor_response("What are the different analysis modes and how do I use them?", st.session_state.language,
+                                                      history=st.session_state.tutor_chat_history[:-1])
                 st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
             st.rerun()
     
@@ -4164,7 +7275,8 @@ if st.session_state.ai_tutor_active:
             
             st.session_state.tutor_chat_history.append({"role": "user", "content": "How do I enter data for my animals?"})
             with st.spinner("AI Tutor is thinking..."):
-                ai_response = generate_tutor_response("How do I enter data for my animals?", st.session_state.language)
+                ai_response = generate_tutor_response("How do I enter data for my animals?", st.session_state.language,
+                                                      history=st.session_state.tutor_chat_history[:-1])
                 st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
             st.rerun()
     
@@ -4182,7 +7294,8 @@ if st.session_state.ai_tutor_active:
             
             st.session_state.tutor_chat_history.append({"role": "user", "content": "How do I generate reports and export data?"})
             with st.spinner("AI Tutor is thinking..."):
-                ai_response = generate_tutor_response("How do I generate reports and export data?", st.session_state.language)
+                ai_response = generate_tutor_response("How do I generate reports and export data?", st.session_state.language,
+                                                      history=st.session_state.tutor_chat_history[:-1])
                 st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
             st.rerun()
     
@@ -4198,7 +7311,8 @@ if st.session_state.ai_tutor_active:
             
             st.session_state.tutor_chat_history.append({"role": "user", "content": "How do I manage multiple groups and set comparison groups?"})
             with st.spinner("AI Tutor is thinking..."):
-                ai_response = generate_tutor_response("How do I manage multiple groups and set comparison groups?", st.session_state.language)
+                ai_response = generate_tutor_response("How do I manage multiple groups and set comparison groups?", st.session_state.language,
+                                                      history=st.session_state.tutor_chat_history[:-1])
                 st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
             st.rerun()
     
@@ -4214,7 +7328,8 @@ if st.session_state.ai_tutor_active:
             
             st.session_state.tutor_chat_history.append({"role": "user", "content": "How do I create and download charts?"})
             with st.spinner("AI Tutor is thinking..."):
-                ai_response = generate_tutor_response("How do I create and download charts?", st.session_state.language)
+                ai_response = generate_tutor_response("How do I create and download charts?", st.session_state.language,
+                                                      history=st.session_state.tutor_chat_history[:-1])
                 st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
             st.rerun()
     
@@ -4230,20 +7345,20 @@ if st.session_state.ai_tutor_active:
     with col_send:
         if st.button("Send Question", use_container_width=True, type="primary"):
             if user_message.strip():
-                # Clear previous chat history and add new conversation
-                st.session_state.tutor_chat_history = []
-                # Add welcome message
-                tutor_welcome_msg = "Hello! I'm your FOB Test Analysis Dashboard tutor. I can help you learn how to use this tool effectively. Ask me anything about the dashboard features, analysis modes, or how to perform specific tasks!"
-                if st.session_state.language == 'zh':
-                    tutor_welcome_msg = "你好！我是你的FOB测试分析仪表板导师。我可以帮助你学习如何有效使用这个工具。询问我关于仪表板功能、分析模式或如何执行特定任务的问题！"
-                st.session_state.tutor_chat_history.append({"role": "assistant", "content": tutor_welcome_msg})
+                # Typed questions continue the conversation, so follow-ups keep their context
+                if not st.session_state.tutor_chat_history:
+                    tutor_welcome_msg = "Hello! I'm your FOB Test Analysis Dashboard tutor. I can help you learn how to use this tool effectively. Ask me anything about the dashboard features, analysis modes, or how to perform specific tasks!"
+                    if st.session_state.language == 'zh':
+                        tutor_welcome_msg = "你好！我是你的FOB测试分析仪表板导师。我可以帮助你学习如何有效使用这个工具。询问我关于仪表板功能、分析模式或如何执行特定任务的问题！"
+                    st.session_state.tutor_chat_history.append({"role": "assistant", "content": tutor_welcome_msg})
                 
                 # Add user message to chat history
                 st.session_state.tutor_chat_history.append({"role": "user", "content": user_message})
                 
                 # Generate AI response
                 with st.spinner("AI Tutor is thinking..."):
-                    ai_response = generate_tutor_response(user_message, st.session_state.language)
+                    ai_response = generate_tutor_response(user_message, st.session_state.language,
+                                                          history=st.session_state.tutor_chat_history[:-1])
                     st.session_state.tutor_chat_history.append({"role": "assistant", "content": ai_response})
                 
                 # Clear input and rerun
@@ -4271,38 +7386,53 @@ elif st.session_state.ai_chatbot_active:
     if uploaded_files:
         st.success(f"Uploaded {len(uploaded_files)} file(s)")
         
-        # Process each file and generate summaries
+        # Summarize each file once; later reruns reuse the stored summary
         for uploaded_file in uploaded_files:
-            st.markdown(f"**📄 Processing: {uploaded_file.name}**")
+            digest = hashlib.sha1(uploaded_file.getvalue()).hexdigest()
+            summary_entry = next((s for s in st.session_state.file_summaries if s.get("digest") == digest), None)
             
-            # Process uploaded file
-            file_content = process_uploaded_file(uploaded_file)
+            # Index each upload once; a file evicted from the index is indexed again when it is uploaded again
+            needs_index = (digest not in get_file_index()['files']
+                           and uploaded_file.file_id not in st.session_state.indexed_uploads)
+            if summary_entry is None or needs_index:
+                if summary_entry is None:
+                    st.markdown(f"**📄 Processing: {uploaded_file.name}**")
+                
+                # Split the file into chunks for the session's file index
+                chunks, message = read_uploaded_file_chunks(uploaded_file)
+                if not chunks:
+                    st.error(f"Error processing {uploaded_file.name}: {message}")
+                    continue
+                st.session_state.indexed_uploads.add(uploaded_file.file_id)
+                evicted = index_file_chunks(uploaded_file.name, digest, chunks)
+                if evicted:
+                    st.warning(f"Removed from the chat's file index to make room: {', '.join(evicted)}")
             
-            if file_content and not file_content.startswith("Error"):
-                # Generate file summary
+            if summary_entry is None:
+                # Generate file summary from the start of the file
                 with st.spinner(f"Generating summary for {uploaded_file.name}..."):
-                    file_summary = generate_file_summary(file_content, uploaded_file.name, st.session_state.language)
-                    
-                    # Store summary
-                    summary_entry = {
-                        "filename": uploaded_file.name,
-                        "content": file_content,
-                        "summary": file_summary
-                    }
-                    
-                    # Add to session state if not already present
-                    if not any(s["filename"] == uploaded_file.name for s in st.session_state.file_summaries):
-                        st.session_state.file_summaries.append(summary_entry)
+                    file_summary = generate_file_summary(truncate_to_tokens("\n\n".join(chunks), FILE_SUMMARY_TOKENS),
+                                                         uploaded_file.name, st.session_state.language)
+                if file_summary.startswith("Error"):
+                    st.error(f"{uploaded_file.name}: {file_summary}")
+                    continue
                 
-                # Display summary
-                with st.expander(f"📋 Summary: {uploaded_file.name}"):
-                    st.markdown(file_summary)
-                    
-                    # Show file preview
-                    st.markdown("**File Preview:**")
-                    st.text(file_content[:300] + "..." if len(file_content) > 300 else file_content)
-            else:
-                st.error(f"Error processing {uploaded_file.name}: {file_content}")
+                # Store summary
+                summary_entry = {
+                    "filename": uploaded_file.name,
+                    "digest": digest,
+                    "summary": file_summary,
+                    "preview": chunks[0][:300] + "..." if len(chunks[0]) > 300 else chunks[0]
+                }
+                st.session_state.file_summaries.append(summary_entry)
+            
+            # Display summary
+            with st.expander(f"📋 Summary: {summary_entry['filename']}"):
+                st.markdown(summary_entry['summary'])
+                
+                # Show file preview
+                st.markdown("**File Preview:**")
+                st.text(summary_entry['preview'])
     
     # Display all file summaries
     if st.session_state.file_summaries:
@@ -4316,6 +7446,8 @@ elif st.session_state.ai_chatbot_active:
         # Clear summaries button
         if st.button("🗑️ Clear All Summaries", use_container_width=True):
             st.session_state.file_summaries = []
+            st.session_state.pop('file_index', None)
+            st.session_state.indexed_uploads = set()
             st.rerun()
     
     # Floating Chat Box Interface with Streaming Responses
@@ -4393,7 +7525,7 @@ elif st.session_state.ai_chatbot_active:
     
     # Handle streaming responses
     if st.session_state.is_streaming:
-        # Simulate streaming response (you can replace this with actual streaming API)
+        # Stream the response to the last user message
         if not st.session_state.current_streaming_response:
             # Get the last user message
             last_user_msg = None
@@ -4403,15 +7535,11 @@ elif st.session_state.ai_chatbot_active:
                     break
             
             if last_user_msg:
-                # Generate AI response
-                ai_response = generate_chatbot_response(last_user_msg, st.session_state.language)
-                
-                # Simulate streaming by adding characters gradually
-                import time
-                for i in range(len(ai_response)):
-                    st.session_state.current_streaming_response = ai_response[:i+1]
-                    time.sleep(0.05)  # Small delay for streaming effect
-                    st.rerun()
+                # Show the reply as the LLM backend streams it
+                with st.chat_message("assistant"):
+                    ai_response = st.write_stream(generate_chatbot_response(
+                        last_user_msg, st.session_state.language, stream=True,
+                        history=st.session_state.chat_messages[:-1]))
                 
                 # Add complete response to chat history
                 st.session_state.chat_messages.append({
@@ -4432,7 +7560,7 @@ elif st.session_state.ai_report_active:
     # Show file summaries from chatbot if available
     if st.session_state.file_summaries:
         st.subheader("📁 File Summaries (from AI Chatbot)")
-        st.info("The following file summaries will be included in your AI report:")
+        st.info("Excerpts of these files that concern the report's mode, project and groups will be included in your AI report:")
         
         for summary in st.session_state.file_summaries:
             with st.expander(f"📄 {summary['filename']}"):
@@ -4450,28 +7578,15 @@ elif st.session_state.ai_report_active:
                 # Get current mode
                 mode_eng = st.session_state.mode
                 
-                # Prepare data for AI analysis
-                uploaded_file_content = st.session_state.get('uploaded_file_content', None)
+                # Report on the mode's project statistics
+                sample_data = (describe_mode_statistics(st.session_state.active_project, project, mode_eng)
+                               or f"Project: {project['name']}, Mode: {mode_eng}, Animals: {project['num_animals']} (no data recorded)")
                 
-                # Include file summaries in the analysis
-                file_summaries_text = ""
-                if st.session_state.file_summaries:
-                    file_summaries_text = "\n\n**Additional File Analysis:**\n"
-                    for summary in st.session_state.file_summaries:
-                        file_summaries_text += f"\n**File: {summary['filename']}**\n{summary['summary']}\n"
-                
-                # Create sample data for demonstration (in real use, this would be actual project data)
-                sample_data = f"Project: {project['name']}, Mode: {mode_eng}, Animals: {project['num_animals']}"
-                
-                # Combine uploaded file content with file summaries
-                combined_file_content = ""
-                if uploaded_file_content:
-                    combined_file_content += uploaded_file_content
-                if file_summaries_text:
-                    combined_file_content += file_summaries_text
+                # Only the uploaded file chunks relevant to this report
+                file_excerpts = report_file_context(st.session_state.active_project, project, mode_eng)
                 
                 # Generate AI report
-                ai_report = generate_ai_report(project, sample_data, mode_eng, st.session_state.language, combined_file_content)
+                ai_report = generate_ai_report(project, sample_data, mode_eng, st.session_state.language, file_excerpts)
                 
                 # Display AI report
                 st.markdown("### 📋 AI Analysis Report")
@@ -4541,17 +7656,17 @@ elif st.session_state.ai_powerpoint_active:
             st.markdown(f"**📄 Processing: {uploaded_file.name}**")
             
             # Process uploaded file
-            file_content = process_uploaded_file(uploaded_file)
+            chunks, message = read_uploaded_file_chunks(uploaded_file)
             
-            if file_content and not file_content.startswith("Error"):
-                # Generate file summary
+            if chunks:
+                # Generate file summary from the start of the file
                 with st.spinner(f"Generating summary for {uploaded_file.name}..."):
-                    file_summary = generate_file_summary(file_content, uploaded_file.name, st.session_state.language)
+                    file_summary = generate_file_summary(truncate_to_tokens("\n\n".join(chunks), FILE_SUMMARY_TOKENS),
+                                                         uploaded_file.name, st.session_state.language)
                     
                     # Store summary
                     summary_entry = {
                         "filename": uploaded_file.name,
-                        "content": file_content,
                         "summary": file_summary
                     }
                     file_summaries.append(summary_entry)
@@ -4559,6 +7674,8 @@ elif st.session_state.ai_powerpoint_active:
                 # Display summary
                 with st.expander(f"📋 Summary: {uploaded_file.name}"):
                     st.markdown(file_summary)
+            else:
+                st.error(f"Error processing {uploaded_file.name}: {message}")
     
     # PowerPoint Generation
     st.subheader("🤖 Generate PowerPoint Presentation")
@@ -4579,177 +7696,18 @@ elif st.session_state.ai_powerpoint_active:
             st.success("Charts cleared!")
             st.rerun()
     
-    # Generate charts for all 6 FOB test modes
-    charts_data = []
+    # Deck charts for all 6 FOB test modes are built from the shared project statistics
     if st.session_state.active_project is not None:
         project = st.session_state.projects[st.session_state.active_project]
-        
-        # Define all 6 FOB test modes
-        all_modes = [
-            "General Behavior",
-            "Autonomic and Sensorimotor Functions", 
-            "Reflex Capabilities",
-            "Body Temperature",
-            "Body Weight",
-            "Convulsive Behaviors and Excitability"
-        ]
-        
-        st.info("📊 Generating comprehensive charts for all 6 FOB test modes...")
-        
-        # Create sample data for charts
-        
-        for mode in all_modes:
-            mode_charts = []
-            
-            # Chart 1: Group comparison for each mode
-            fig1, ax1 = plt.subplots(figsize=(10, 6))
-            groups = ['Group 1', 'Group 2', 'Group 3', 'Control']
-            
-            # Mode-specific data ranges
-            if mode == "Body Temperature":
-                values = [37.2, 37.8, 36.9, 37.5]  # Temperature range
-                ylabel = 'Temperature (°C)'
-            elif mode == "Body Weight":
-                values = [25.5, 26.2, 24.8, 26.8]  # Weight range
-                ylabel = 'Weight (g)'
-            elif mode in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-                values = [15, 22, 8, 28]  # Percentage abnormal
-                ylabel = 'Abnormal (%)'
-            else:  # General Behavior
-                values = [75, 82, 68, 90]  # Score range
-                ylabel = 'Score'
-            
-            colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4']
-            bars = ax1.bar(groups, values, color=colors)
-            ax1.set_title(f'{mode} - Group Comparison', fontsize=16, fontweight='bold')
-            ax1.set_ylabel(ylabel, fontsize=12)
-            ax1.set_xlabel('Groups', fontsize=12)
-            
-            # Add value labels on bars
-            for bar, value in zip(bars, values):
-                height = bar.get_height()
-                ax1.text(bar.get_x() + bar.get_width()/2., height + 0.5,
-                        f'{value}', ha='center', va='bottom', fontweight='bold')
-            
-            plt.tight_layout()
-            
-            # Save chart to bytes
-            chart1_buffer = BytesIO()
-            fig1.savefig(chart1_buffer, format='png', dpi=300, bbox_inches='tight')
-            chart1_buffer.seek(0)
-            mode_charts.append({
-                'title': f'{mode} - Group Comparison',
-                'data': chart1_buffer.getvalue(),
-                'description': f'Bar chart showing {mode} scores across different experimental groups',
-                'mode': mode
-            })
-            plt.close(fig1)
-            
-            # Chart 2: Time series for each mode
-            fig2, ax2 = plt.subplots(figsize=(10, 6))
-            time_points = [0, 15, 30, 60, 120]
-            
-            # Mode-specific time series data
-            if mode == "Body Temperature":
-                group1_data = [37.0, 37.2, 37.5, 37.3, 37.4]
-                group2_data = [36.8, 37.0, 37.3, 37.1, 37.2]
-                control_data = [37.2, 37.4, 37.6, 37.5, 37.6]
-                ylabel = 'Temperature (°C)'
-            elif mode == "Body Weight":
-                group1_data = [25.0, 25.2, 25.5, 25.3, 25.4]
-                group2_data = [24.8, 25.0, 25.3, 25.1, 25.2]
-                control_data = [26.0, 26.2, 26.5, 26.3, 26.4]
-                ylabel = 'Weight (g)'
-            elif mode in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-                group1_data = [10, 15, 20, 18, 22]
-                group2_data = [8, 12, 18, 15, 19]
-                control_data = [5, 8, 12, 10, 15]
-                ylabel = 'Abnormal (%)'
-            else:  # General Behavior
-                group1_data = [70, 75, 80, 78, 82]
-                group2_data = [65, 70, 75, 72, 76]
-                control_data = [85, 88, 90, 87, 89]
-                ylabel = 'Score'
-            
-            ax2.plot(time_points, group1_data, 'o-', label='Group 1', linewidth=2, markersize=8)
-            ax2.plot(time_points, group2_data, 's-', label='Group 2', linewidth=2, markersize=8)
-            ax2.plot(time_points, control_data, '^-', label='Control', linewidth=2, markersize=8)
-            
-            ax2.set_title(f'{mode} - Time Series Analysis', fontsize=16, fontweight='bold')
-            ax2.set_xlabel('Time (minutes)', fontsize=12)
-            ax2.set_ylabel(ylabel, fontsize=12)
-            ax2.legend(fontsize=10)
-            ax2.grid(True, alpha=0.3)
-            
-            plt.tight_layout()
-            
-            # Save chart to bytes
-            chart2_buffer = BytesIO()
-            fig2.savefig(chart2_buffer, format='png', dpi=300, bbox_inches='tight')
-            chart2_buffer.seek(0)
-            mode_charts.append({
-                'title': f'{mode} - Time Series',
-                'data': chart2_buffer.getvalue(),
-                'description': f'Time series analysis showing {mode} trends over experimental timepoints',
-                'mode': mode
-            })
-            plt.close(fig2)
-            
-            # Chart 3: Statistical summary for each mode
-            fig3, ax3 = plt.subplots(figsize=(10, 6))
-            categories = ['Mean', 'Std Dev', 'Min', 'Max', 'Median']
-            
-            # Mode-specific statistical data
-            if mode == "Body Temperature":
-                group1_stats = [37.3, 0.3, 36.8, 37.8, 37.3]
-                group2_stats = [37.0, 0.4, 36.5, 37.5, 37.0]
-                control_stats = [37.5, 0.2, 37.2, 37.8, 37.5]
-            elif mode == "Body Weight":
-                group1_stats = [25.3, 0.4, 24.8, 25.8, 25.3]
-                group2_stats = [25.0, 0.5, 24.5, 25.5, 25.0]
-                control_stats = [26.3, 0.3, 26.0, 26.8, 26.3]
-            elif mode in ["Autonomic and Sensorimotor Functions", "Reflex Capabilities", "Convulsive Behaviors and Excitability"]:
-                group1_stats = [17.0, 4.2, 10, 25, 18]
-                group2_stats = [14.4, 4.0, 8, 22, 15]
-                control_stats = [10.0, 3.5, 5, 18, 10]
-            else:  # General Behavior
-                group1_stats = [77.0, 4.2, 70, 85, 78]
-                group2_stats = [71.6, 4.0, 65, 80, 72]
-                control_stats = [87.8, 1.8, 85, 92, 88]
-            
-            x = np.arange(len(categories))
-            width = 0.25
-            
-            ax3.bar(x - width, group1_stats, width, label='Group 1', color='#FF6B6B')
-            ax3.bar(x, group2_stats, width, label='Group 2', color='#4ECDC4')
-            ax3.bar(x + width, control_stats, width, label='Control', color='#96CEB4')
-            
-            ax3.set_title(f'{mode} - Statistical Summary', fontsize=16, fontweight='bold')
-            ax3.set_xlabel('Statistical Measures', fontsize=12)
-            ax3.set_ylabel('Value', fontsize=12)
-            ax3.set_xticks(x)
-            ax3.set_xticklabels(categories)
-            ax3.legend(fontsize=10)
-            ax3.grid(True, alpha=0.3)
-            
-            plt.tight_layout()
-            
-            # Save chart to bytes
-            chart3_buffer = BytesIO()
-            fig3.savefig(chart3_buffer, format='png', dpi=300, bbox_inches='tight')
-            chart3_buffer.seek(0)
-            mode_charts.append({
-                'title': f'{mode} - Statistical Summary',
-                'data': chart3_buffer.getvalue(),
-                'description': f'Statistical summary showing key metrics for {mode} analysis',
-                'mode': mode
-            })
-            plt.close(fig3)
-            
-            # Add all charts for this mode to the main charts_data
-            charts_data.extend(mode_charts)
-        
-        st.success(f"Generated {len(charts_data)} charts for all 6 FOB test modes!")
+        project_statistics = compute_project_statistics(st.session_state.active_project, project)
+        st.info(f"📊 Time series and statistical summary charts will use data from "
+                f"{project_statistics['mode'].nunique()} of 6 FOB test modes")
+    
+    native_charts = st.checkbox(
+        "Editable native charts (smaller, faster decks)",
+        value=True,
+        help="Insert charts as PowerPoint chart objects built from the group data instead of images"
+    )
     
     if st.button("Generate PowerPoint Presentation", use_container_width=True, type="primary"):
         if st.session_state.active_project is not None:
@@ -4775,28 +7733,16 @@ elif st.session_state.ai_powerpoint_active:
                     "Convulsive Behaviors and Excitability"
                 ]
                 
-                # Generate and capture plots for each mode
+                # Build each mode's section; modes whose data is unchanged reuse their cached charts and text
+                sections = {}
                 for mode_eng in all_modes:
                     if project_groups:
-                        # Create plot for this mode
-                        fig = create_comparative_plot(project_groups, mode_eng, project, None)
-                        
-                        if fig is not None:
-                            # Capture chart for PowerPoint inclusion
-                            chart_title = f"{mode_eng} - Group Comparison"
-                            chart_info = capture_chart_for_powerpoint(
-                                fig, 
-                                chart_title, 
-                                mode_eng, 
-                                "Group Comparison Plot",
-                                f"Comparative analysis showing {mode_eng} results across selected groups",
-                                add_to_session=False
-                            )
-                            if chart_info:
-                                all_charts.append(chart_info)
-                            
-                            # Close the figure to free memory
-                            plt.close(fig)
+                        sections[mode_eng] = get_deck_section(st.session_state.active_project, project, mode_eng,
+                                                              st.session_state.language, native_charts)
+                        all_charts.extend(sections[mode_eng]['charts'])
+                
+                # Write the narrative of new or changed sections concurrently
+                fill_deck_narratives(st.session_state.active_project, project, sections, st.session_state.language)
                 
                 # Create PowerPoint presentation with ALL charts
                 pptx_data = create_powerpoint_presentation(
@@ -4804,7 +7750,9 @@ elif st.session_state.ai_powerpoint_active:
                     mode_eng, 
                     st.session_state.language, 
                     file_summaries,
-                    all_charts
+                    all_charts,
+                    native_charts,
+                    sections
                 )
                 
                 if isinstance(pptx_data, bytes):
@@ -4818,6 +7766,9 @@ elif st.session_state.ai_powerpoint_active:
                     )
                     total_charts_included = len(all_charts)
                     st.success(f"PowerPoint presentation generated successfully with {total_charts_included} charts from all 6 FOB test modes!")
+                    reused_sections = sum(1 for section in sections.values() if section['reused'])
+                    if reused_sections:
+                        st.caption(f"Reused {reused_sections} of {len(sections)} mode sections unchanged since the last deck")
                     
                     # Show presentation preview
                     st.markdown("### 📋 Presentation Preview")
@@ -4970,6 +7921,9 @@ if st.session_state.active_project is not None:
             st.success(t('fill_complete'))
             st.rerun()
 
+# Decode the active project's worksheets if they came from an archive and are not loaded yet
+load_project_worksheets(st.session_state.active_project)
+
 # Project Creation Modal (appears when triggered from sidebar)
 if 'show_project_creation' in st.session_state and st.session_state.show_project_creation:
     with st.container():
@@ -5011,8 +7965,7 @@ if 'show_project_creation' in st.session_state and st.session_state.show_project
             # Create groups with simple names
             for i in range(1, num_groups + 1):
                 group_name = f"Group_{i}"
-                st.session_state.experiments[group_name] = True
-                st.session_state.group_projects[group_name] = project_id
+                add_project_group(project_id, group_name)
             
             st.session_state.show_project_creation = False
             st.success(f"{t('create')} '{project_name}' - {num_groups} groups")
@@ -5034,10 +7987,11 @@ if 'show_import_dialog' in st.session_state and st.session_state.show_import_dia
         uploaded_zip = st.file_uploader(
             "Choose a ZIP file",
             type=['zip'],
-            help="Upload a previously exported project ZIP file"
+            accept_multiple_files=True,
+            help="Upload a previously exported project ZIP file, or a full export together with its delta exports"
         )
         
-        if uploaded_zip is not None:
+        if uploaded_zip:
             col_import_confirm, col_import_cancel = st.columns(2)
             
             with col_import_confirm:
@@ -5067,79 +8021,83 @@ if 'show_import_dialog' in st.session_state and st.session_state.show_import_dia
                     st.session_state.show_import_dialog = False
                     st.rerun()
 
+# Bulk Import Dialog Modal (appears when triggered from sidebar)
+if st.session_state.show_bulk_import_dialog and st.session_state.active_project:
+    with st.container():
+        st.subheader(t('bulk_import'))
+        st.info(t('bulk_import_help'))
+        
+        uploaded_workbook = st.file_uploader(
+            "Choose a workbook",
+            type=['xlsx', 'zip'],
+            key="bulk_import_file"
+        )
+        
+        col_bulk_confirm, col_bulk_cancel = st.columns(2)
+        
+        with col_bulk_confirm:
+            if uploaded_workbook is not None and st.button("✅ Import", use_container_width=True, type="primary", key="bulk_import_confirm"):
+                with st.spinner("Importing workbook..."):
+                    success, result = bulk_import_project_data(uploaded_workbook, st.session_state.active_project)
+                
+                if success:
+                    st.session_state.show_bulk_import_dialog = False
+                    st.success(t('bulk_import_success').format(worksheets=result['worksheets']))
+                    st.rerun()
+                else:
+                    message, report = result
+                    st.error(message)
+                    if report is not None:
+                        st.dataframe(report, use_container_width=True, hide_index=True)
+        
+        with col_bulk_cancel:
+            if st.button("❌ Cancel", use_container_width=True, key="bulk_import_cancel"):
+                st.session_state.show_bulk_import_dialog = False
+                st.rerun()
+
+# Workbook Export Panel (appears when triggered from sidebar)
+if st.session_state.show_workbook_export and st.session_state.active_project:
+    with st.container():
+        st.subheader(t('export_workbook'))
+        include_charts = st.checkbox(t('include_charts'), value=False, key="workbook_include_charts")
+        
+        col_workbook_download, col_workbook_close = st.columns(2)
+        
+        with col_workbook_download:
+            with st.spinner("Building workbook..."):
+                workbook_data, message = get_project_workbook(st.session_state.active_project, include_charts)
+            if workbook_data:
+                project_name = st.session_state.projects[st.session_state.active_project]['name'].replace(' ', '_')
+                timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+                st.download_button(
+                    label=f"📥 {t('download_workbook')}",
+                    data=workbook_data,
+                    file_name=f"{project_name}_{timestamp}.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
+            else:
+                st.error(message)
+        
+        with col_workbook_close:
+            if st.button("❌ Cancel", use_container_width=True, key="workbook_export_close"):
+                st.session_state.show_workbook_export = False
+                st.session_state.pop('workbook_export', None)
+                st.rerun()
+
 # Main Content Area
 
 # Show scoring help if requested (works even without a project)
 if st.session_state.show_scoring_help:
     with st.expander("📊 Definition of Scores", expanded=True):
         st.markdown("### How Scoring is Determined for Each Mode:")
-        
-        # General Behavior
-        st.markdown("**🐭 General Behavior (0/4/8 System):**")
-        st.markdown("""
-        - **0**: Normal behavior, no abnormalities
-        - **4**: Mild abnormalities, slight deviations from normal
-        - **8**: Severe abnormalities, significant deviations
-        - **+/-**: Modifiers (e.g., 4+ = mild to moderate, 4- = very mild)
-        - **Normal Range**: 2-6 (scores outside this range indicate abnormalities)
-        - **Default Initialization**: All scores start at 4
-        """)
-        
-        # Autonomic Functions
-        st.markdown("**🫁 Autonomic and Sensorimotor Functions (Binary):**")
-        st.markdown("""
-        - **Normal**: Standard autonomic responses, normal skin color, regular breathing
-        - **Abnormal**: Piloerection, cyanosis, irregular breathing, stertorous breathing
-        - **Scoring**: Each observation is marked as Normal or Abnormal
-        - **Default Initialization**: All scores start as Normal
-        """)
-        
-        # Reflex Capabilities
-        st.markdown("**🦴 Reflex Capabilities (Binary):**")
-        st.markdown("""
-        - **Normal**: Proper reflex responses, normal gait, appropriate pain response
-        - **Abnormal**: Reduced reflexes, abnormal gait, catalepsy, poor pain response
-        - **Scoring**: Each reflex test is marked as Normal or Abnormal
-        - **Default Initialization**: All scores start as Normal
-        """)
-        
-        # Body Temperature
-        st.markdown("**🌡️ Body Temperature (Continuous):**")
-        st.markdown("""
-        - **Normal Range**: 36-38°C (96.8-100.4°F)
-        - **Mice**: Typically 37.0°C ± 0.5°C
-        - **Rats**: Typically 37.5°C ± 0.5°C
-        - **Scoring**: Record actual temperature values in degrees Celsius
-        - **Default Initialization**: Mice start at 37.0°C, Rats at 37.5°C
-        """)
-        
-        # Body Weight
-        st.markdown("**⚖️ Body Weight (Continuous):**")
-        st.markdown("""
-        - **Measurement**: Before and after experiment weights in grams
-        - **Calculation**: Automatic weight change calculation
-        - **Normal**: Slight weight loss due to stress/food restriction
-        - **Scoring**: Record actual weight values, changes calculated automatically
-        - **Default Initialization**: Mice start at 25.0g, Rats at 250.0g
-        """)
-        
-        # Convulsive Behaviors
-        st.markdown("**⚡ Convulsive Behaviors and Excitability (Binary):**")
-        st.markdown("""
-        - **Normal**: No convulsive activity, normal excitability
-        - **Abnormal**: Tremors, convulsions, stereotypy, excessive excitability
-        - **Scoring**: Each behavior is marked as Normal or Abnormal
-        - **Default Initialization**: All scores start as Normal
-        """)
+        for title, body in SCORING_HELP_SECTIONS:
+            st.markdown(f"**{title}:**")
+            st.markdown(body)
         
         st.markdown("---")
         st.markdown("**💡 Tips:**")
-        st.markdown("""
-        - **Consistency**: Use the same scoring criteria across all observations
-        - **Documentation**: Record specific observations that led to each score
-        - **Training**: Ensure all observers are trained on scoring criteria
-        - **Validation**: Cross-check scores between observers for reliability
-        """)
+        st.markdown(SCORING_HELP_TIPS)
 
 if st.session_state.active_project is None:
     st.info(t('start_instruction'))
@@ -5235,88 +8193,24 @@ else:
                                 # Use just the user-provided name as the group name
                                 new_group_name_clean = new_group_name.strip()
                                 
-                                # Check if new name already exists
-                                if new_group_name_clean in st.session_state.experiments and new_group_name_clean != selected_exp:
+                                # Rename within the project index; worksheets keep their keys
+                                if new_group_name_clean in get_project_groups(st.session_state.active_project):
                                     st.error(f"Group name '{new_group_name_clean}' already exists!")
+                                elif rename_project_group(st.session_state.active_project, selected_exp, new_group_name_clean):
+                                    st.success(f"Group renamed from '{selected_exp}' to '{new_group_name_clean}'!")
+                                    st.rerun()
                                 else:
-                                    # Rename the group
-                                    if selected_exp in st.session_state.experiments:
-                                        # Copy experiment data
-                                        experiment_data = st.session_state.experiments[selected_exp]
-                                        st.session_state.experiments[new_group_name_clean] = experiment_data
-                                        
-                                        # Copy worksheet data
-                                        for mode in ALL_MODES:
-                                            old_key = f"worksheet_{selected_exp}_{mode}"
-                                            new_key = f"worksheet_{new_group_name_clean}_{mode}"
-                                            if old_key in st.session_state:
-                                                st.session_state[new_key] = st.session_state[old_key]
-                                            
-                                            # Update worksheet_data
-                                            old_data_key = f"{selected_exp}_{mode}"
-                                            new_data_key = f"{new_group_name_clean}_{mode}"
-                                            if old_data_key in st.session_state.worksheet_data:
-                                                st.session_state.worksheet_data[new_data_key] = st.session_state.worksheet_data[old_data_key]
-                                        
-                                        # Remove old group
-                                        del st.session_state.experiments[selected_exp]
-                                        
-                                        # Clean up old worksheet data
-                                        for mode in ALL_MODES:
-                                            old_key = f"worksheet_{selected_exp}_{mode}"
-                                            if old_key in st.session_state:
-                                                del st.session_state[old_key]
-                                            
-                                            old_data_key = f"{selected_exp}_{mode}"
-                                            if old_data_key in st.session_state.worksheet_data:
-                                                del st.session_state.worksheet_data[old_data_key]
-                                        
-                                        # Update group-project association
-                                        if selected_exp in st.session_state.group_projects:
-                                            st.session_state.group_projects[new_group_name_clean] = st.session_state.group_projects[selected_exp]
-                                            del st.session_state.group_projects[selected_exp]
-                                        
-                                        # Update comparison groups if this group was selected
-                                        if selected_exp in st.session_state.comparison_groups.get(st.session_state.active_project, []):
-                                            comparison_groups = st.session_state.comparison_groups.get(st.session_state.active_project, [])
-                                            comparison_groups.remove(selected_exp)
-                                            comparison_groups.append(new_group_name_clean)
-                                            st.session_state.comparison_groups[st.session_state.active_project] = comparison_groups
-                                        
-                                        st.success(f"Group renamed from '{selected_exp}' to '{new_group_name_clean}'!")
-                                        st.rerun()
-                                    else:
-                                        st.error("Group not found!")
+                                    st.error("Group not found!")
                             else:
                                 st.error("Please enter a different group name!")
                     
                     with col_rename2:
                         if st.button(f"🗑️ {t('delete_group')}", key=f"delete_btn_{selected_exp}", type="secondary"):
-                            if st.session_state.experiments.get(selected_exp):
+                            if selected_exp in get_project_groups(st.session_state.active_project):
                                 # Confirm deletion
                                 if st.checkbox(f"{t('confirm_deletion')} '{selected_exp}'", key=f"confirm_delete_{selected_exp}"):
-                                    # Remove from experiments
-                                    del st.session_state.experiments[selected_exp]
-                                    
-                                    # Remove worksheet data
-                                    for mode in ALL_MODES:
-                                        old_key = f"worksheet_{selected_exp}_{mode}"
-                                        if old_key in st.session_state:
-                                            del st.session_state[old_key]
-                                        
-                                        old_data_key = f"{selected_exp}_{mode}"
-                                        if old_data_key in st.session_state.worksheet_data:
-                                            del st.session_state.worksheet_data[old_data_key]
-                                    
-                                    # Remove from group-project associations
-                                    if selected_exp in st.session_state.group_projects:
-                                        del st.session_state.group_projects[selected_exp]
-                                    
-                                    # Remove from comparison groups if selected
-                                    if selected_exp in st.session_state.comparison_groups.get(st.session_state.active_project, []):
-                                        comparison_groups = st.session_state.comparison_groups.get(st.session_state.active_project, [])
-                                        comparison_groups.remove(selected_exp)
-                                        st.session_state.comparison_groups[st.session_state.active_project] = comparison_groups
+                                    # Remove the group, its worksheets and any comparison selection
+                                    remove_project_group(st.session_state.active_project, selected_exp)
                                     
                                     st.success(f"Group '{selected_exp}' deleted successfully!")
                                     st.rerun()
@@ -5385,43 +8279,26 @@ else:
                     
                     # Analyze each group for weight changes
                     for exp in selected_for_viz:
-                        worksheet_key = f"worksheet_{exp}_{mode_eng}"
+                        worksheet_key = get_worksheet_key(st.session_state.active_project, exp, mode_eng)
                         if worksheet_key in st.session_state:
-                            df = st.session_state[worksheet_key]
-                            
-                            before_df = df[df['time'] == 'before']
-                            after_df = df[df['time'] == 'after']
+                            # Typed weights are floats; animals without both weights are left out
+                            changes = compute_weight_changes(
+                                get_typed_worksheet(worksheet_key, mode_eng, animal_type, num_animals))
+                            changes = changes.dropna(subset=['percent_change'])
                             
-                            if not before_df.empty and not after_df.empty:
-                                total_change = 0
-                                percent_changes = []
+                            if not changes.empty:
+                                mean_change = changes['change'].mean()
+                                mean_percent = changes['percent_change'].mean()
                                 
-                                for i in range(1, num_animals + 1):
-                                    animal_col = f'{animal_type}_{i}'
-                                    if animal_col in before_df.columns:
-                                        try:
-                                            before_weight = float(before_df.iloc[0][animal_col])
-                                            after_weight = float(after_df.iloc[0][animal_col])
-                                            change = after_weight - before_weight
-                                            percent_change = (change / before_weight) * 100
-                                            total_change += change
-                                            percent_changes.append(percent_change)
-                                        except (ValueError, TypeError):
-                                            continue
+                                status = t('weight_loss') if mean_change < 0 else (t('weight_gain') if mean_change > 0 else t('no_change'))
                                 
-                                if percent_changes:
-                                    mean_change = total_change / len(percent_changes)
-                                    mean_percent = np.mean(percent_changes)
-                                    
-                                    status = t('weight_loss') if mean_change < 0 else (t('weight_gain') if mean_change > 0 else t('no_change'))
-                                    
-                                    weight_change_data.append({
-                                        t('group'): exp,
-                                        t('is_comparison'): '✓' if exp == comp_group else '',
-                                        f"{t('mean_weight')} {t('change_g')}": f"{mean_change:.2f}",
-                                        f"{t('mean_weight')} {t('percent_change')}": f"{mean_percent:.2f}%",
-                                        t('status'): status
-                                    })
+                                weight_change_data.append({
+                                    t('group'): exp,
+                                    t('is_comparison'): '✓' if exp == comp_group else '',
+                                    f"{t('mean_weight')} {t('change_g')}": f"{mean_change:.2f}",
+                                    f"{t('mean_weight')} {t('percent_change')}": f"{mean_percent:.2f}%",
+                                    t('status'): status
+                                })
                     
                     # Display weight change summary
                     if weight_change_data:
@@ -5457,12 +8334,11 @@ else:
                     
                     # Analyze each group
                     for exp in selected_for_viz:
-                        worksheet_key = f"worksheet_{exp}_{mode_eng}"
+                        worksheet_key = get_worksheet_key(st.session_state.active_project, exp, mode_eng)
                         if worksheet_key in st.session_state:
-                            df = st.session_state[worksheet_key]
-                            
                             # Get abnormal episodes
-                            episodes_df = process_data_with_episodes(df, mode_eng, animal_type, num_animals)
+                            typed_df = get_typed_worksheet(worksheet_key, mode_eng, animal_type, num_animals)
+                            episodes_df = process_data_with_episodes(typed_df, mode_eng, animal_type, num_animals)
                             if not episodes_df.empty:
                                 all_abnormal_episodes[exp] = episodes_df
                             
@@ -5524,38 +8400,78 @@ else:
                     else:
                         st.success(t('no_episodes'))
                 
+                # Statistics per group and time, shared with the deck and the AI reports
+                mode_stats = get_mode_statistics(st.session_state.active_project, project, mode_eng, selected_for_viz)
+                if not mode_stats.empty:
+                    st.markdown(f"#### {t('statistics_by_time')}")
+                    st.caption(t('statistics_by_time_help'))
+                    st.dataframe(
+                        mode_stats.assign(time=mode_stats['time'].map(statistics_time_label)).rename(columns={
+                            'group': t('group'), 'time': t('time'), 'n': t('stat_n'), 'mean': t('stat_mean'),
+                            'std': t('stat_std'), 'min': t('stat_min'), 'max': t('stat_max'), 'median': t('stat_median')}),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+                
                 # Comparative visualization for ALL modes
                 st.markdown(f"#### {t('comparative_viz')}")
                 
-                # Create plot for the current mode
-                fig = create_comparative_plot(selected_for_viz, mode_eng, project, comp_group)
+                # Interactive charts pan, zoom and toggle groups in the browser;
+                # the matplotlib figure is only built for image export
+                interactive_charts = st.toggle(t('interactive_charts'), value=True, key="interactive_charts",
+                                               help=t('interactive_charts_help'))
+                plot_inputs = select_comparative_plot_inputs(selected_for_viz, mode_eng, project)
                 
-                if fig is not None:
-                    # Capture chart for PowerPoint inclusion
+                if plot_inputs is not None:
                     chart_title = f"{mode_eng} - Group Comparison"
-                    capture_chart_for_powerpoint(
-                        fig, 
-                        chart_title, 
-                        mode_eng, 
-                        "Group Comparison Plot",
-                        f"Comparative analysis showing {mode_eng} results across selected groups"
-                    )
+                    plot_format = st.selectbox(t('image_format'), RENDER_PROFILES['print']['formats'],
+                                               format_func=str.upper, key=f"plot_format_{mode_eng}")
+                    plot_file_name = f"{project['name']}_{mode_eng.replace(' ', '_')}_plot_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{plot_format}"
                     
-                    # Display the plot
-                    st.pyplot(fig)
+                    if interactive_charts:
+                        plotly_fig = render_comparative_plot(plot_inputs, comp_group, renderer='plotly')
+                        if plotly_fig is not None:
+                            st.plotly_chart(plotly_fig, use_container_width=True)
+                        fig = None
+                        has_plot = plotly_fig is not None
+                    else:
+                        fig = render_comparative_plot(plot_inputs, comp_group)
+                        if fig is not None:
+                            # Display the plot
+                            st.image(render_figure(fig, 'preview'), use_container_width=True)
+                        has_plot = fig is not None
                     
-                    # Add download button for the plot
-                    plot_bytes = save_plot_as_bytes(fig)
-                    st.download_button(
-                        label=t('download_plot'),
-                        data=plot_bytes,
-                        file_name=f"{project['name']}_{mode_eng.replace(' ', '_')}_plot_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.png",
-                        mime="image/png",
-                        use_container_width=True
-                    )
+                    # The slide capture and print-resolution image are only rendered on request
+                    export_requested = has_plot and st.button(
+                        t('prepare_plot_export'), key=f"prepare_plot_export_{mode_eng}", use_container_width=True)
+                    if export_requested and fig is None:
+                        fig = render_comparative_plot(plot_inputs, comp_group)
+                    
+                    if export_requested and fig is not None:
+                        # Capture chart for PowerPoint inclusion
+                        capture_chart_for_powerpoint(
+                            fig, 
+                            chart_title, 
+                            mode_eng, 
+                            "Group Comparison Plot",
+                            f"Comparative analysis showing {mode_eng} results across selected groups",
+                            native=build_native_chart_spec(plot_inputs)
+                        )
+                        
+                        # Add download button for the plot
+                        plot_bytes = save_plot_as_bytes(fig, plot_format)
+                        st.download_button(
+                            label=t('download_plot'),
+                            data=plot_bytes,
+                            file_name=plot_file_name,
+                            mime=IMAGE_MIME_TYPES[plot_format],
+                            on_click="ignore",
+                            use_container_width=True
+                        )
                     
-                    # Close the figure to free memory
-                    plt.close(fig)
+                    if fig is not None:
+                        # Close the figure to free memory
+                        plt.close(fig)
                 
                 # AI-Powered Report Section
                 st.markdown(f"#### {t('ai_report')}")
@@ -5563,19 +8479,25 @@ else:
                 if st.button(t('generate_ai_report'), use_container_width=True, type="primary"):
                     with st.spinner("Generating AI report..."):
                         # Prepare data for AI analysis
+                        statistics = describe_mode_statistics(st.session_state.active_project, project, mode_eng,
+                                                              selected_for_viz)
                         if mode_eng == "Body Weight":
                             # Use weight change data for AI analysis
-                            ai_data = weight_change_data if 'weight_change_data' in locals() else []
+                            ai_data = {
+                                'weight_changes': weight_change_data if 'weight_change_data' in locals() else [],
+                                'statistics': statistics
+                            }
                         else:
                             # Use comparison data and episodes for AI analysis
                             ai_data = {
                                 'comparison_data': comparison_data if 'comparison_data' in locals() else [],
-                                'abnormal_episodes': all_abnormal_episodes if 'all_abnormal_episodes' in locals() else {}
+                                'abnormal_episodes': all_abnormal_episodes if 'all_abnormal_episodes' in locals() else {},
+                                'statistics': statistics
                             }
                         
-                        # Generate AI report with uploaded file content
-                        uploaded_file_content = st.session_state.get('uploaded_file_content', None)
-                        ai_report = generate_ai_report(project, ai_data, mode_eng, st.session_state.language, uploaded_file_content)
+                        # Generate AI report with the uploaded file chunks relevant to it
+                        file_excerpts = report_file_context(st.session_state.active_project, project, mode_eng)
+                        ai_report = generate_ai_report(project, ai_data, mode_eng, st.session_state.language, file_excerpts)
                         
                         # Display AI report
                         st.markdown(f"### {t('ai_analysis')}")
@@ -5671,4 +8593,8 @@ else:
             st.info(t('no_groups'))
 
 # Footer
-st.markdown("---")
\ No newline at end of file
+st.markdown("---")
+
+# Autosave changed worksheets to the local project store, then page out idle projects
+autosave_project_store()
+spill_inactive_projects()